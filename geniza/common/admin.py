@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
 
+from geniza.common.snapshots import CsvSnapshot
+
 
 class LocalUserAdmin(UserAdmin):
     """Extends :class:`django.contrib.auth.admin.UserAdmin`
@@ -44,3 +46,32 @@ def custom_empty_field_list_filter(title, non_empty_label=None, empty_label=None
 
 admin.site.unregister(User)
 admin.site.register(User, LocalUserAdmin)
+
+
+class CsvSnapshotMixin:
+    """Admin mixin for models with a CSV export, to serve exports of all
+    records from a pre-generated :class:`~geniza.common.snapshots.CsvSnapshot`.
+    Expects `csv_fields` and `tabulate_queryset` as used for CSV export."""
+
+    #: name of the snapshot, used in snapshot filenames
+    snapshot_name = None
+    #: models whose changes require a new snapshot
+    snapshot_models = []
+
+    @property
+    def csv_snapshot(self):
+        return CsvSnapshot(
+            self.snapshot_name,
+            self.csv_fields,
+            lambda: self.csv_rows(self.get_queryset(None)),
+            self.snapshot_models,
+        )
+
+    def csv_rows(self, queryset):
+        """Generator of CSV rows for a queryset"""
+        return self.tabulate_queryset(queryset)
+
+    def snapshot_response(self, request):
+        """Response with the current CSV snapshot; None if there is no
+        snapshot for the current data"""
+        return self.csv_snapshot.response(request, self.csv_filename())
@@ -0,0 +1,38 @@
+import os
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class LRUFileBasedCache(FileBasedCache):
+    """File-based cache that removes the least recently used entries
+    when the cache is full, rather than a random selection. Entries are
+    marked as used by updating the file modification time when read;
+    expiration is stored in the file content and is not affected."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, default=default, version=version)
+        if value is not default:
+            try:
+                os.utime(self._key_to_file(key, version))
+            except FileNotFoundError:
+                pass
+        return value
+
+    def _cull(self):
+        filelist = self._list_cache_files()
+        num_entries = len(filelist)
+        if num_entries < self._max_entries:
+            return  # return early if no culling is required
+        if self._cull_frequency == 0:
+            return self.clear()  # Clear the cache when CULL_FREQUENCY = 0
+        # delete the least recently used entries
+        mtimes = {}
+        for fname in filelist:
+            try:
+                mtimes[fname] = os.path.getmtime(fname)
+            except FileNotFoundError:
+                pass
+        for fname in sorted(mtimes, key=mtimes.get)[
+            : int(num_entries / self._cull_frequency)
+        ]:
+            self._delete(fname)
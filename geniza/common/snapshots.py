@@ -0,0 +1,176 @@
+import csv
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from tabular_export.core import convert_value_to_unicode
+
+#: size of chunks when streaming snapshot files
+CHUNK_SIZE = 64 * 1024
+
+
+class CsvSnapshot:
+    """Gzip-compressed snapshot of a full CSV export, stored on disk
+    in :setting:`CSV_SNAPSHOT_ROOT`. Snapshots are versioned based on the
+    number of records and most recent modification time of a list of
+    models, so that a new snapshot is only generated when data changes.
+    Downloads check the version cached for
+    :setting:`CSV_SNAPSHOT_VERSION_TTL` seconds, so that frequent polling
+    does not aggregate the models on every request.
+
+    :param name: name of the export, used for snapshot filenames
+    :param headers: list of CSV column headers
+    :param rows: callable that returns an iterable of CSV rows
+    :param models: list of models whose changes invalidate the snapshot;
+        use a tuple of model and field name to check a field other than
+        `last_modified`
+    """
+
+    def __init__(self, name, headers, rows, models):
+        self.name = name
+        self.headers = headers
+        self.rows = rows
+        self.models = models
+
+    @property
+    def root(self):
+        return Path(settings.CSV_SNAPSHOT_ROOT)
+
+    def version(self):
+        """Identifier for the current state of the exported data"""
+        digest = hashlib.sha1()
+        for model in self.models:
+            model, field = (
+                model if isinstance(model, tuple) else (model, "last_modified")
+            )
+            stats = model.objects.aggregate(count=Count("pk"), latest=Max(field))
+            digest.update(
+                f"{model._meta.label}:{stats['count']}:{stats['latest']};".encode()
+            )
+        return digest.hexdigest()[:16]
+
+    def current_version(self):
+        """Cached identifier for the current state of the exported data"""
+        return cache.get_or_set(
+            f"csv-snapshot-version:{self.name}",
+            self.version,
+            settings.CSV_SNAPSHOT_VERSION_TTL,
+        )
+
+    def path(self, version):
+        return self.root / f"{self.name}-{version}.csv.gz"
+
+    def generate(self, force=False):
+        """Write a snapshot for the current version of the data, if one
+        does not already exist, and remove snapshots for older versions.
+        Returns True if a snapshot was written."""
+        path = self.path(self.version())
+        if path.exists() and not force:
+            return False
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file and move into place, so that a
+        # partial snapshot is never served
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(tmp_fd, "wb") as tmp_file:
+                with gzip.open(tmp_file, "wt", encoding="utf-8", newline="") as csvfile:
+                    writer = csv.writer(csvfile)
+                    writer.writerow(map(convert_value_to_unicode, self.headers))
+                    for row in self.rows():
+                        writer.writerow(map(convert_value_to_unicode, row))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        for old_snapshot in self.root.glob(f"{self.name}-*.csv.gz"):
+            if old_snapshot != path:
+                old_snapshot.unlink()
+        return True
+
+    def response(self, request, filename):
+        """Serve the snapshot for the current version of the data,
+        supporting conditional and range requests. Returns None if there
+        is no current snapshot."""
+        version = self.current_version()
+        path = self.path(version)
+        if not path.exists():
+            return None
+
+        # serve the compressed file as is to clients that accept gzip;
+        # byte ranges are only supported for the compressed file
+        use_gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+        etag = f'"{version}-gzip"' if use_gzip else f'"{version}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            if use_gzip:
+                response = self.gzip_response(request, path, etag)
+            else:
+                response = StreamingHttpResponse(self.decompress(path))
+
+        response["Content-Type"] = "text/csv; charset=utf-8"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        response["ETag"] = etag
+        response["Vary"] = "Accept-Encoding"
+        return response
+
+    def gzip_response(self, request, path, etag):
+        """Response with the compressed snapshot or a requested range of it"""
+        size = path.stat().st_size
+        byte_range = request.META.get("HTTP_RANGE")
+        # ignore range if the client's copy is out of date
+        if request.META.get("HTTP_IF_RANGE", etag) != etag:
+            byte_range = None
+
+        start, end = 0, size - 1
+        if byte_range:
+            match = re.match(r"^bytes=(\d*)-(\d*)$", byte_range.strip())
+            if match and any(match.groups()):
+                first, last = match.groups()
+                if not first:
+                    # suffix range: last n bytes
+                    start = max(size - int(last), 0)
+                else:
+                    start = int(first)
+                    end = min(int(last), end) if last else end
+            if not match or start > end:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+
+        response = StreamingHttpResponse(self.read(path, start, end))
+        if (start, end) != (0, size - 1):
+            response.status_code = 206
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+        response["Content-Encoding"] = "gzip"
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    @staticmethod
+    def read(path, start, end):
+        """Generator of chunks of the bytes from start to end (inclusive)"""
+        with open(path, "rb") as snapshot:
+            snapshot.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = snapshot.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    @staticmethod
+    def decompress(path):
+        """Generator of chunks of the uncompressed snapshot"""
+        with gzip.open(path, "rb") as snapshot:
+            yield from iter(lambda: snapshot.read(CHUNK_SIZE), b"")
@@ -1,12 +1,18 @@
+import gzip
+import os
+
 import pytest
 from unittest.mock import Mock
+from django.core.cache import cache
 from django.contrib.auth.models import Group, User
-from django.test import TestCase, override_settings
+from django.test import RequestFactory, TestCase, override_settings
 from django.contrib.sites.models import Site
 from unittest.mock import Mock
 import pytest
 
-from geniza.common.utils import absolutize_url
+from geniza.common.cache import LRUFileBasedCache
+from geniza.common.snapshots import CsvSnapshot
+from geniza.common.utils import absolutize_url, iterate_in_chunks
 from geniza.common.admin import LocalUserAdmin, custom_empty_field_list_filter
 
 
@@ -65,6 +71,25 @@ class TestCommonUtils(TestCase):
             )
 
 
+@pytest.mark.django_db
+def test_iterate_in_chunks(django_assert_num_queries):
+    users = [User.objects.create(username="user%d" % i) for i in range(5)]
+    # exclude users created by migrations
+    user_qs = User.objects.filter(username__startswith="user")
+    # chunks of 2, 2, and 1; a partial chunk ends iteration
+    with django_assert_num_queries(3):
+        assert list(iterate_in_chunks(user_qs, chunk_size=2)) == users
+    # full final chunk requires one more query to find the end
+    with django_assert_num_queries(2):
+        assert list(iterate_in_chunks(user_qs, chunk_size=5)) == users
+    # filters on the queryset are preserved
+    assert list(iterate_in_chunks(user_qs.filter(username="user3"), chunk_size=2)) == [
+        users[3]
+    ]
+    # empty queryset
+    assert list(iterate_in_chunks(User.objects.none())) == []
+
+
 class TestCustomEmptyFieldListFilter:
     def test_title(self):
         """Accepts a custom title for the filter"""
@@ -95,3 +120,136 @@ class TestCustomEmptyFieldListFilter:
         choices = filter.choices(Mock())
         assert choices[1]["display"] == "nope"
         assert choices[2]["display"] == "yep"
+
+
+@pytest.mark.django_db
+class TestCsvSnapshot:
+    def user_snapshot(self):
+        return CsvSnapshot(
+            "users",
+            ["username", "is_staff"],
+            lambda: ([user.username, user.is_staff] for user in User.objects.all()),
+            [(User, "date_joined")],
+        )
+
+    def test_version(self):
+        snapshot = self.user_snapshot()
+        version = snapshot.version()
+        assert version == snapshot.version()
+        # added record changes the version
+        user = User.objects.create(username="new")
+        assert snapshot.version() != version
+        # so does a deleted one
+        version = snapshot.version()
+        user.delete()
+        assert snapshot.version() != version
+
+    def test_generate(self, settings):
+        snapshot = self.user_snapshot()
+        assert snapshot.generate()
+        path = snapshot.path(snapshot.version())
+        assert path.parent == settings.CSV_SNAPSHOT_ROOT
+        assert gzip.open(path).read().startswith(b"username,is_staff\r\n")
+        # not regenerated when data is unchanged, unless forced
+        assert not snapshot.generate()
+        assert snapshot.generate(force=True)
+
+        # new version replaces the old one
+        User.objects.create(username="new")
+        assert snapshot.generate()
+        assert not path.exists()
+        snapshots = list(settings.CSV_SNAPSHOT_ROOT.iterdir())
+        assert snapshots == [snapshot.path(snapshot.version())]
+        assert "new,False" in gzip.open(snapshots[0], "rt").read()
+
+    def test_response(self):
+        snapshot = self.user_snapshot()
+        rqst = RequestFactory().get("/csv/")
+        # no snapshot for current data
+        assert snapshot.response(rqst, "users.csv") is None
+
+        snapshot.generate()
+        path = snapshot.path(snapshot.version())
+        response = snapshot.response(rqst, "users.csv")
+        # uncompressed if client does not accept gzip
+        assert response.status_code == 200
+        assert response["Content-Type"] == "text/csv; charset=utf-8"
+        assert 'filename="users.csv"' in response["Content-Disposition"]
+        assert "Content-Encoding" not in response
+        content = b"".join(response.streaming_content)
+        assert content == gzip.open(path).read()
+
+        # compressed file as is
+        rqst = RequestFactory().get("/csv/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        response = snapshot.response(rqst, "users.csv")
+        assert response["Content-Encoding"] == "gzip"
+        assert response["Accept-Ranges"] == "bytes"
+        assert b"".join(response.streaming_content) == path.read_bytes()
+        etag = response["ETag"]
+
+        # not modified
+        rqst = RequestFactory().get(
+            "/csv/", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag
+        )
+        assert snapshot.response(rqst, "users.csv").status_code == 304
+
+    def test_response_cached_version(self, django_assert_num_queries):
+        snapshot = self.user_snapshot()
+        snapshot.generate()
+        rqst = RequestFactory().get("/csv/")
+        assert snapshot.response(rqst, "users.csv").status_code == 200
+        # version is not recalculated on every request
+        with django_assert_num_queries(0):
+            assert snapshot.response(rqst, "users.csv").status_code == 200
+        # changes are picked up once the cached version expires
+        User.objects.create(username="new")
+        cache.clear()
+        assert snapshot.response(rqst, "users.csv") is None
+
+    def test_response_range(self):
+        snapshot = self.user_snapshot()
+        snapshot.generate()
+        data = snapshot.path(snapshot.version()).read_bytes()
+        size = len(data)
+
+        def get_range(byte_range, **kwargs):
+            rqst = RequestFactory().get(
+                "/csv/", HTTP_ACCEPT_ENCODING="gzip", HTTP_RANGE=byte_range, **kwargs
+            )
+            return snapshot.response(rqst, "users.csv")
+
+        response = get_range("bytes=0-9")
+        assert response.status_code == 206
+        assert response["Content-Range"] == "bytes 0-9/%d" % size
+        assert b"".join(response.streaming_content) == data[:10]
+        # open-ended and suffix ranges
+        response = get_range("bytes=10-")
+        assert b"".join(response.streaming_content) == data[10:]
+        response = get_range("bytes=-5")
+        assert b"".join(response.streaming_content) == data[-5:]
+        # unsatisfiable
+        response = get_range("bytes=%d-" % size)
+        assert response.status_code == 416
+        assert response["Content-Range"] == "bytes */%d" % size
+        # range ignored if client copy is out of date
+        response = get_range("bytes=0-9", HTTP_IF_RANGE='"outdated"')
+        assert response.status_code == 200
+        assert b"".join(response.streaming_content) == data
+
+
+def test_lru_file_based_cache(tmp_path):
+    cache = LRUFileBasedCache(
+        str(tmp_path), {"OPTIONS": {"MAX_ENTRIES": 3, "CULL_FREQUENCY": 3}}
+    )
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.set(key, i)
+        # make sure modification times are distinct
+        os.utime(cache._key_to_file(key), (i, i))
+    # reading an entry marks it as recently used
+    assert cache.get("a") == 0
+    # adding another entry removes the least recently used
+    cache.set("d", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 0
+    assert cache.get("c") == 2
+    assert cache.get("d") == 3
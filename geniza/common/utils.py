@@ -32,3 +32,19 @@ def absolutize_url(local_url, request=None):
         root = root.rstrip("/")
 
     return root + local_url
+
+
+def iterate_in_chunks(queryset, chunk_size=1000):
+    """Iterate over a queryset in primary key order, fetching chunks of
+    a fixed size filtered by the last primary key of the previous chunk.
+    Any prefetching is done per chunk, so memory use stays flat regardless
+    of the size of the queryset.
+    """
+    queryset = queryset.order_by("pk")
+    chunk = list(queryset[:chunk_size])
+    while chunk:
+        yield from chunk
+        # a partial chunk means there are no more results
+        if len(chunk) < chunk_size:
+            break
+        chunk = list(queryset.filter(pk__gt=chunk[-1].pk)[:chunk_size])
@@ -3,5 +3,53 @@
 # between modules - if you import just the top-level fixture (e.g. "events"),
 # it fails to find the fixture dependencies, and so on all the way down. For
 # now this does what we want, although it pollutes the namespace somewhat
+import pytest
+from django.conf import settings
+from django.core.cache import caches
+from django.test import override_settings
+
 from geniza.corpus.tests.conftest import *
 from geniza.footnotes.conftest import *
+
+
+@pytest.fixture(autouse=True)
+def csv_snapshot_root(settings, tmp_path):
+    # keep csv export snapshots generated by tests out of the project
+    settings.CSV_SNAPSHOT_ROOT = tmp_path / "snapshots"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def search_cache_location(tmp_path_factory):
+    # keep cached solr results generated by tests out of the project,
+    # including any cached during test database setup
+    search_cache = {
+        **settings.CACHES["search"],
+        "LOCATION": tmp_path_factory.mktemp("search-cache"),
+    }
+    with override_settings(CACHES={**settings.CACHES, "search": search_cache}):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def search_cache():
+    # don't reuse cached solr results between tests
+    caches["search"].clear()
+
+
+@pytest.fixture(autouse=True)
+def default_cache():
+    # don't reuse cached facets or snapshot versions between tests
+    caches["default"].clear()
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark-scale",
+        type=int,
+        default=20,
+        help="Number of documents in the synthetic corpus for benchmarks",
+    )
+    parser.addoption(
+        "--benchmark-json",
+        help="Save benchmark results as JSON to the specified path",
+    )
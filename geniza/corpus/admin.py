@@ -5,9 +5,12 @@ from django import forms
 from django.conf import settings
 from django.conf.urls import url
 from django.contrib import admin
-from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.admin.models import LogEntry
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
 from django.contrib.sites.models import Site
 from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
 from django.db.models import Count, CharField, Q, F
 from django.db.models.functions import Concat
 from django.db.models.query import Prefetch
@@ -25,10 +28,11 @@ from geniza.corpus.models import (
     LanguageScript,
     TextBlock,
 )
-from geniza.corpus.solr_queryset import DocumentSolrQuerySet
-from geniza.common.admin import custom_empty_field_list_filter
+from geniza.corpus.solr_queryset import DocumentSolrQuerySet, SolrPaginator
+from geniza.common.admin import CsvSnapshotMixin, custom_empty_field_list_filter
 from geniza.footnotes.admin import DocumentFootnoteInline
-from geniza.common.utils import absolutize_url
+from geniza.footnotes.models import Footnote
+from geniza.common.utils import absolutize_url, iterate_in_chunks
 from django.contrib.auth.models import User
 
 
@@ -132,6 +136,10 @@ class DocumentTextBlockInline(SortableInlineAdminMixin, admin.TabularInline):
     extra = 1
     formfield_overrides = {CharField: {"widget": TextInput(attrs={"size": "10"})}}
 
+    def get_queryset(self, request):
+        # thumbnails are displayed from fragment data; avoid a query per row
+        return super().get_queryset(request).select_related("fragment")
+
 
 class DocumentForm(forms.ModelForm):
     class Meta:
@@ -156,8 +164,77 @@ class DocumentForm(forms.ModelForm):
             raise ValidationError('"Unknown" is not allowed for probable language.')
 
 
+class DocumentChangeList(ChangeList):
+    """Document admin changelist that pages and sorts keyword searches
+    in Solr, and only loads the documents on the current page from the
+    database. Searches combined with filters or a custom sort use the
+    default changelist, with search results restricted by id."""
+
+    def get_queryset(self, request):
+        # admin actions (POST) operate on the changelist queryset,
+        # so it must be restricted to the search results
+        self.solr_search = (
+            bool(self.query)
+            and request.method == "GET"
+            and not self.get_filters_params()
+            and ORDER_VAR not in self.params
+        )
+        if not self.solr_search:
+            return super().get_queryset(request)
+
+        # skip the search in the database queryset;
+        # search is handled by solr in get_results
+        query, self.query = self.query, ""
+        try:
+            return super().get_queryset(request)
+        finally:
+            self.query = query
+
+    def get_results(self, request):
+        if not self.solr_search:
+            return super().get_results(request)
+
+        # sort by relevance, with id as tiebreaker for consistent paging
+        sqs = self.model_admin.solr_search(self.query).order_by("-score", "id")
+        paginator = SolrPaginator(sqs, self.list_per_page)
+        try:
+            page = paginator.page(self.page_num + 1)
+        except InvalidPage:
+            raise IncorrectLookupParameters
+
+        result_count = paginator.count
+        if self.model_admin.show_full_result_count:
+            full_result_count = self.root_queryset.count()
+        else:
+            full_result_count = None
+        can_show_all = result_count <= self.list_max_show_all
+        multi_page = result_count > self.list_per_page
+
+        if self.show_all and can_show_all and multi_page:
+            results = sqs[:result_count]
+        else:
+            results = page.object_list
+
+        self.result_count = result_count
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.show_admin_actions = not self.show_full_result_count or bool(
+            full_result_count
+        )
+        self.full_result_count = full_result_count
+        self.result_list = self.load_documents([r["pgpid"] for r in results])
+        self.can_show_all = can_show_all
+        self.multi_page = multi_page
+        self.paginator = paginator
+
+    def load_documents(self, pks):
+        """Load documents by primary key from the changelist queryset,
+        in the order given."""
+        documents = self.queryset.in_bulk(pks)
+        return [documents[pk] for pk in pks if pk in documents]
+
+
 @admin.register(Document)
-class DocumentAdmin(admin.ModelAdmin):
+class DocumentAdmin(CsvSnapshotMixin, admin.ModelAdmin):
     form = DocumentForm
     list_display = (
         "id",
@@ -230,33 +307,22 @@ class DocumentAdmin(admin.ModelAdmin):
         return (
             super()
             .get_queryset(request)
-            .select_related(
-                "doctype",
-            )
-            .prefetch_related(
-                "tags",
-                "languages",
-                # Optimize lookup of fragments in two steps: prefetch_related on
-                # TextBlock, then select_related on Fragment.
-                #
-                # prefetch_related works on m2m and generic relationships and
-                # operates at the python level, while select_related only works
-                # on fk or one-to-one and operates at the database level. We
-                # can chain the latter onto the former because TextBlocks have
-                # only one Fragment.
-                #
-                # For more, see:
-                # https://docs.djangoproject.com/en/3.2/ref/models/querysets/#prefetch-related
-                Prefetch(
-                    "textblock_set",
-                    queryset=TextBlock.objects.select_related(
-                        "fragment", "fragment__collection"
-                    ),
-                ),
-                "footnotes__content__isnull",
-            )
-            .annotate(shelfmk_all=ArrayAgg("textblock__fragment__shelfmark"))
-            .order_by("shelfmk_all")
+            # shelfmark, image and transcription status for the list view
+            # are read from the stored document summary
+            .select_related("doctype", "summary")
+            .prefetch_related("tags", "languages")
+            .order_by("shelfmark_sort", "pk")
+        )
+
+    def solr_search(self, search_term):
+        """Solr queryset for an admin keyword search"""
+        # - use AND instead of OR to get smaller result sets, more
+        #  similar to default admin search behavior
+        return (
+            DocumentSolrQuerySet()
+            .admin_search(search_term)
+            .raw_query_parameters(**{"q.op": "AND"})
+            .only("pgpid")
         )
 
     def get_search_results(self, request, queryset, search_term):
@@ -264,16 +330,8 @@ class DocumentAdmin(admin.ModelAdmin):
 
         # if search term is not blank, filter the queryset via solr search
         if search_term:
-            # - use AND instead of OR to get smaller result sets, more
-            #  similar to default admin search behavior
-            # - return pks for all matching records
-            sqs = (
-                DocumentSolrQuerySet()
-                .admin_search(search_term)
-                .raw_query_parameters(**{"q.op": "AND"})
-                .only("pgpid")
-                .get_results(rows=100000)
-            )
+            # return pks for all matching records
+            sqs = self.solr_search(search_term).get_results(rows=100000)
 
             pks = [r["pgpid"] for r in sqs]
             # filter queryset by id if there are results
@@ -285,6 +343,9 @@ class DocumentAdmin(admin.ModelAdmin):
         # return queryset, use distinct not needed
         return queryset, False
 
+    def get_changelist(self, request, **kwargs):
+        return DocumentChangeList
+
     def save_model(self, request, obj, form, change):
         """Customize this model's save_model function and then execute the
         existing admin.ModelAdmin save_model function"""
@@ -380,8 +441,7 @@ class DocumentAdmin(admin.ModelAdmin):
                 doc.notes,
                 doc.needs_review,
                 f"{url_scheme}{site_domain}/admin/corpus/document/{doc.id}/change/",
-                # default sort is most recent first, so initial input is last
-                all_log_entries.last().action_time if all_log_entries else "",
+                doc.input_date or "",
                 doc.last_modified,
                 ";".join(
                     set([user.get_full_name() or user.username for user in input_users])
@@ -421,20 +481,63 @@ class DocumentAdmin(admin.ModelAdmin):
         "collection",
     ]
 
-    def export_to_csv(self, request, queryset=None):
-        """Stream tabular data as a CSV file"""
-        queryset = queryset or self.get_queryset(request)
+    #: number of documents to load and prefetch at once for csv export
+    csv_chunk_size = 1000
+
+    snapshot_name = "documents"
+    snapshot_models = [
+        Document,
+        Fragment,
+        TextBlock,
+        Footnote,
+        (LogEntry, "id"),
+    ]
+
+    def csv_rows(self, queryset):
+        """Generator of CSV rows for a queryset"""
         # additional prefetching needed to optimize csv export but
         # not needed for admin list view
-        queryset = queryset.order_by("id").prefetch_related(
+        queryset = queryset.with_log_entry_dates().prefetch_related(
             "probable_languages",
-            "log_entries",
+            Prefetch("log_entries", queryset=LogEntry.objects.select_related("user")),
+            # Optimize lookup of fragments in two steps: prefetch_related on
+            # TextBlock, then select_related on Fragment.
+            #
+            # prefetch_related works on m2m and generic relationships and
+            # operates at the python level, while select_related only works
+            # on fk or one-to-one and operates at the database level. We
+            # can chain the latter onto the former because TextBlocks have
+            # only one Fragment.
+            #
+            # For more, see:
+            # https://docs.djangoproject.com/en/3.2/ref/models/querysets/#prefetch-related
+            Prefetch(
+                "textblock_set",
+                queryset=TextBlock.objects.select_related(
+                    "fragment", "fragment__collection"
+                ),
+            ),
+        )
+        # load documents in chunks ordered by id, so that the response
+        # starts quickly and related data is not all loaded at once
+        return self.tabulate_queryset(
+            iterate_in_chunks(queryset, chunk_size=self.csv_chunk_size)
         )
 
+    def export_to_csv(self, request, queryset=None):
+        """Stream tabular data as a CSV file"""
+        # check for None explicitly; testing a queryset evaluates it
+        if queryset is None:
+            # serve export of all documents from snapshot when available
+            response = self.snapshot_response(request)
+            if response:
+                return response
+            queryset = self.get_queryset(request)
+
         return export_to_csv_response(
             self.csv_filename(),
             self.csv_fields,
-            self.tabulate_queryset(queryset),
+            self.csv_rows(queryset),
         )
 
     export_to_csv.short_description = "Export selected documents to CSV"
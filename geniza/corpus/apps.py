@@ -7,3 +7,15 @@ class CorpusAppConfig(AppConfig):
     def ready(self):
         # import and connect signal handlers for Solr indexing
         from parasolr.django.signals import IndexableSignalHandler
+        from django.db.models.signals import m2m_changed, post_delete
+
+        from geniza.corpus.models import DocumentSignalHandlers, TextBlock
+        from geniza.footnotes.models import Footnote
+
+        # update stored document summaries when fragments are added or
+        # removed without saving text blocks
+        m2m_changed.connect(TextBlock.fragments_changed, sender=TextBlock)
+        # footnotes are not included in index dependencies; queue
+        # documents for reindexing when footnotes are deleted, since
+        # incremental indexing can't detect them
+        post_delete.connect(DocumentSignalHandlers.footnote_delete, sender=Footnote)
@@ -36,6 +36,21 @@ class SelectWithDisabled(SelectDisabledMixin, forms.Select):
     """
 
 
+class FacetChoiceField(forms.MultipleChoiceField):
+    """Multiple choice field for filtering on a Solr facet. Choices are
+    populated from facet counts in the search results, so any value
+    is considered valid."""
+
+    widget = forms.CheckboxSelectMultiple
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("required", False)
+        super().__init__(*args, **kwargs)
+
+    def valid_value(self, value):
+        return True
+
+
 class DocumentSearchForm(forms.Form):
     query = forms.CharField(
         label="Keyword or Phrase",
@@ -49,10 +64,13 @@ class DocumentSearchForm(forms.Form):
         ),
     )
 
-    # sort still TODO; single choice only for display, for now
     SORT_CHOICES = [
         ("relevance", "Relevance"),
-        # ("input_date", "Input Date (Latest – Earliest)"),
+        ("input_date_desc", "Input Date (Latest – Earliest)"),
+        ("input_date_asc", "Input Date (Earliest – Latest)"),
+        ("shelfmark", "Shelfmark (A – Z)"),
+        ("scholarship_desc", "Scholarship Records (Most – Least)"),
+        ("pgpid", "PGP ID"),
     ]
 
     # NOTE these are not set by default!
@@ -63,6 +81,26 @@ class DocumentSearchForm(forms.Form):
         label="Sort by", choices=SORT_CHOICES, required=False, widget=SelectWithDisabled
     )
 
+    PER_PAGE_CHOICES = [(str(n), str(n)) for n in (10, 25, 50, 100)]
+
+    per_page = forms.ChoiceField(
+        label="Results per page", choices=PER_PAGE_CHOICES, required=False
+    )
+
+    # map facet form fields to solr field aliases
+    FACET_FIELDS = {
+        "doctype": "type",
+        "collection": "collection",
+        "tags": "tags",
+    }
+
+    doctype = FacetChoiceField(label="Document Type")
+    collection = FacetChoiceField(label="Collection")
+    tags = FacetChoiceField(label="Tags")
+    has_transcription = forms.BooleanField(label="Has Transcription", required=False)
+    input_year_start = forms.IntegerField(label="Input year from", required=False)
+    input_year_end = forms.IntegerField(label="Input year to", required=False)
+
     def __init__(self, data=None, *args, **kwargs):
         """
         Override to set choices dynamically based on form kwargs.
@@ -75,3 +113,27 @@ class DocumentSearchForm(forms.Form):
                 self.SORT_CHOICES[0][0],
                 {"label": self.SORT_CHOICES[0][1], "disabled": True},
             )
+
+    def is_filtered(self):
+        """Check if any facets or other filters are selected"""
+        return any(
+            self.cleaned_data.get(field)
+            for field in list(self.FACET_FIELDS)
+            + ["has_transcription", "input_year_start", "input_year_end"]
+        )
+
+    def set_choices_from_facets(self, facets):
+        """Set choices for facet fields based on facet counts from
+        Solr; selected values are always included."""
+        facet_fields = facets.get("facet_fields", {})
+        for field, solr_field in self.FACET_FIELDS.items():
+            counts = dict(facet_fields.get(solr_field, {}))
+            for value in getattr(self, "cleaned_data", {}).get(field) or []:
+                counts.setdefault(value, 0)
+            self.fields[field].choices = [
+                (value, "%s (%d)" % (value, count)) for value, count in counts.items()
+            ]
+
+        count = facets.get("facet_queries", {}).get("has_transcription")
+        if count is not None:
+            self.fields["has_transcription"].label = "Has Transcription (%d)" % count
@@ -1,21 +1,71 @@
+"""
+**add_fragment_urls** is a custom manage command to add view and IIIF
+URLs to fragments from a CSV of shelfmarks. Rows are read and saved in
+batches, with progress reported after each batch. If an import fails
+partway through, it can be resumed by skipping the rows that were
+already saved.
+
+Example usage::
+
+    python manage.py add_fragment_urls fragment-urls.csv
+    # check that IIIF manifest URLs resolve before saving them
+    python manage.py add_fragment_urls fragment-urls.csv --verify
+    # resume an interrupted import and save a JSON summary
+    python manage.py add_fragment_urls fragment-urls.csv --skip-rows 25000 \\
+        --summary import-summary.json
+
+"""
 import csv
+import itertools
+import json
 import re
-from collections import Counter
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
+import requests
 from django.conf import settings
 from django.contrib.admin.models import CHANGE, LogEntry
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
 from parasolr.django.signals import IndexableSignalHandler
+from piffle.presentation import IIIFException
+
+from geniza.corpus.models import (
+    Document,
+    Fragment,
+    Manifest,
+    ReindexRequest,
+    TextBlock,
+)
+
+
+class HostConcurrencyLimiter:
+    """Thread-safe limit on the number of concurrent requests
+    to the same host."""
 
-from geniza.corpus.models import Fragment
+    def __init__(self, limit):
+        self.lock = threading.Lock()
+        self.semaphores = defaultdict(lambda: threading.BoundedSemaphore(limit))
+
+    def __call__(self, url):
+        """Get a semaphore for the host of this url, to be used as a
+        context manager around the request."""
+        with self.lock:
+            return self.semaphores[urlparse(url).netloc]
 
 
 class Command(BaseCommand):
     """Takes a CSV of shelfmarks and view URLs and/or IIIF URLs, update
     corresponding Fragment records in the database with those URLs.
-    Expects CSV headers 'shelfmark' and one or both of 'url' and 'iiif_url'"""
+    Expects CSV headers 'shelfmark' and one or both of 'url' and 'iiif_url'.
+    Rows are processed in batches; documents on updated fragments are
+    reindexed once all rows have been processed."""
 
     help = __doc__
 
@@ -23,6 +73,11 @@ class Command(BaseCommand):
         super().__init__(*args, **options)
 
         self.stats = Counter()
+        # ids of fragments that have been updated
+        self.updated_fragments = set()
+        # IIIF urls that could not be verified as manifests
+        self.invalid_manifests = set()
+        self.verify = False
 
         self.fragment_contenttype = ContentType.objects.get_for_model(Fragment)
         self.script_user = User.objects.get(username=settings.SCRIPT_USERNAME)
@@ -34,32 +89,154 @@ class Command(BaseCommand):
         parser.add_argument("csv", type=str)
         parser.add_argument("-o", "--overwrite", action="store_true")
         parser.add_argument("-d", "--dryrun", action="store_true")
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of CSV rows to process at once (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Check that new IIIF URLs resolve to manifests before saving; "
+            + "verified manifests are cached",
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=8,
+            help="Number of manifests to verify concurrently (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--host-limit",
+            type=int,
+            default=2,
+            help="Maximum concurrent requests to the same host when verifying "
+            + "(default: %(default)s)",
+        )
+        parser.add_argument(
+            "--skip-rows",
+            type=int,
+            default=0,
+            help="Number of CSV rows to skip, to resume an interrupted import",
+        )
+        parser.add_argument(
+            "--summary",
+            help="Path for a JSON summary of the import",
+        )
 
     def handle(self, *args, **options):
         self.csv_path = options.get("csv")
         self.overwrite = options.get("overwrite")
         self.dryrun = options.get("dryrun")
+        batch_size = options.get("batch_size") or 1000
+        skip_rows = options.get("skip_rows") or 0
+        self.verify = options.get("verify")
+        self.workers = options.get("workers") or 8
+        self.host_limiter = HostConcurrencyLimiter(options.get("host_limit") or 2)
+        # number of rows processed, including any skipped rows
+        self.row_count = skip_rows
 
+        self.start = time.time()
         try:
             with open(self.csv_path) as f:
-                csvreader = csv.DictReader(f)
-                for row in csvreader:
-                    if "shelfmark" not in row or not (
-                        "url" in row or "iiif_url" in row
-                    ):
-                        raise CommandError(
-                            "CSV must include 'shelfmark' and one or both of 'url' and 'iiif_url'"
-                        )
-                    self.add_fragment_urls(row)
+                for batch in self.read_batches(f, batch_size, skip_rows):
+                    self.add_fragment_urls(batch)
+                    self.row_count += len(batch)
+                    self.report_progress()
         except FileNotFoundError:
             raise CommandError(f"CSV file not found: {self.csv_path}")
+        except CommandError:
+            raise
+        except KeyboardInterrupt:
+            self.abort(options.get("summary"), "interrupted")
+        except Exception as err:
+            self.abort(options.get("summary"), f"failed: {err}")
+
+        if self.updated_fragments:
+            self.reindex()
+
+        self.report()
+        self.write_summary(options.get("summary"))
+
+    def abort(self, summary_path, reason):
+        """Handle an import that stopped before the end of the CSV file.
+        Changes from completed batches are saved, so make sure they are
+        indexed, and report where to resume."""
+        if self.updated_fragments:
+            self.reindex(queue=True)
+        self.write_summary(summary_path, error=reason)
+        raise CommandError(
+            f"Import stopped after {self.row_count:,} rows "
+            f"(resume with --skip-rows {self.row_count}): {reason}"
+        )
+
+    def read_batches(self, csvfile, batch_size, skip_rows=0):
+        """Validate CSV headers and generate lists of rows with
+        the requested batch size, after skipping the specified
+        number of rows."""
+        csvreader = csv.DictReader(csvfile)
+        headers = csvreader.fieldnames or []
+        if "shelfmark" not in headers or not (
+            "url" in headers or "iiif_url" in headers
+        ):
+            raise CommandError(
+                "CSV must include 'shelfmark' and one or both of 'url' and 'iiif_url'"
+            )
+        rows = itertools.islice(csvreader, skip_rows, None)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            yield batch
 
+    def rows_per_second(self):
+        elapsed = time.time() - self.start
+        return self.stats["rows"] / elapsed if elapsed else 0
+
+    def report_progress(self):
+        self.stdout.write(
+            "Processed {:,} rows ({:.1f} rows/s)".format(
+                self.row_count, self.rows_per_second()
+            )
+        )
+
+    def report(self):
         self.stdout.write(f"URLs added: {self.stats['url_added']}")
         self.stdout.write(f"URLs updated: {self.stats['url_updated']}")
         self.stdout.write(f"IIIF URLs added: {self.stats['iiif_added']}")
         self.stdout.write(f"IIIF URLs updated: {self.stats['iiif_updated']}")
         self.stdout.write(f"Fragments not found: {self.stats['not_found']}")
         self.stdout.write(f"Fragments skipped: {self.stats['skipped']}")
+        if self.verify:
+            self.stdout.write(
+                f"IIIF manifests verified: {self.stats['manifests_verified']}"
+            )
+            self.stdout.write(f"IIIF URLs invalid: {self.stats['iiif_invalid']}")
+        if self.stats["thumbnails_missing"]:
+            self.stdout.write(
+                f"Run harvest_manifests to load IIIF thumbnails for "
+                f"{self.stats['thumbnails_missing']} fragments"
+            )
+
+    def write_summary(self, path, error=None):
+        """Save a JSON summary of the import, if a path is specified"""
+        if not path:
+            return
+        summary = {
+            "csv": self.csv_path,
+            "dryrun": bool(self.dryrun),
+            "rows": self.row_count,
+            "elapsed": round(time.time() - self.start, 3),
+            "rows_per_second": round(self.rows_per_second(), 1),
+            "stats": dict(self.stats),
+            "fragments_updated": len(self.updated_fragments),
+            "error": str(error) if error else None,
+        }
+        with open(path, "w") as outfile:
+            json.dump(summary, outfile, indent=2, sort_keys=True)
 
     def view_to_iiif_url(self, url):
         """Generate IIIF Manifest URL based on view url, if it can
@@ -76,24 +253,105 @@ class Command(BaseCommand):
 
         return ""
 
-    def add_fragment_urls(self, row):
-        try:
-            fragment = Fragment.objects.get(shelfmark=row["shelfmark"])
-        except Fragment.DoesNotExist:
-            self.stats["not_found"] += 1
+    def add_fragment_urls(self, rows):
+        """Update fragments for a batch of CSV rows. Fragments are loaded
+        in a single query and compared with the rows in memory; changes
+        are saved in bulk."""
+        fragments = Fragment.objects.in_bulk(
+            {row["shelfmark"] for row in rows}, field_name="shelfmark"
+        )
+        if self.verify:
+            self.verify_manifests(
+                self.row_iiif_url(row)
+                for row in rows
+                if row["shelfmark"] in fragments
+                and self.needs_iiif_update(fragments[row["shelfmark"]], row)
+            )
+
+        changes = []
+        for row in rows:
+            self.stats["rows"] += 1
+            fragment = fragments.get(row["shelfmark"])
+            if not fragment:
+                self.stats["not_found"] += 1
+                continue
+
+            log_message = self.update_fragment(fragment, row)
+            if not log_message:
+                self.stats["skipped"] += 1
+            elif self.dryrun:
+                self.stdout.write(
+                    f"Set {fragment} url to {fragment.url} and iiif to {fragment.iiif_url}"
+                )
+            else:
+                changes.append((fragment, log_message))
+
+        if changes:
+            self.save_changes(changes)
+
+    def row_iiif_url(self, row):
+        """IIIF url for a CSV row, from the row or based on the view url"""
+        return row.get("iiif_url") or self.view_to_iiif_url(row.get("url") or "")
+
+    def needs_iiif_update(self, fragment, row):
+        """Check if the IIIF url for a row would be saved on the fragment"""
+        iiif_url = self.row_iiif_url(row)
+        return bool(iiif_url) and (
+            not fragment.iiif_url or (self.overwrite and fragment.iiif_url != iiif_url)
+        )
+
+    def verify_manifests(self, iiif_urls):
+        """Check that IIIF urls resolve to valid manifests, requesting
+        any that are not already cached concurrently, with a limit on
+        concurrent requests per host. Valid manifests are added to the
+        manifest cache; invalid urls are added to
+        :attr:`invalid_manifests`."""
+        iiif_urls = set(iiif_urls) - self.invalid_manifests
+        cached = Manifest.objects.in_bulk(iiif_urls, field_name="uri")
+        manifests = [Manifest(uri=uri) for uri in iiif_urls if uri not in cached]
+        if not manifests:
             return
 
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self.fetch_manifest, manifests))
+
+        verified = []
+        for manifest, error in zip(manifests, results):
+            if error:
+                self.invalid_manifests.add(manifest.uri)
+                self.stdout.write(f"Invalid IIIF URL {manifest.uri}: {error}")
+            else:
+                verified.append(manifest)
+        self.stats["manifests_verified"] += len(verified)
+        # save in the main thread; workers only make http requests
+        if verified and not self.dryrun:
+            Manifest.objects.bulk_create(verified, ignore_conflicts=True)
+            Manifest.objects.evict()
+
+    def fetch_manifest(self, manifest):
+        """Request a single manifest, honoring the per-host limit.
+        Returns an error if the manifest could not be loaded."""
+        with self.host_limiter(manifest.uri):
+            try:
+                manifest.fetch()
+            except (IIIFException, requests.exceptions.RequestException) as err:
+                return err
+
+    def update_fragment(self, fragment, row):
+        """Set urls on a fragment from a CSV row, without saving.
+        Returns a log message describing the changes, if any."""
         url = row.get("url")
-        iiif_url = row.get("iiif_url") or self.view_to_iiif_url(row["url"])
-        save_needed = False
+        iiif_url = self.row_iiif_url(row)
         log_message = []
+        if iiif_url in self.invalid_manifests:
+            self.stats["iiif_invalid"] += 1
+            iiif_url = ""
 
         # if there is a view url, add or optionally update it
         if url:
             if not fragment.url:
                 fragment.url = url
                 self.stats["url_added"] += 1
-                save_needed = True
                 log_message.append("added URL")
             elif fragment.url != url:
                 self.stdout.write(
@@ -102,15 +360,14 @@ class Command(BaseCommand):
                 if self.overwrite:
                     fragment.url = url
                     self.stats["url_updated"] += 1
-                    save_needed = True
                     log_message.append("updated URL")
 
         # similar logic for iiif url
         if iiif_url:
             if not fragment.iiif_url:
                 fragment.iiif_url = iiif_url
+                fragment.iiif_thumbnail_data = []
                 self.stats["iiif_added"] += 1
-                save_needed = True
                 log_message.append("added IIIF URL")
             elif fragment.iiif_url != iiif_url:
                 self.stdout.write(
@@ -120,25 +377,84 @@ class Command(BaseCommand):
                 if self.overwrite:
                     self.stats["iiif_updated"] += 1
                     fragment.iiif_url = iiif_url
-                    save_needed = True
+                    fragment.iiif_thumbnail_data = []
                     log_message.append("updated IIIF URL")
 
-        if save_needed:
-            if self.dryrun:
-                self.stdout.write(f"Set {fragment} url to {url} and iiif to {iiif_url}")
+        return " and ".join(log_message)
+
+    def save_changes(self, changes):
+        """Save a list of changed fragments and log messages in bulk,
+        with a log entry for each change, and update stored summaries
+        for documents on those fragments."""
+        now = timezone.now()
+        # a fragment may be changed by more than one row
+        fragments = list({fragment.pk: fragment for fragment, _ in changes}.values())
+        for fragment in fragments:
+            # bulk update does not set auto_now fields
+            fragment.last_modified = now
+        self.set_thumbnails(fragments)
+        with transaction.atomic():
+            Fragment.objects.bulk_update(
+                fragments, ["url", "iiif_url", "iiif_thumbnail_data", "last_modified"]
+            )
+            # create log entries so there is a record of adding/updating urls
+            LogEntry.objects.bulk_create(
+                [
+                    LogEntry(
+                        user_id=self.script_user.id,
+                        content_type_id=self.fragment_contenttype.pk,
+                        object_id=str(fragment.pk),
+                        object_repr=str(fragment)[:200],
+                        change_message=message,
+                        action_flag=CHANGE,
+                        action_time=now,
+                    )
+                    for fragment, message in changes
+                ]
+            )
+            Document.update_summaries(
+                Document.objects.filter(
+                    pk__in=self.affected_documents([f.pk for f in fragments])
+                )
+            )
+        self.updated_fragments.update(fragment.pk for fragment in fragments)
+
+    def set_thumbnails(self, fragments):
+        """Set thumbnail data for fragments with new IIIF urls from
+        locally cached manifests; remaining thumbnails are populated
+        by the **harvest_manifests** command."""
+        new_iiif = [f for f in fragments if f.iiif_url and not f.iiif_thumbnail_data]
+        manifests = Manifest.objects.in_bulk(
+            {f.iiif_url for f in new_iiif}, field_name="uri"
+        )
+        for fragment in new_iiif:
+            manifest = manifests.get(fragment.iiif_url)
+            if manifest:
+                fragment.iiif_thumbnail_data = Fragment.thumbnail_data(
+                    manifest.canvases
+                )
             else:
-                fragment.save()
-                self.log_change(fragment, " and ".join(log_message))
-        else:
-            self.stats["skipped"] += 1
-
-    def log_change(self, fragment, message):
-        # create log entry so there is a record of adding/updating urls
-        LogEntry.objects.log_action(
-            user_id=self.script_user.id,
-            content_type_id=self.fragment_contenttype.pk,
-            object_id=fragment.pk,
-            object_repr=str(fragment),
-            change_message=message,
-            action_flag=CHANGE,
+                self.stats["thumbnails_missing"] += 1
+
+    def affected_documents(self, fragment_ids):
+        """Ids of documents on any of the specified fragments"""
+        return TextBlock.objects.filter(fragment__in=fragment_ids).values("document")
+
+    def reindex(self, queue=False):
+        """Index all documents on updated fragments in Solr; if Solr is
+        not available or queue is specified, queue them to be reindexed
+        later."""
+        document_ids = self.affected_documents(self.updated_fragments)
+        if not queue:
+            try:
+                count = Document.index_items(
+                    Document.items_to_index().filter(pk__in=document_ids)
+                )
+                self.stdout.write(f"Reindexed {count} documents")
+                return
+            except requests.exceptions.ConnectionError:
+                self.stdout.write("Solr unavailable")
+        count = ReindexRequest.objects.enqueue(
+            document_ids.distinct().values_list("document", flat=True)
         )
+        self.stdout.write(f"Queued {count} documents for reindexing")
@@ -0,0 +1,71 @@
+"""
+**export_snapshots** is a custom manage command to generate compressed
+snapshots of the full CSV exports of documents, sources, footnotes, and
+metadata for the old PGP site. Requests for a full export are served from
+the snapshot when it is current. Snapshots are only regenerated when the
+exported data has changed, so this can be run frequently (e.g. nightly
+or hourly via cron).
+
+Example usage::
+
+    # regenerate snapshots with changed data
+    python manage.py export_snapshots
+    # regenerate only the documents snapshot, even if unchanged
+    python manage.py export_snapshots documents --force
+
+"""
+import time
+
+from django.contrib import admin
+from django.core.management.base import BaseCommand, CommandError
+
+from geniza.common.admin import CsvSnapshotMixin
+from geniza.corpus.views import old_pgp_snapshot
+
+
+class Command(BaseCommand):
+    """Generate snapshots of full CSV exports"""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "snapshots",
+            nargs="*",
+            help="Names of snapshots to generate (default: all)",
+        )
+        parser.add_argument(
+            "-f",
+            "--force",
+            action="store_true",
+            help="Regenerate snapshots even if data is unchanged",
+        )
+
+    def handle(self, *args, **options):
+        snapshots = self.get_snapshots()
+        names = options["snapshots"] or list(snapshots.keys())
+        unknown = set(names) - set(snapshots.keys())
+        if unknown:
+            raise CommandError(
+                "Unknown snapshot(s): %s (available: %s)"
+                % (", ".join(sorted(unknown)), ", ".join(sorted(snapshots)))
+            )
+
+        for name in names:
+            start = time.time()
+            if snapshots[name].generate(force=options["force"]):
+                self.stdout.write(
+                    "Generated %s snapshot in %.1fs" % (name, time.time() - start)
+                )
+            else:
+                self.stdout.write("%s snapshot is up to date" % name)
+
+    def get_snapshots(self):
+        """Dictionary of available snapshots by name"""
+        snapshots = {
+            model_admin.snapshot_name: model_admin.csv_snapshot
+            for model_admin in admin.site._registry.values()
+            if isinstance(model_admin, CsvSnapshotMixin)
+        }
+        snapshots[old_pgp_snapshot.name] = old_pgp_snapshot
+        return snapshots
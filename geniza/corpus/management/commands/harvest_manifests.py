@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from django.core.management.base import BaseCommand
+from piffle.presentation import IIIFException
+
+from geniza.corpus.models import Fragment, Manifest
+
+
+class HostRateLimiter:
+    """Thread-safe limiter that spaces out requests to the same host
+    by a minimum interval (in seconds)."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_request = defaultdict(float)
+
+    def wait(self, url):
+        """Block until a request to the host for this url is allowed."""
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_request[host])
+            self.next_request[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class Command(BaseCommand):
+    """Harvest IIIF manifests for all fragments with a IIIF URL into the
+    local manifest cache, so that images can be displayed without
+    requesting manifests from remote servers. Only manifests that are not
+    yet cached or are older than the configured cache TTL are requested,
+    unless --all is specified."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of manifests to request concurrently (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--delay",
+            type=float,
+            default=0.5,
+            help="Minimum seconds between requests to the same host "
+            + "(default: %(default)s)",
+        )
+        parser.add_argument(
+            "-a",
+            "--all",
+            action="store_true",
+            help="Revalidate all cached manifests, even if not stale",
+        )
+
+    def handle(self, *args, **options):
+        self.stats = Counter()
+        self.rate_limiter = HostRateLimiter(options["delay"])
+
+        manifests = self.get_manifests(revalidate_all=options["all"])
+        self.stats["skipped"] = self.stats["total"] - len(manifests)
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = {
+                executor.submit(self.fetch, manifest): manifest
+                for manifest in manifests
+            }
+            for future in as_completed(futures):
+                manifest = futures[future]
+                try:
+                    changed = future.result()
+                except (IIIFException, requests.exceptions.RequestException) as err:
+                    self.stats["error"] += 1
+                    self.stderr.write("Error harvesting %s: %s" % (manifest.uri, err))
+                    continue
+
+                # save in the main thread; workers only make http requests
+                manifest.save()
+                self.stats["updated" if changed else "unchanged"] += 1
+                if changed:
+                    self.update_fragments(manifest)
+
+        # populate thumbnails for fragments with cached manifests that
+        # don't have them yet
+        missing = Fragment.objects.filter(iiif_thumbnail_data=[]).exclude(iiif_url="")
+        for manifest in Manifest.objects.filter(uri__in=missing.values("iiif_url")):
+            self.update_fragments(manifest)
+
+        Manifest.objects.evict()
+        self.report(time.time() - start)
+
+    def get_manifests(self, revalidate_all=False):
+        """List of :class:`~geniza.corpus.models.Manifest` to be requested,
+        including unsaved manifests for IIIF urls not yet cached."""
+        iiif_urls = (
+            Fragment.objects.exclude(iiif_url="")
+            .values_list("iiif_url", flat=True)
+            .distinct()
+        )
+        cached = Manifest.objects.in_bulk(field_name="uri")
+
+        manifests = []
+        for iiif_url in iiif_urls:
+            self.stats["total"] += 1
+            manifest = cached.get(iiif_url)
+            if manifest is None:
+                manifests.append(Manifest(uri=iiif_url))
+            elif revalidate_all or manifest.is_stale():
+                manifests.append(manifest)
+        return manifests
+
+    def fetch(self, manifest):
+        """Request a single manifest, honoring the per-host rate limit."""
+        self.rate_limiter.wait(manifest.uri)
+        return manifest.fetch()
+
+    def update_fragments(self, manifest):
+        """Update stored thumbnail data for all fragments using a manifest."""
+        # update via queryset to skip save logic and reindexing;
+        # thumbnails are not included in the index
+        self.stats["fragments"] += Fragment.objects.filter(
+            iiif_url=manifest.uri
+        ).update(iiif_thumbnail_data=Fragment.thumbnail_data(manifest.canvases))
+
+    def report(self, elapsed):
+        requested = (
+            self.stats["updated"] + self.stats["unchanged"] + self.stats["error"]
+        )
+        self.stdout.write(f"Fragment IIIF URLs: {self.stats['total']}")
+        self.stdout.write(f"Manifests updated: {self.stats['updated']}")
+        self.stdout.write(f"Manifests unchanged: {self.stats['unchanged']}")
+        self.stdout.write(f"Manifests skipped (cached): {self.stats['skipped']}")
+        self.stdout.write(f"Errors: {self.stats['error']}")
+        self.stdout.write(f"Fragment thumbnails updated: {self.stats['fragments']}")
+        self.stdout.write(
+            "Requested %d manifests in %.1fs (%.1f/s)"
+            % (requested, elapsed, requested / elapsed if elapsed else 0)
+        )
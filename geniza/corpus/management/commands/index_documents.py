@@ -0,0 +1,256 @@
+"""
+**index_documents** is a custom manage command to reindex all documents
+in Solr in parallel. Documents are split into chunks by primary key range;
+each chunk is loaded, converted to index data and sent to Solr in batches
+by a pool of worker processes, each with its own database connection.
+
+With the incremental option, only documents that have changed since the
+last successful run (based on document and related record modification
+times, and documents queued for reindexing when related records are
+deleted) are indexed, and documents that no longer exist in the database
+are removed from the index.
+
+Example usage::
+
+    # reindex all documents using one process per cpu
+    python manage.py index_documents
+    # use four processes and send 500 documents to Solr at once
+    python manage.py index_documents -p 4 --batch-size 500
+    # index only documents changed since the last run
+    python manage.py index_documents --incremental
+
+"""
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import timezone
+from parasolr.django import SolrClient
+
+from geniza.corpus.models import Document, IndexWatermark
+from geniza.corpus.solr_queryset import bump_index_generation
+
+
+def index_pk_range(start, end, batch_size, commit_within=None):
+    """Index all documents with primary keys in the range from start
+    (inclusive) to end (exclusive), sending index data to Solr in batches.
+    Used as the unit of work for worker processes.
+
+    :returns: tuple of process id, number of documents indexed, and
+        elapsed time in seconds
+    """
+    start_time = time.time()
+    documents = (
+        Document.items_to_index().filter(pk__gte=start, pk__lt=end).order_by("pk")
+    )
+    count = index_in_batches(documents, batch_size, commit_within)
+    return (os.getpid(), count, time.time() - start_time)
+
+
+def indexed_pgpids(solr, rows=10000):
+    """Generator of the PGPIDs of all documents in the Solr index,
+    paged with a cursor."""
+    cursor = "*"
+    while True:
+        response = solr.query(
+            q="item_type_s:document",
+            fl="pgpid_i",
+            sort="id asc",
+            rows=rows,
+            cursorMark=cursor,
+            wrap=False,
+        )
+        if not response:
+            break
+        docs = response["response"]["docs"]
+        for doc in docs:
+            yield doc["pgpid_i"]
+        # a partial page or unchanged cursor means all results are returned
+        if len(docs) < rows or response["nextCursorMark"] == cursor:
+            break
+        cursor = response["nextCursorMark"]
+
+
+def index_in_batches(documents, batch_size, commit_within=None):
+    """Send index data for an iterable of documents to Solr in batches.
+
+    :returns: number of documents indexed
+    """
+    solr = SolrClient()
+    count = 0
+    batch = []
+    for doc in documents:
+        batch.append(doc.index_data())
+        if len(batch) >= batch_size:
+            solr.update.index(batch, commitWithin=commit_within)
+            count += len(batch)
+            batch = []
+    if batch:
+        solr.update.index(batch, commitWithin=commit_within)
+        count += len(batch)
+    return count
+
+
+class Command(BaseCommand):
+    """Reindex all documents in Solr using multiple processes"""
+
+    help = __doc__
+
+    #: name of the watermark recording when documents were last indexed
+    watermark_name = "documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-p",
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes (default: number of cpus)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Size of primary key range for each unit of work "
+            + "(default: %(default)s)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=Document.index_chunk_size,
+            help="Number of documents to send to Solr at once "
+            + "(default: %(default)s)",
+        )
+        parser.add_argument(
+            "--commit-within",
+            type=int,
+            help="Solr commitWithin value in milliseconds for indexing batches "
+            + "(default: as configured in SOLR_CONNECTIONS)",
+        )
+        parser.add_argument(
+            "-n",
+            "--incremental",
+            action="store_true",
+            help="Only index documents changed since the last successful run",
+        )
+
+    def handle(self, *args, **options):
+        # per-worker totals: process id -> [document count, elapsed time]
+        self.worker_stats = defaultdict(lambda: [0, 0.0])
+        # anything changed after this point will be picked up by the next run
+        run_started = timezone.now()
+        watermark = IndexWatermark.objects.filter(name=self.watermark_name).first()
+
+        start = time.time()
+        try:
+            if options["incremental"] and watermark:
+                self.stdout.write(
+                    "Indexing documents changed since %s" % watermark.timestamp
+                )
+                self.index_changed(watermark.timestamp, options)
+            else:
+                if options["incremental"]:
+                    self.stdout.write("No previous run found; indexing all documents")
+                self.index_all(options)
+
+            # commit all the indexed changes
+            SolrClient().update.index([], commit=True)
+            bump_index_generation()
+        except requests.exceptions.ConnectionError as err:
+            # bail out if we error connecting to Solr
+            raise CommandError(err)
+
+        # record watermark only after indexing completed successfully
+        IndexWatermark.objects.update_or_create(
+            name=self.watermark_name, defaults={"timestamp": run_started}
+        )
+        self.report(time.time() - start)
+
+    def index_changed(self, timestamp, options):
+        """Index documents changed since the specified time in the current
+        process; incremental updates are expected to be small."""
+        start = time.time()
+        documents = Document.items_to_index().filter(
+            pk__in=Document.changed_since(timestamp).values("pk")
+        )
+        count = index_in_batches(
+            documents, options["batch_size"], options["commit_within"]
+        )
+        self.add_result(os.getpid(), count, time.time() - start)
+        self.remove_deleted()
+
+    def remove_deleted(self):
+        """Remove documents from the index that no longer exist in the
+        database."""
+        solr = SolrClient()
+        deleted = set(indexed_pgpids(solr)) - set(
+            Document.objects.values_list("pk", flat=True)
+        )
+        if deleted:
+            solr.update.delete_by_id(
+                [Document(pk=pk).index_id() for pk in sorted(deleted)]
+            )
+            self.stdout.write("Removed %d deleted documents" % len(deleted))
+
+    def index_all(self, options):
+        """Index all documents, split into primary key ranges and
+        distributed across worker processes."""
+        pk_ranges = self.pk_ranges(options["chunk_size"])
+        work_args = (options["batch_size"], options["commit_within"])
+        if options["processes"] > 1:
+            # close db connections before starting worker processes,
+            # so that each worker opens its own connection
+            connections.close_all()
+            # fork workers so they inherit the configured django setup;
+            # spawned workers (the default on macOS) start without
+            # loaded apps and fail with AppRegistryNotReady
+            with ProcessPoolExecutor(
+                max_workers=options["processes"],
+                mp_context=multiprocessing.get_context("fork"),
+            ) as executor:
+                futures = [
+                    executor.submit(index_pk_range, range_start, range_end, *work_args)
+                    for range_start, range_end in pk_ranges
+                ]
+                for future in as_completed(futures):
+                    self.add_result(*future.result())
+        else:
+            for range_start, range_end in pk_ranges:
+                self.add_result(*index_pk_range(range_start, range_end, *work_args))
+
+    def pk_ranges(self, chunk_size):
+        """Split the full range of document primary keys into
+        tuples of (start, end) with the requested chunk size."""
+        pk_range = Document.objects.aggregate(Min("pk"), Max("pk"))
+        if pk_range["pk__min"] is None:
+            return []
+        return [
+            (range_start, range_start + chunk_size)
+            for range_start in range(
+                pk_range["pk__min"], pk_range["pk__max"] + 1, chunk_size
+            )
+        ]
+
+    def add_result(self, pid, count, elapsed):
+        self.worker_stats[pid][0] += count
+        self.worker_stats[pid][1] += elapsed
+
+    def report(self, elapsed):
+        total = 0
+        for pid, (count, worker_elapsed) in sorted(self.worker_stats.items()):
+            total += count
+            self.stdout.write(
+                "Worker %d: indexed %d documents (%.1f/s)"
+                % (pid, count, count / worker_elapsed if worker_elapsed else 0)
+            )
+        self.stdout.write(
+            "Indexed {:,} documents in {:.1f}s ({:.1f}/s)".format(
+                total, elapsed, total / elapsed if elapsed else 0
+            )
+        )
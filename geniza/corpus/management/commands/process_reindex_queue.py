@@ -0,0 +1,76 @@
+"""
+**process_reindex_queue** is a custom manage command to index documents
+queued for reindexing when related records that may be shared by many
+documents (tags, document types) are changed, or when Solr was not available
+to index changes to documents, fragments or text blocks. Requests for the
+same document are coalesced, so each document is indexed once per run no
+matter how often it was queued.
+
+Example usage::
+
+    # process all currently queued requests and exit
+    python manage.py process_reindex_queue
+    # run as a worker, checking the queue every 10 seconds
+    python manage.py process_reindex_queue --watch --interval 10
+
+"""
+import time
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from geniza.corpus.models import Document, ReindexRequest
+
+
+class Command(BaseCommand):
+    """Index documents queued for reindexing"""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-w",
+            "--watch",
+            action="store_true",
+            help="Keep running and poll the queue for new requests",
+        )
+        parser.add_argument(
+            "-i",
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait between polling the queue in watch mode "
+            + "(default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                count = self.process_queue()
+                if count:
+                    self.stdout.write("Indexed %d queued document(s)" % count)
+                if not options["watch"]:
+                    break
+                time.sleep(options["interval"])
+        except requests.exceptions.ConnectionError as err:
+            # bail out if we error connecting to Solr; requests stay queued
+            raise CommandError(err)
+        except KeyboardInterrupt:
+            pass
+
+    def process_queue(self):
+        """Index all documents currently in the queue and remove the
+        processed requests. Returns the number of documents indexed."""
+        max_pk = ReindexRequest.objects.aggregate(Max("pk"))["pk__max"]
+        if max_pk is None:
+            return 0
+        # limit to requests present now; anything queued while indexing
+        # is handled on the next pass
+        pending = ReindexRequest.objects.filter(pk__lte=max_pk)
+        # documents deleted since they were queued are skipped
+        docs = Document.items_to_index().filter(pk__in=pending.values("document_id"))
+        count = Document.index_items(docs)
+        # only remove requests once indexing has succeeded
+        pending.delete()
+        return count
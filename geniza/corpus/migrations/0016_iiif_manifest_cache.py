@@ -0,0 +1,38 @@
+# Generated by Django 3.1 on 2026-10-17 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0015_add_document_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Manifest",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "uri",
+                    models.URLField(max_length=255, unique=True, verbose_name="URI"),
+                ),
+                ("canvases", models.JSONField(default=list)),
+                ("etag", models.CharField(blank=True, max_length=255)),
+                ("http_last_modified", models.CharField(blank=True, max_length=255)),
+                ("fetched", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "IIIF manifest",
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-17 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0016_iiif_manifest_cache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fragment",
+            name="iiif_thumbnail_data",
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
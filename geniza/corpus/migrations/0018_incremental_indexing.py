@@ -0,0 +1,34 @@
+# Generated by Django 3.1 on 2026-10-17 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0017_fragment_iiif_thumbnail_data"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndexWatermark",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("timestamp", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="textblock",
+            name="last_modified",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
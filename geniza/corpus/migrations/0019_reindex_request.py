@@ -0,0 +1,29 @@
+# Generated by Django 3.1 on 2026-10-17 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0018_incremental_indexing"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReindexRequest",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("document_id", models.IntegerField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
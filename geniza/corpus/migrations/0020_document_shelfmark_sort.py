@@ -0,0 +1,41 @@
+# Generated by Django 3.1 on 2026-10-17 06:16
+
+from django.db import migrations, models
+
+
+def populate_shelfmark_sort(apps, schema_editor):
+    # set sort key for existing documents from shelfmarks of
+    # associated fragments, in text block order
+    Document = apps.get_model("corpus", "Document")
+    TextBlock = apps.get_model("corpus", "TextBlock")
+    shelfmarks = {}
+    for doc_id, shelfmark in TextBlock.objects.order_by("order").values_list(
+        "document_id", "fragment__shelfmark"
+    ):
+        shelfmarks.setdefault(doc_id, {})[shelfmark] = None
+
+    documents = []
+    for doc in Document.objects.filter(pk__in=shelfmarks.keys()).only("pk"):
+        doc.shelfmark_sort = " + ".join(shelfmarks[doc.pk])[:255]
+        documents.append(doc)
+    Document.objects.bulk_update(documents, ["shelfmark_sort"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0019_reindex_request"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="shelfmark_sort",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(
+            populate_shelfmark_sort, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 3.1 on 2026-10-17 06:18
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_summaries(apps, schema_editor):
+    # calculate stored summary values for existing documents
+    Document = apps.get_model("corpus", "Document")
+    DocumentSummary = apps.get_model("corpus", "DocumentSummary")
+    TextBlock = apps.get_model("corpus", "TextBlock")
+    Footnote = apps.get_model("footnotes", "Footnote")
+    ContentType = apps.get_model("contenttypes", "ContentType")
+
+    blocks = {}
+    for block in TextBlock.objects.select_related(
+        "fragment", "fragment__collection"
+    ).order_by("order"):
+        blocks.setdefault(block.document_id, []).append(block)
+
+    doc_type = ContentType.objects.filter(app_label="corpus", model="document").first()
+    transcribed = set()
+    if doc_type:
+        transcribed = set(
+            Footnote.objects.filter(
+                content_type=doc_type, content__isnull=False
+            ).values_list("object_id", flat=True)
+        )
+
+    summaries = []
+    for doc_id in Document.objects.values_list("pk", flat=True):
+        doc_blocks = blocks.get(doc_id, [])
+        certain = list(
+            dict.fromkeys(b.fragment.shelfmark for b in doc_blocks if b.certain)
+        )
+        iiif_urls = list(
+            dict.fromkeys(filter(None, [b.fragment.iiif_url for b in doc_blocks]))
+        )
+        summaries.append(
+            DocumentSummary(
+                document_id=doc_id,
+                shelfmark=" + ".join(certain),
+                shelfmark_display=certain[0] + (" + …" if len(certain) > 1 else "")
+                if certain
+                else None,
+                collection=", ".join(
+                    sorted(
+                        set(
+                            b.fragment.collection.abbrev
+                            for b in doc_blocks
+                            if b.fragment.collection
+                        )
+                    )
+                ),
+                iiif_urls=iiif_urls,
+                has_image=bool(iiif_urls),
+                has_transcription=doc_id in transcribed,
+            )
+        )
+    DocumentSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("footnotes", "0013_source_last_modified"),
+        ("corpus", "0020_document_shelfmark_sort"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentSummary",
+            fields=[
+                (
+                    "document",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="corpus.document",
+                    ),
+                ),
+                ("shelfmark", models.TextField(blank=True)),
+                ("shelfmark_display", models.TextField(blank=True, null=True)),
+                ("collection", models.TextField(blank=True)),
+                (
+                    "iiif_urls",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.URLField(), default=list, size=None
+                    ),
+                ),
+                ("has_image", models.BooleanField(default=False)),
+                ("has_transcription", models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(
+            populate_summaries, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1 on 2026-10-17 07:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("admin", "0003_logentry_add_action_flag_choices"),
+        ("corpus", "0021_document_summary"),
+    ]
+
+    # This index is on the django admin log table, which belongs to the
+    # admin app. It lives in corpus because only corpus queries need it
+    # (earliest log entry dates for documents, used for indexing and
+    # exports), and django migrations can't add indexes to
+    # another app's models. Raw SQL is used since there is no model to
+    # alter. The dependency on the admin migration ensures the table
+    # exists, and CREATE/DROP INDEX IF EXISTS is supported by both
+    # PostgreSQL and SQLite.
+    operations = [
+        # index admin log entries by object, so that the earliest log entry
+        # for each document can be looked up efficiently
+        migrations.RunSQL(
+            sql="CREATE INDEX IF NOT EXISTS corpus_logentry_object_idx "
+            + "ON django_admin_log (content_type_id, object_id, action_time)",
+            reverse_sql="DROP INDEX IF EXISTS corpus_logentry_object_idx",
+        ),
+    ]
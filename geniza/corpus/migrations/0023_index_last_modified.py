@@ -0,0 +1,28 @@
+# Generated by Django 3.1 on 2026-10-17 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0022_logentry_object_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="document",
+            name="last_modified",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="fragment",
+            name="last_modified",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="textblock",
+            name="last_modified",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
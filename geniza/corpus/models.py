@@ -1,22 +1,29 @@
 from collections import defaultdict
+from datetime import timedelta
 import logging
+import re
 
-from django.db import models
+import requests
+from django.conf import settings
+from django.db import models, transaction
 from django.db.models.query import Prefetch
 from django.urls import reverse
-from django.db.models.functions import Concat
+from django.db.models.functions import Cast, Concat
 from django.contrib.admin.models import LogEntry
 from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.postgres.fields import ArrayField
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from piffle.image import IIIFImageClient
-from piffle.presentation import IIIFPresentation
+from piffle.presentation import IIIFException, IIIFPresentation
 from taggit.models import Tag
 from taggit_selectize.managers import TaggableManager
 from parasolr.django.indexing import ModelIndexable
 
 from geniza.footnotes.models import Footnote
 from geniza.common.models import TrackChangesModel
+from geniza.common.utils import iterate_in_chunks
+from geniza.corpus.solr_queryset import commit_index_changes
 
 
 logger = logging.getLogger(__name__)
@@ -27,7 +34,7 @@ class CollectionManager(models.Manager):
         return self.get(name=name, library=library)
 
 
-class Collection(models.Model):
+class Collection(TrackChangesModel):
     """Collection or library that holds Geniza fragments"""
 
     library = models.CharField(max_length=255, blank=True)  # optional
@@ -79,6 +86,18 @@ class Collection(models.Model):
     def natural_key(self):
         return (self.name, self.library)
 
+    def save(self, *args, **kwargs):
+        # collection names are included in stored document summaries
+        summary_changed = self.pk and any(
+            self.has_changed(field)
+            for field in ["lib_abbrev", "abbrev", "name", "library"]
+        )
+        super().save(*args, **kwargs)
+        if summary_changed:
+            Document.update_summaries(
+                Document.objects.filter(fragments__collection=self).distinct()
+            )
+
 
 class LanguageScriptManager(models.Manager):
     def get_by_natural_key(self, language, script):
@@ -120,6 +139,137 @@ class LanguageScript(models.Model):
         return (self.language, self.script)
 
 
+class ManifestManager(models.Manager):
+    def get_by_natural_key(self, uri):
+        return self.get(uri=uri)
+
+    def get_manifest(self, uri):
+        """Get the cached :class:`Manifest` for a IIIF manifest URL,
+        fetching it from the remote server if it has not been cached yet
+        and revalidating it if it is older than the configured TTL. If
+        revalidation fails, the stale cached copy is returned."""
+        try:
+            manifest = self.get(uri=uri)
+        except self.model.DoesNotExist:
+            manifest = self.model(uri=uri)
+
+        if manifest.pk and not manifest.is_stale():
+            return manifest
+
+        try:
+            manifest.fetch()
+        except (IIIFException, requests.exceptions.RequestException) as err:
+            # no cached copy to fall back to; raise the error
+            if not manifest.pk:
+                raise
+            logger.warning("Using stale cached manifest for %s: %s", uri, err)
+            return manifest
+
+        created = not manifest.pk
+        manifest.save()
+        if created:
+            self.evict()
+        return manifest
+
+    def evict(self):
+        """Remove the least recently fetched manifests when the cache is
+        larger than the configured maximum number of entries."""
+        max_entries = settings.IIIF_MANIFEST_CACHE_MAX_ENTRIES
+        if not max_entries:
+            return
+        expired = self.order_by("-fetched").values_list("pk", flat=True)[max_entries:]
+        self.filter(pk__in=list(expired)).delete()
+
+
+class Manifest(models.Model):
+    """Local cache of a remote IIIF presentation manifest; stores the
+    image ids and labels for each canvas, so that fragment images can be
+    displayed without requesting the manifest on every page load."""
+
+    uri = models.URLField("URI", max_length=255, unique=True)
+    #: list of ``[image_id, label]`` for each canvas, in manifest order
+    canvases = models.JSONField(default=list)
+    #: HTTP ETag header from the last successful response, for revalidation
+    etag = models.CharField(max_length=255, blank=True)
+    #: HTTP Last-Modified header from the last successful response
+    http_last_modified = models.CharField(max_length=255, blank=True)
+    #: date the manifest was last retrieved or revalidated
+    fetched = models.DateTimeField()
+
+    objects = ManifestManager()
+
+    class Meta:
+        verbose_name = "IIIF manifest"
+
+    def __str__(self):
+        return self.uri
+
+    def natural_key(self):
+        return (self.uri,)
+
+    def is_stale(self):
+        """Check if the cached manifest is older than the configured TTL."""
+        ttl = timedelta(seconds=settings.IIIF_MANIFEST_CACHE_TTL)
+        return self.fetched is None or self.fetched + ttl < timezone.now()
+
+    @staticmethod
+    def parse_canvases(manifest):
+        """Get a list of image id and label for every canvas in a
+        :class:`~piffle.presentation.IIIFPresentation` manifest."""
+        return [
+            # label provides library's recto/verso designation
+            [canvas.images[0].resource.id, canvas.label]
+            for canvas in manifest.sequences[0].canvases
+        ]
+
+    def fetch(self):
+        """Retrieve the manifest from the remote server, sending any cached
+        ETag or Last-Modified values so the server can report that the
+        manifest has not changed. Does not save.
+
+        :returns: True if the manifest content was (re)loaded, False if
+            the server reported it unchanged
+        :raises: :class:`~piffle.presentation.IIIFException` if the
+            manifest could not be retrieved or parsed, or the server did
+            not respond within :setting:`IIIF_MANIFEST_TIMEOUT` seconds
+        """
+        headers = {}
+        if self.pk and self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.pk and self.http_last_modified:
+            headers["If-Modified-Since"] = self.http_last_modified
+
+        try:
+            response = requests.get(
+                self.uri, headers=headers, timeout=settings.IIIF_MANIFEST_TIMEOUT
+            )
+        except requests.exceptions.Timeout as err:
+            raise IIIFException(
+                "Timed out retrieving manifest at %s: %s" % (self.uri, err)
+            )
+        if response.status_code == requests.codes.not_modified:
+            self.fetched = timezone.now()
+            return False
+        if response.status_code != requests.codes.ok:
+            raise IIIFException(
+                "Error retrieving manifest at %s: %s %s"
+                % (self.uri, response.status_code, response.reason)
+            )
+        try:
+            self.canvases = self.parse_canvases(IIIFPresentation(response.json()))
+        except ValueError as err:
+            raise IIIFException("Error parsing JSON for %s: %s" % (self.uri, err))
+        except (AttributeError, IndexError, KeyError) as err:
+            raise IIIFException(
+                "Unexpected manifest content at %s: %s" % (self.uri, err)
+            )
+
+        self.etag = response.headers.get("etag", "")
+        self.http_last_modified = response.headers.get("last-modified", "")
+        self.fetched = timezone.now()
+        return True
+
+
 class FragmentManager(models.Manager):
     def get_by_natural_key(self, shelfmark):
         return self.get(shelfmark=shelfmark)
@@ -145,6 +295,9 @@ class Fragment(TrackChangesModel):
         "URL", blank=True, help_text="Link to library catalog record for this fragment."
     )
     iiif_url = models.URLField("IIIF URL", blank=True)
+    #: thumbnail url and label for each image in the IIIF manifest;
+    #: populated automatically when IIIF url is changed
+    iiif_thumbnail_data = models.JSONField(default=list, blank=True, editable=False)
     is_multifragment = models.BooleanField(
         "Multifragment",
         default=False,
@@ -157,7 +310,7 @@ class Fragment(TrackChangesModel):
     )
 
     created = models.DateTimeField(auto_now_add=True)
-    last_modified = models.DateTimeField(auto_now=True)
+    last_modified = models.DateTimeField(auto_now=True, db_index=True)
 
     objects = FragmentManager()
 
@@ -176,28 +329,48 @@ class Fragment(TrackChangesModel):
             return None
         images = []
         labels = []
-        manifest = IIIFPresentation.from_url(self.iiif_url)
-        for canvas in manifest.sequences[0].canvases:
-            image_id = canvas.images[0].resource.id
+        # use locally cached manifest data when available
+        manifest = Manifest.objects.get_manifest(self.iiif_url)
+        for image_id, label in manifest.canvases:
             images.append(IIIFImageClient(*image_id.rsplit("/", 1)))
-            # label provides library's recto/verso designation
-            labels.append(canvas.label)
+            labels.append(label)
 
         return images, labels
 
-    def iiif_thumbnails(self):
-        # if there are no iiif images for this fragment, bail out
-        iiif_images = self.iiif_images()
-        if iiif_images is None:
-            return ""
+    @staticmethod
+    def thumbnail_data(canvases):
+        """Generate thumbnail url and label for each canvas in a cached
+        :class:`Manifest`, for storing in :attr:`iiif_thumbnail_data`."""
+        return [
+            {
+                "url": str(IIIFImageClient(*image_id.rsplit("/", 1)).size(height=200)),
+                "label": label,
+            }
+            for image_id, label in canvases
+        ]
+
+    def update_iiif_thumbnails(self):
+        """Populate :attr:`iiif_thumbnail_data` from the IIIF manifest.
+        Does not save."""
+        self.iiif_thumbnail_data = []
+        if self.iiif_url:
+            try:
+                manifest = Manifest.objects.get_manifest(self.iiif_url)
+                self.iiif_thumbnail_data = self.thumbnail_data(manifest.canvases)
+            except (IIIFException, requests.exceptions.RequestException) as err:
+                # don't prevent saving; thumbnails can be populated later
+                # by harvesting manifests
+                logger.warning("Error loading IIIF thumbnails for %s: %s", self, err)
 
-        images, labels = iiif_images
+    def iiif_thumbnails(self):
+        # use precomputed thumbnail data so that display never requires
+        # retrieving or parsing the manifest
         return mark_safe(
             " ".join(
                 # include label as title for now
                 '<img src="%s" loading="lazy" height="200" title="%s">'
-                % (img.size(height=200), labels[i])
-                for i, img in enumerate(images)
+                % (thumbnail["url"], thumbnail["label"])
+                for thumbnail in self.iiif_thumbnail_data
             )
         )
 
@@ -211,7 +384,27 @@ class Fragment(TrackChangesModel):
                 self.old_shelfmarks = ";".join(old_shelfmarks - {self.shelfmark})
             else:
                 self.old_shelfmarks = self.initial_value("shelfmark")
+        # update thumbnails when IIIF url is set or changed
+        if (not self.pk and self.iiif_url) or self.has_changed("iiif_url"):
+            self.update_iiif_thumbnails()
+        summary_changed = self.pk and any(
+            self.has_changed(field)
+            for field in ["shelfmark", "collection_id", "iiif_url"]
+        )
         super(Fragment, self).save(*args, **kwargs)
+        # update summary for documents on this fragment
+        if summary_changed:
+            for doc in self.documents.all():
+                doc.update_summary()
+
+    def delete(self, *args, **kwargs):
+        # documents on this fragment lose a shelfmark when the
+        # text blocks are removed
+        documents = list(self.documents.all())
+        result = super().delete(*args, **kwargs)
+        for doc in documents:
+            doc.update_summary()
+        return result
 
 
 class DocumentType(models.Model):
@@ -223,6 +416,109 @@ class DocumentType(models.Model):
         return self.name
 
 
+class IndexWatermarkManager(models.Manager):
+    def get_by_natural_key(self, name):
+        return self.get(name=name)
+
+
+class IndexWatermark(models.Model):
+    """Time as of which a set of indexed content was last fully brought up
+    to date in Solr; used for incremental indexing."""
+
+    name = models.CharField(max_length=255, unique=True)
+    timestamp = models.DateTimeField()
+
+    objects = IndexWatermarkManager()
+
+    def __str__(self):
+        return f"{self.name} indexed as of {self.timestamp}"
+
+    def natural_key(self):
+        return (self.name,)
+
+
+class ReindexRequestManager(models.Manager):
+    def enqueue(self, document_ids):
+        """Queue the specified documents to be reindexed; returns the
+        number of requests added."""
+        return len(
+            self.bulk_create(
+                [self.model(document_id=doc_id) for doc_id in document_ids]
+            )
+        )
+
+
+class ReindexRequest(models.Model):
+    """A queued request to reindex a document in Solr after a change to
+    related data, processed asynchronously by the
+    **process_reindex_queue** manage command."""
+
+    # not a foreign key, so that requests can be queued while a
+    # document is being deleted
+    document_id = models.IntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = ReindexRequestManager()
+
+    def __str__(self):
+        return f"Reindex request for PGPID {self.document_id}"
+
+
+class DocumentIndexBatch:
+    """Collects documents to be indexed or removed from the index during
+    a database transaction, so that they can be sent to Solr in a single
+    batched update when the transaction is committed. Documents changed
+    multiple times in a transaction are only indexed once, and nothing
+    is sent to Solr if the transaction is rolled back."""
+
+    def __init__(self):
+        self.pks = set()
+
+    @classmethod
+    def add(cls, document):
+        """Add a document to the batch for the current transaction.
+        Outside of a transaction, the document is indexed immediately."""
+        cls.add_ids([document.pk])
+
+    @classmethod
+    def add_ids(cls, document_ids):
+        """Add documents by id to the batch for the current transaction."""
+        connection = transaction.get_connection()
+        batch = getattr(connection, "document_index_batch", None)
+        # start a new batch if there is none pending for this transaction;
+        # callbacks are discarded when a transaction is rolled back
+        if batch is None or not any(
+            func == batch.flush for _, func in connection.run_on_commit
+        ):
+            batch = connection.document_index_batch = cls()
+            batch.pks.update(document_ids)
+            # runs immediately when not in a transaction
+            transaction.on_commit(batch.flush)
+        else:
+            batch.pks.update(document_ids)
+
+    def flush(self):
+        """Index documents in the batch based on their committed state,
+        and remove any that no longer exist from the index. If Solr is
+        not available, documents are queued to be reindexed later."""
+        pks, self.pks = self.pks, set()
+        try:
+            docs = list(Document.items_to_index().filter(pk__in=pks))
+            if docs:
+                Document.index_items(docs)
+            deleted = pks - {doc.pk for doc in docs}
+            if deleted:
+                # initializing documents also initializes the solr client
+                index_ids = [Document(pk=pk).index_id() for pk in deleted]
+                Document.solr.update.delete_by_id(index_ids)
+                commit_index_changes(Document.solr)
+        except requests.exceptions.ConnectionError:
+            logger.warning(
+                "Solr unavailable; queued %d document(s) for reindexing", len(pks)
+            )
+            ReindexRequest.objects.enqueue(pks)
+
+
 class DocumentSignalHandlers:
     """Signal handlers for indexing :class:`Document` records when
     related records are saved or deleted."""
@@ -236,9 +532,15 @@ class DocumentSignalHandlers:
         "Related Fragment": "textblock",  # textblock verbose name
     }
 
+    # fragments and text blocks belong to only a few documents; index
+    # them with the rest of the current transaction. Changes to other
+    # models can affect many documents, so they are queued for a worker
+    batched_models = ["fragment", "Related Fragment"]
+
     @staticmethod
     def related_change(instance, raw, mode):
-        """reindex all associated documents when related data is changed"""
+        """index or queue all associated documents for reindexing when
+        related data is changed"""
         # common logic for save and delete
         # raw = saved as presented; don't query the database
         if raw or not instance.pk:
@@ -255,15 +557,29 @@ class DocumentSignalHandlers:
             return
 
         doc_filter = {"%s__pk" % doc_attr: instance.pk}
-        docs = Document.items_to_index().filter(**doc_filter)
-        if docs.exists():
+        doc_ids = Document.objects.filter(**doc_filter).values_list("pk", flat=True)
+        if model_name in DocumentSignalHandlers.batched_models:
+            # index along with any other changes to the same documents
+            # when the current transaction is committed
+            DocumentIndexBatch.add_ids(doc_ids)
+            return
+        # only queue; indexing is handled by a separate worker process
+        # so that saves return immediately and repeated changes coalesce
+        queued = ReindexRequest.objects.enqueue(doc_ids)
+        if queued:
             logger.debug(
-                "%s %s, reindexing %d related document(s)",
+                "%s %s, queued %d related document(s) for reindexing",
                 model_name,
                 mode,
-                docs.count(),
+                queued,
             )
-            ModelIndexable.index_items(docs)
+
+    @staticmethod
+    def footnote_delete(sender, instance=None, **_kwargs):
+        """queue a document for reindexing when one of its footnotes
+        is deleted"""
+        if instance.content_type.model_class() is Document:
+            ReindexRequest.objects.enqueue([instance.object_id])
 
     @staticmethod
     def related_save(sender, instance=None, raw=False, **_kwargs):
@@ -276,6 +592,23 @@ class DocumentSignalHandlers:
         DocumentSignalHandlers.related_change(instance, raw, "delete")
 
 
+class DocumentQuerySet(models.QuerySet):
+    def with_log_entry_dates(self):
+        """Annotate documents with the time of their earliest log entry,
+        as `first_entry_time`, to avoid querying log entries for each
+        document."""
+        entries = LogEntry.objects.filter(
+            content_type__app_label="corpus",
+            content_type__model="document",
+            object_id=Cast(models.OuterRef("pk"), models.CharField()),
+        )
+        return self.annotate(
+            first_entry_time=models.Subquery(
+                entries.order_by("action_time").values("action_time")[:1]
+            )
+        )
+
+
 class Document(ModelIndexable):
     """A unified document such as a letter or legal document that
     appears on one or more fragments."""
@@ -305,12 +638,17 @@ class Document(ModelIndexable):
     )
     notes = models.TextField(blank=True)
     created = models.DateTimeField(auto_now_add=True)
-    last_modified = models.DateTimeField(auto_now=True)
+    last_modified = models.DateTimeField(auto_now=True, db_index=True)
     needs_review = models.TextField(
         blank=True,
         help_text="Enter text here if an administrator needs to review this document.",
     )
     old_pgpids = ArrayField(models.IntegerField(), null=True)
+    #: shelfmarks of associated fragments in text block order, for sorting;
+    #: updated automatically when text blocks or fragment shelfmarks change
+    shelfmark_sort = models.CharField(
+        max_length=255, blank=True, db_index=True, editable=False
+    )
 
     PUBLIC = "P"
     SUPPRESSED = "S"
@@ -363,8 +701,10 @@ class Document(ModelIndexable):
     footnotes = GenericRelation(Footnote, related_query_name="document")
     log_entries = GenericRelation(LogEntry, related_query_name="document")
 
+    objects = DocumentQuerySet.as_manager()
+
     # NOTE: default ordering disabled for now because it results in duplicates
-    # in django admin; see admin for ArrayAgg sorting solution
+    # in django admin; see admin for shelfmark sort key ordering
     class Meta:
         pass
         # abstract = False
@@ -373,9 +713,26 @@ class Document(ModelIndexable):
     def __str__(self):
         return f"{self.shelfmark_display or '??'} (PGPID {self.id or '??'})"
 
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        super().save(*args, **kwargs)
+        # new documents need a summary even before any text blocks
+        # or footnotes are added
+        if created:
+            self.update_summary()
+
+    @property
+    def stored_summary(self):
+        """:class:`DocumentSummary` if it was loaded along with the document
+        via ``select_related("summary")``; otherwise None, and derived values
+        are calculated from related records."""
+        return self._state.fields_cache.get("summary")
+
     @property
     def shelfmark(self):
         """shelfmarks for associated fragments"""
+        if self.stored_summary:
+            return self.stored_summary.shelfmark
         # access via textblock so we follow specified order,
         # use dict keys to ensure unique
         return " + ".join(
@@ -386,15 +743,115 @@ class Document(ModelIndexable):
             )
         )
 
+    def shelfmark_sort_key(self):
+        """Sort key based on shelfmarks for all associated fragments,
+        including uncertain joins, in text block order."""
+        return " + ".join(
+            dict.fromkeys(
+                block.fragment.shelfmark for block in self.textblock_set.all()
+            )
+        )[: self._meta.get_field("shelfmark_sort").max_length]
+
+    def shelfmark_index_sort_key(self):
+        """Normalized shelfmark sort key for Solr: case-insensitive, with
+        numbers zero-padded so that they sort numerically."""
+        return re.sub(
+            r"\d+",
+            lambda match: match.group().zfill(6),
+            self.shelfmark_sort_key().lower(),
+        )
+
+    def summary_values(self):
+        """Values for :class:`DocumentSummary`, calculated from related
+        records; use with prefetched text blocks and footnotes."""
+        return {
+            "shelfmark": self.shelfmark,
+            "shelfmark_display": self.shelfmark_display,
+            "collection": self.collection,
+            "iiif_urls": self.iiif_urls(),
+            "has_image": self.has_image(),
+            "has_transcription": self.has_transcription(),
+        }
+
+    @classmethod
+    def update_summaries(cls, documents):
+        """Update stored shelfmark sort keys and summaries in bulk for
+        a queryset of documents, e.g. after fragments have been updated
+        without saving individually."""
+        documents = documents.prefetch_related(
+            "footnotes",
+            Prefetch(
+                "textblock_set",
+                queryset=TextBlock.objects.select_related(
+                    "fragment", "fragment__collection"
+                ),
+            ),
+        )
+        chunk = []
+        for doc in iterate_in_chunks(documents):
+            doc.shelfmark_sort = doc.shelfmark_sort_key()
+            chunk.append(doc)
+            if len(chunk) >= 1000:
+                cls._save_summaries(chunk)
+                chunk = []
+        if chunk:
+            cls._save_summaries(chunk)
+
+    @classmethod
+    def _save_summaries(cls, documents):
+        with transaction.atomic():
+            cls.objects.bulk_update(documents, ["shelfmark_sort"])
+            # replace any existing summaries
+            DocumentSummary.objects.filter(document__in=documents).delete()
+            DocumentSummary.objects.bulk_create(
+                [
+                    DocumentSummary(document=doc, **doc.summary_values())
+                    for doc in documents
+                ]
+            )
+
+    def update_summary(self):
+        """Update the stored shelfmark sort key and :class:`DocumentSummary`
+        from current related records, without saving other fields or
+        updating modification time."""
+        # reload to avoid stale prefetched or cached related data
+        doc = (
+            Document.objects.prefetch_related(
+                "footnotes",
+                Prefetch(
+                    "textblock_set",
+                    queryset=TextBlock.objects.select_related(
+                        "fragment", "fragment__collection"
+                    ),
+                ),
+            )
+            .filter(pk=self.pk)
+            .first()
+        )
+        # nothing to do if the document has been deleted
+        if not doc:
+            return
+
+        self.shelfmark_sort = doc.shelfmark_sort_key()
+        Document.objects.filter(pk=self.pk).update(shelfmark_sort=self.shelfmark_sort)
+        DocumentSummary.objects.update_or_create(
+            document=doc, defaults=doc.summary_values()
+        )
+        # don't use a previously loaded summary
+        self._state.fields_cache.pop("summary", None)
+
     @property
     def shelfmark_display(self):
         """First shelfmark plus join indicator for shorter display."""
         # NOTE preliminary pending more discussion and implementation of #154:
         # https://github.com/Princeton-CDH/geniza/issues/154
+        if self.stored_summary:
+            return self.stored_summary.shelfmark_display
         certain = list(
             dict.fromkeys(
                 block.fragment.shelfmark
-                for block in self.textblock_set.filter(certain=True)
+                for block in self.textblock_set.all()
+                if block.certain  # filter locally to take advantage of prefetching
             ).keys()
         )
         if not certain:
@@ -404,6 +861,8 @@ class Document(ModelIndexable):
     @property
     def collection(self):
         """collection (abbreviation) for associated fragments"""
+        if self.stored_summary:
+            return self.stored_summary.collection
         # use set to ensure unique; sort for reliable output order
         return ", ".join(
             sorted(
@@ -445,6 +904,8 @@ class Document(ModelIndexable):
 
     def iiif_urls(self):
         """List of IIIF urls for images of the Document's Fragments."""
+        if self.stored_summary:
+            return self.stored_summary.iiif_urls
         return list(
             dict.fromkeys(
                 filter(None, [b.fragment.iiif_url for b in self.textblock_set.all()])
@@ -461,6 +922,8 @@ class Document(ModelIndexable):
 
     def has_transcription(self):
         """Admin display field indicating if document has a transcription."""
+        if self.stored_summary:
+            return self.stored_summary.has_transcription
         return any(note.has_transcription() for note in self.footnotes.all())
 
     has_transcription.short_description = "Transcription"
@@ -469,12 +932,25 @@ class Document(ModelIndexable):
 
     def has_image(self):
         """Admin display field indicating if document has a IIIF image."""
+        if self.stored_summary:
+            return self.stored_summary.has_image
         return any(self.iiif_urls())
 
     has_image.short_description = "Image"
     has_image.boolean = True
     has_image.admin_order_field = "textblock__fragment__iiif_url"
 
+    @property
+    def input_date(self):
+        """Time of the earliest log entry, when the document was first
+        entered; uses the annotation from
+        :meth:`DocumentQuerySet.with_log_entry_dates` when available."""
+        if hasattr(self, "first_entry_time"):
+            return self.first_entry_time
+        # default log entry sort is most recent first, so initial input is last
+        first_entry = self.log_entries.last()
+        return first_entry.action_time if first_entry else None
+
     @property
     def title(self):
         """Short title for identifying the document, e.g. via search."""
@@ -483,27 +959,89 @@ class Document(ModelIndexable):
     def editions(self):
         """All footnotes for this document where the document relation includes
         edition; footnotes with content will be sorted first."""
-        return self.footnotes.filter(doc_relation__contains=Footnote.EDITION).order_by(
-            "content", "source"
+        return (
+            self.footnotes.with_sources()
+            .filter(doc_relation__contains=Footnote.EDITION)
+            .order_by("content", "source")
+        )
+
+    @classmethod
+    def changed_since(cls, timestamp):
+        """Documents modified after the specified time, including documents
+        with related fragments, text blocks, footnotes, or log entries
+        that were changed or added after that time, and documents queued
+        for reindexing after that time (e.g. when related records were
+        deleted)."""
+        return cls.objects.filter(
+            models.Q(last_modified__gt=timestamp)
+            | models.Q(
+                pk__in=TextBlock.objects.filter(
+                    models.Q(last_modified__gt=timestamp)
+                    | models.Q(fragment__last_modified__gt=timestamp)
+                ).values("document")
+            )
+            | models.Q(
+                pk__in=Footnote.objects.filter(
+                    content_type__app_label="corpus",
+                    content_type__model="document",
+                    last_modified__gt=timestamp,
+                ).values("object_id")
+            )
+            | models.Q(
+                pk__in=LogEntry.objects.filter(
+                    content_type__app_label="corpus",
+                    content_type__model="document",
+                    action_time__gt=timestamp,
+                )
+                .annotate(document_id=Cast("object_id", models.IntegerField()))
+                .values("document_id")
+            )
+            | models.Q(
+                pk__in=ReindexRequest.objects.filter(created__gt=timestamp).values(
+                    "document_id"
+                )
+            )
         )
 
+    def index(self):
+        """Queue this document to be indexed when the current
+        transaction is committed."""
+        DocumentIndexBatch.add(self)
+
+    def remove_from_index(self):
+        """Queue this document to be removed from the index when the
+        current transaction is committed."""
+        DocumentIndexBatch.add(self)
+
+    @classmethod
+    def index_items(cls, *args, **kwargs):
+        """Extend :meth:`parasolr.indexing.Indexable.index_items` to
+        commit the changes and invalidate cached search results."""
+        count = super().index_items(*args, **kwargs)
+        commit_index_changes(cls.solr)
+        return count
+
     @classmethod
     def items_to_index(cls):
         """Custom logic for finding items to be indexed when indexing in
         bulk."""
         # TODO: can we share common/reused prefetching logic
         # in a custom qureyset filter or similar? (adapted here from admin)
-        return cls.objects.select_related("doctype").prefetch_related(
-            "tags",
-            "languages",
-            "footnotes",
-            "log_entries",
-            Prefetch(
-                "textblock_set",
-                queryset=TextBlock.objects.select_related(
-                    "fragment", "fragment__collection"
+        return (
+            cls.objects.select_related("doctype")
+            .prefetch_related(
+                "tags",
+                "languages",
+                # sources and authors for scholarship records
+                Prefetch("footnotes", queryset=Footnote.objects.with_sources()),
+                Prefetch(
+                    "textblock_set",
+                    queryset=TextBlock.objects.select_related(
+                        "fragment", "fragment__collection"
+                    ),
                 ),
-            ),
+            )
+            .with_log_entry_dates()
         )
 
     def index_data(self):
@@ -526,6 +1064,7 @@ class Document(ModelIndexable):
                 "tags_ss": [t.name for t in self.tags.all()],
                 "status_s": self.get_status_display(),
                 "old_pgpids_is": self.old_pgpids,
+                "shelfmark_sort_s": self.shelfmark_index_sort_key(),
             }
         )
 
@@ -547,16 +1086,14 @@ class Document(ModelIndexable):
             }
         )
 
-        last_log_entry = self.log_entries.last()
-        if last_log_entry:
-            index_data["input_year_i"] = last_log_entry.action_time.year
+        input_date = self.input_date
+        if input_date:
+            index_data["input_year_i"] = input_date.year
             # TODO: would be nice to use full date to display year
             # instead of indexing separately
             # (may require parasolr datetime conversion support? or implement
             # in local queryset?)
-            index_data[
-                "input_date_dt"
-            ] = last_log_entry.action_time.isoformat().replace("+00:00", "Z")
+            index_data["input_date_dt"] = input_date.isoformat().replace("+00:00", "Z")
 
         return index_data
 
@@ -621,6 +1158,7 @@ class TextBlock(models.Model):
         help_text="Order with respect to other text blocks in this document, "
         + "top to bottom or right to left",
     )
+    last_modified = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["order"]
@@ -638,5 +1176,47 @@ class TextBlock(models.Model):
         ]
         return " ".join(p for p in parts if p)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.document.update_summary()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.document.update_summary()
+        return result
+
+    @staticmethod
+    def fragments_changed(sender, instance, action, reverse, pk_set, **kwargs):
+        """Signal handler to update document summaries when fragments are
+        added or removed via the many-to-many relationship, which does not
+        save or delete individual text blocks."""
+        if action not in ["post_add", "post_remove", "post_clear"]:
+            return
+        if not reverse:
+            instance.update_summary()
+        elif pk_set:
+            for doc in Document.objects.filter(pk__in=pk_set):
+                doc.update_summary()
+
     def thumbnail(self):
         return self.fragment.iiif_thumbnails()
+
+
+class DocumentSummary(models.Model):
+    """Values derived from a document's fragments and footnotes, stored
+    so that lists and exports can display them without loading related
+    records. Created with the document, and updated automatically when
+    text blocks, fragments, collections, or footnotes change."""
+
+    document = models.OneToOneField(
+        Document, on_delete=models.CASCADE, primary_key=True, related_name="summary"
+    )
+    shelfmark = models.TextField(blank=True)
+    shelfmark_display = models.TextField(blank=True, null=True)
+    collection = models.TextField(blank=True)
+    iiif_urls = ArrayField(models.URLField(), default=list)
+    has_image = models.BooleanField(default=False)
+    has_transcription = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"Summary for PGPID {self.document_id}"
@@ -1,4 +1,47 @@
+import hashlib
+import json
+import uuid
+from urllib.parse import urljoin
+
+from django.core.cache import caches
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from parasolr.django import AliasedSolrQuerySet
+from parasolr.solr.client import QueryResponse
+
+#: name of the configured cache for Solr search results
+SEARCH_CACHE = "search"
+#: cache key for the current index generation
+INDEX_GENERATION_KEY = "solr:index-generation"
+
+
+def index_generation():
+    """Token identifying the current state of the Solr index. Cached
+    search results are keyed on the generation, so they are no longer
+    used once documents are indexed."""
+    search_cache = caches[SEARCH_CACHE]
+    search_cache.add(INDEX_GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+    return search_cache.get(INDEX_GENERATION_KEY)
+
+
+def bump_index_generation():
+    """Start a new index generation, invalidating cached search results;
+    should be called whenever changes sent to Solr are committed."""
+    caches[SEARCH_CACHE].set(INDEX_GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def commit_index_changes(solr):
+    """Make changes sent to Solr searchable with a soft commit, then start
+    a new index generation. Changes are only visible after a commit, so
+    bumping the generation any earlier could cache outdated results
+    under the new generation."""
+    solr.update.make_request(
+        "post",
+        urljoin("%s/" % solr.update.url, "json/docs"),
+        data=[],
+        params={"softCommit": True},
+        headers=solr.update.headers,
+    )
+    bump_index_generation()
 
 
 class DocumentSolrQuerySet(AliasedSolrQuerySet):
@@ -19,7 +62,7 @@ class DocumentSolrQuerySet(AliasedSolrQuerySet):
         "notes": "notes_t",
         "needs_review": "needs_review_t",
         "pgpid": "pgpid_i",
-        "old_pgpids": "old_pgpid_is",
+        "old_pgpids": "old_pgpids_is",
         "input_year": "input_year_i",
         "input_date": "input_date_dt",
         "num_editions": "num_editions_i",
@@ -29,6 +72,100 @@ class DocumentSolrQuerySet(AliasedSolrQuerySet):
         "scholarship": "scholarship_t",
     }
 
+    #: fields displayed in search results; full text fields are
+    #: returned as highlighted snippets instead
+    result_fields = [
+        "id",
+        "pgpid",
+        "type",
+        "shelfmark",
+        "tags",
+        "input_year",
+        "num_editions",
+        "num_translations",
+        "num_discussions",
+        "scholarship_count",
+    ]
+
+    #: cursor mark for the next page of results, when paging with a cursor
+    next_cursor = None
+
+    def get_results(self, **kwargs):
+        """Extend :meth:`parasolr.query.queryset.SolrQuerySet.get_results`
+        to keep the next cursor mark from the Solr response, when results
+        are requested with a `cursorMark` parameter."""
+        query_opts = self.query_opts()
+        query_opts.update(**kwargs)
+        # unwrapped response includes nextCursorMark, which is not
+        # preserved by QueryResponse
+        response = self.cached_query(query_opts)
+        # if there is a query error, result will not be set
+        if not response:
+            self._result_cache = None
+            return []
+        self.next_cursor = response.get("nextCursorMark")
+        self._result_cache = QueryResponse(response)
+        docs = [doc.as_dict() for doc in self._result_cache.docs]
+        # add highlighted snippets to each result, with aliased field names
+        highlighting = self._result_cache.highlighting
+        if highlighting:
+            for doc in docs:
+                doc["highlight"] = {
+                    self.reverse_aliases.get(field, field): snippets
+                    for field, snippets in highlighting.get(doc["id"], {}).items()
+                }
+        return docs
+
+    def results_only(self):
+        """Return only the fields displayed in search results, with a
+        short highlighted snippet of the description; when there is no
+        match in the description, the snippet is the beginning of it."""
+        # break snippets on words rather than sentences, so that fragsize
+        # limits their length
+        return self.only(*self.result_fields).highlight(
+            "description",
+            method="unified",
+            fragsize=135,
+            **{"bs.type": "WORD"},
+            snippets=1,
+            defaultSummary="true",
+            encoder="html",
+        )
+
+    def facet_filter(self, field, values):
+        """Filter on any of a list of values for a facet field. The filter
+        is tagged with the field name, so that it can be excluded when
+        calculating counts for that facet to allow selecting multiple
+        values."""
+        values = ['"%s"' % str(value).replace('"', r"\"") for value in values]
+        return self.filter(**{"%s__in" % field: values}, tag=field)
+
+    def cache_key(self, query_opts):
+        """Cache key for a Solr query, based on the query parameters
+        and the current index generation."""
+        params = dict(query_opts)
+        # order of filter queries does not affect results
+        if isinstance(params.get("fq"), list):
+            params["fq"] = sorted(params["fq"])
+        digest = hashlib.sha1(
+            json.dumps(params, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return "solr:%s:%s" % (index_generation(), digest)
+
+    def cached_query(self, query_opts):
+        """Get the unwrapped Solr response for a query, from the search
+        cache when the same query has been run against the current
+        index generation."""
+        search_cache = caches[SEARCH_CACHE]
+        key = self.cache_key(query_opts)
+        response = search_cache.get(key)
+        if response is None:
+            response = self.solr.query(wrap=False, **query_opts)
+            # don't cache query errors
+            if response:
+                search_cache.set(key, response)
+        return response
+
     # (adapted from mep)
     # edismax alias for searching on admin document pseudo-field
     admin_doc_qf = "{!edismax qf=$admin_doc_qf pf=$admin_doc_pf v=$doc_query}"
@@ -46,3 +183,31 @@ class DocumentSolrQuerySet(AliasedSolrQuerySet):
         return self.search(self.keyword_search_qf).raw_query_parameters(
             keyword_query=search_term.replace(" + ", " ")
         )
+
+
+class SolrPaginator(Paginator):
+    """:class:`~django.core.paginator.Paginator` for a Solr queryset that
+    gets the total number of results from the same Solr response as the
+    requested page, rather than a separate count query."""
+
+    #: queryset for the most recently requested page
+    page_queryset = None
+
+    def page(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+
+        bottom = (number - 1) * self.per_page
+        page_queryset = self.object_list[bottom : bottom + self.per_page]
+        results = page_queryset.get_results()
+        # keep the queryset for other data from the same response
+        self.page_queryset = page_queryset
+        # set count from the response for the page of results
+        self.__dict__["count"] = page_queryset.count()
+        # check the number of pages now that count is known
+        self.validate_number(number)
+        return self._get_page(results, number, self)
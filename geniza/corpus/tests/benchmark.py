@@ -0,0 +1,260 @@
+"""Utilities for benchmarking database usage, time and memory of
+views and other code paths that operate on many documents, to catch
+performance regressions such as N+1 queries.
+
+Budgets are configured in ``query_budgets.json`` by benchmark name:
+
+- ``queries``: maximum number of database queries
+- ``queries_per_item``: additional queries allowed per item processed
+  (documents or footnotes, depending on the benchmark); should be zero
+  for anything that can be prefetched
+- ``queries_per_chunk``: additional queries allowed per chunk, for code
+  that loads and prefetches items in fixed-size chunks (such as the
+  document csv export), so that budgets hold at any corpus scale
+- ``max_seconds``, ``max_memory_mb``: optional limits on wall time and
+  peak memory allocated in Python
+
+Run benchmarks against a larger synthetic corpus and save results
+as JSON with::
+
+    pytest geniza/corpus/tests/test_benchmarks.py --benchmark-scale 50000 \\
+        --benchmark-json benchmark-results.json
+
+"""
+import itertools
+import json
+import math
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.admin.models import ADDITION, CHANGE, LogEntry
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from taggit.models import Tag, TaggedItem
+
+from geniza.corpus.models import (
+    Collection,
+    Document,
+    DocumentType,
+    Fragment,
+    LanguageScript,
+    TextBlock,
+)
+from geniza.footnotes.models import Authorship, Creator, Footnote, Source, SourceType
+
+#: path to benchmark budget configuration
+BUDGETS_PATH = Path(__file__).parent / "query_budgets.json"
+
+
+class Benchmark:
+    """Measure and record query counts, wall time and peak memory for
+    named benchmarks, and check them against configured budgets."""
+
+    def __init__(self, budgets=None):
+        if budgets is None:
+            with open(BUDGETS_PATH) as budgets_file:
+                budgets = json.load(budgets_file)
+        self.budgets = budgets
+        self.results = {}
+
+    @contextmanager
+    def measure(self, name, items=0, chunk_size=None):
+        """Context manager to measure the enclosed code; records results
+        under the specified name. Optionally specify the number of items
+        processed, for per-item query budgets, and the size of chunks
+        items are loaded in, for per-chunk query budgets."""
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.results[name] = {
+            "items": items,
+            "chunks": math.ceil(items / chunk_size) if chunk_size else 0,
+            "queries": len(queries),
+            "seconds": round(elapsed, 3),
+            "memory_mb": round(peak_memory / 1024 ** 2, 2),
+        }
+
+    def check(self, name):
+        """Return a list of budget violations for a recorded benchmark."""
+        result = self.results[name]
+        budget = self.budgets[name]
+        errors = []
+        max_queries = (
+            budget["queries"]
+            + budget.get("queries_per_item", 0) * result["items"]
+            + budget.get("queries_per_chunk", 0) * result["chunks"]
+        )
+        if result["queries"] > max_queries:
+            errors.append(
+                "%s: %d queries exceeds budget of %d"
+                % (name, result["queries"], max_queries)
+            )
+        for limit, measure in [
+            ("max_seconds", "seconds"),
+            ("max_memory_mb", "memory_mb"),
+        ]:
+            if limit in budget and result[measure] > budget[limit]:
+                errors.append(
+                    "%s: %s %s exceeds budget of %s"
+                    % (name, result[measure], measure, budget[limit])
+                )
+        return errors
+
+    def save(self, path):
+        """Save recorded results as JSON."""
+        with open(path, "w") as outfile:
+            json.dump(self.results, outfile, indent=2, sort_keys=True)
+
+
+def create_corpus(num_documents, seed=0):
+    """Generate a synthetic corpus of documents with single and
+    multi-fragment joins, tags, languages, footnotes and log entries.
+    Records are created in bulk, so that large corpora can be generated
+    quickly; signal handlers and model save logic are not run."""
+    rand = random.Random(seed)
+    collections = [
+        Collection.objects.create(library=f"Library {i}", abbrev=f"COL{i}")
+        for i in range(5)
+    ]
+    doctypes = [
+        DocumentType.objects.get_or_create(name=name)[0]
+        for name in ["Legal", "Letter", "List or table", "Literary"]
+    ]
+    languages = [
+        LanguageScript.objects.get_or_create(language=lang, script=script)[0]
+        for lang, script in [("Arabic", "Hebrew"), ("Hebrew", "Hebrew")]
+    ]
+    tags = [Tag.objects.get_or_create(name=f"tag {i}")[0] for i in range(10)]
+    book = SourceType.objects.get_or_create(type="Book")[0]
+    sources = []
+    for i in range(20):
+        source = Source.objects.create(title=f"Source {i}", source_type=book)
+        Authorship.objects.create(
+            source=source, creator=Creator.objects.create(last_name=f"Author {i}")
+        )
+        sources.append(source)
+
+    documents = Document.objects.bulk_create(
+        [
+            Document(
+                doctype=rand.choice(doctypes),
+                description=f"Synthetic document {i}",
+                status=Document.PUBLIC,
+            )
+            for i in range(num_documents)
+        ],
+        batch_size=1000,
+    )
+    # about a quarter of documents are joins across multiple fragments
+    fragment_counts = [rand.choice([1, 1, 1, 2, 3]) for doc in documents]
+    fragments = Fragment.objects.bulk_create(
+        [
+            Fragment(
+                shelfmark=f"SYN {i:07d}",
+                collection=rand.choice(collections),
+                url=f"https://example.com/view/{i}",
+                iiif_url=f"https://iiif.example.com/{i}" if i % 2 else "",
+            )
+            for i in range(sum(fragment_counts))
+        ],
+        batch_size=1000,
+    )
+    fragment_iter = iter(fragments)
+    TextBlock.objects.bulk_create(
+        [
+            TextBlock(
+                document=doc,
+                fragment=next(fragment_iter),
+                order=order,
+                certain=order < 2,
+            )
+            for doc, count in zip(documents, fragment_counts)
+            for order in range(count)
+        ],
+        batch_size=1000,
+    )
+
+    doc_contenttype = ContentType.objects.get_for_model(Document)
+    TaggedItem.objects.bulk_create(
+        [
+            TaggedItem(content_type=doc_contenttype, object_id=doc.pk, tag=tag)
+            for doc in documents
+            for tag in rand.sample(tags, 2)
+        ],
+        batch_size=1000,
+    )
+    Document.languages.through.objects.bulk_create(
+        [
+            Document.languages.through(document=doc, languagescript=lang)
+            for doc in documents
+            for lang in rand.sample(languages, rand.randint(1, 2))
+        ],
+        batch_size=1000,
+    )
+    Footnote.objects.bulk_create(
+        [
+            Footnote(
+                content_object=doc,
+                source=rand.choice(sources),
+                location=f"p. {i + 1}",
+                doc_relation=[
+                    rand.choice(
+                        [Footnote.EDITION, Footnote.TRANSLATION, Footnote.DISCUSSION]
+                    )
+                ],
+                content="Transcription" if i == 0 and doc.pk % 3 == 0 else None,
+            )
+            for doc in documents
+            for i in range(rand.randint(0, 3))
+        ],
+        batch_size=1000,
+    )
+
+    team_user = User.objects.get(username=settings.TEAM_USERNAME)
+    script_user = User.objects.get(username=settings.SCRIPT_USERNAME)
+    now = timezone.now()
+    LogEntry.objects.bulk_create(
+        itertools.chain.from_iterable(
+            [
+                LogEntry(
+                    user=team_user,
+                    content_type=doc_contenttype,
+                    object_id=str(doc.pk),
+                    object_repr=doc.description,
+                    action_flag=ADDITION,
+                    action_time=now - timedelta(days=365 + doc.pk % 1000),
+                ),
+                LogEntry(
+                    user=script_user,
+                    content_type=doc_contenttype,
+                    object_id=str(doc.pk),
+                    object_repr=doc.description,
+                    action_flag=CHANGE,
+                    change_message="Updated via script",
+                    action_time=now - timedelta(days=doc.pk % 365),
+                ),
+            ]
+            for doc in documents
+        ),
+        batch_size=1000,
+    )
+
+    # populate stored sort keys and summaries normally updated on save
+    Document.update_summaries(
+        Document.objects.filter(pk__in=[doc.pk for doc in documents])
+    )
+    return documents
@@ -1,6 +1,8 @@
 from datetime import datetime
+from unittest.mock import patch
 
 import pytest
+import requests
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.admin.models import ADDITION, LogEntry
@@ -9,6 +11,17 @@ from django.utils.timezone import get_current_timezone, make_aware
 from taggit.models import Tag
 
 from geniza.corpus.models import Document, DocumentType, Fragment, TextBlock
+from geniza.corpus.tests.benchmark import Benchmark, create_corpus
+
+
+@pytest.fixture(autouse=True)
+def no_manifest_requests():
+    """Don't request remote IIIF manifests when fragments are saved."""
+    with patch(
+        "geniza.corpus.models.requests.get",
+        side_effect=requests.exceptions.ConnectionError,
+    ):
+        yield
 
 
 @pytest.fixture
@@ -84,3 +97,20 @@ def join(db, fragment, multifragment):
     TextBlock.objects.create(document=doc, fragment=fragment, order=1)
     TextBlock.objects.create(document=doc, fragment=multifragment, order=2)
     return doc
+
+
+@pytest.fixture(scope="session")
+def benchmark(request):
+    """Benchmark recorder shared across tests; saves results as JSON
+    at the end of the session if requested."""
+    recorder = Benchmark()
+    yield recorder
+    output = request.config.getoption("--benchmark-json")
+    if output:
+        recorder.save(output)
+
+
+@pytest.fixture
+def synthetic_corpus(db, request):
+    """Synthetic corpus for benchmarks, at the configured scale."""
+    return create_corpus(request.config.getoption("--benchmark-scale"))
@@ -1,14 +1,30 @@
+import json
+import threading
+import time
 from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
 from unittest.mock import patch, mock_open
 import pytest
 
+import requests
 from attrdict import AttrMap
 from django.contrib.admin.models import CHANGE, LogEntry
 from django.core.management import call_command
 from django.core.management.base import CommandError
+from django.utils import timezone
+from parasolr.django.signals import IndexableSignalHandler
 
 from geniza.corpus.management.commands import add_fragment_urls
-from geniza.corpus.models import Fragment
+from geniza.corpus.models import DocumentSummary, Fragment, Manifest, ReindexRequest
+
+
+@pytest.fixture(autouse=True)
+def reconnect_signals():
+    # the command disconnects indexing signal handlers; restore them
+    # so later tests are not affected
+    yield
+    IndexableSignalHandler.connect()
 
 
 @pytest.mark.django_db
@@ -112,14 +128,13 @@ def test_view_to_iiif_url():
 
 
 @pytest.mark.django_db
-@patch("geniza.corpus.management.commands.add_fragment_urls.Command.log_change")
-def test_add_fragment_urls(mock_log_change):
+def test_add_fragment_urls():
     # Ensure shelfmark not existing is properly handled.
     command = add_fragment_urls.Command()
     row = AttrMap({"shelfmark": "mm", "url": "example.com"})
-    command.add_fragment_urls(row)  # Test would fail if error were raised
+    command.add_fragment_urls([row])  # Test would fail if error were raised
     assert command.stats["not_found"] == 1
-    assert not mock_log_change.call_count
+    assert not LogEntry.objects.exists()
 
     # Ensure that the iiif url is not overwritten unless overwrite arg is provided
     command = add_fragment_urls.Command()
@@ -135,7 +150,7 @@ def test_add_fragment_urls(mock_log_change):
             "url": "https://cudl.lib.cam.ac.uk/view/MS-TS-NS-J-00600",
         }
     )
-    command.add_fragment_urls(row)
+    command.add_fragment_urls([row])
     fragment = Fragment.objects.get(shelfmark=orig_frag.shelfmark)
     assert fragment.url == row["url"]
     assert fragment.iiif_url == orig_frag.iiif_url
@@ -143,7 +158,9 @@ def test_add_fragment_urls(mock_log_change):
     assert not command.stats["iiif_added"]
     assert not command.stats["iiif_updated"]
     assert not command.stats["url_updated"]
-    mock_log_change.assert_called_with(fragment, "added URL")
+    log_entry = LogEntry.objects.get(object_id=str(fragment.pk))
+    assert log_entry.action_flag == CHANGE
+    assert log_entry.change_message == "added URL"
 
     command = add_fragment_urls.Command()
     command.overwrite = True
@@ -158,18 +175,21 @@ def test_add_fragment_urls(mock_log_change):
             "url": "https://cudl.lib.cam.ac.uk/view/MS-TS-NS-J-00600",
         }
     )
-    command.add_fragment_urls(row)
+    command.add_fragment_urls([row])
     fragment = Fragment.objects.get(shelfmark=orig_frag.shelfmark)
     assert fragment.iiif_url != orig_frag.iiif_url
     assert fragment.iiif_url == "https://cudl.lib.cam.ac.uk/iiif/MS-TS-NS-J-00600"
     assert command.stats["iiif_updated"] == 1
-    mock_log_change.assert_called_with(fragment, "added URL and updated IIIF URL")
+    log_entry = LogEntry.objects.get(object_id=str(fragment.pk))
+    assert log_entry.change_message == "added URL and updated IIIF URL"
+    # no cached manifest; thumbnails must be harvested
+    assert command.stats["thumbnails_missing"] == 1
 
     # test updating url — url matches, should skip
     fragment.url = row.url
     fragment.save()
     command.stats = defaultdict(int)
-    command.add_fragment_urls(row)
+    command.add_fragment_urls([row])
     assert not command.stats["url_updated"]
     assert not command.stats["url_added"]
     assert command.stats["skipped"] == 1
@@ -179,7 +199,7 @@ def test_add_fragment_urls(mock_log_change):
     fragment.save()
     command.overwrite = False
     command.stats = defaultdict(int)
-    command.add_fragment_urls(row)
+    command.add_fragment_urls([row])
     assert not command.stats["url_updated"]
     assert not command.stats["url_added"]
     assert command.stats["skipped"] == 1
@@ -187,13 +207,13 @@ def test_add_fragment_urls(mock_log_change):
     # url mismatch, overwrite specified
     command.overwrite = True
     command.stats = defaultdict(int)
-    command.add_fragment_urls(row)
+    command.add_fragment_urls([row])
     assert command.stats["url_updated"] == 1
     assert not command.stats["url_added"]
     assert not command.stats["skipped"]
 
     # Ensure that changes aren't saved if dryrun argument is provided
-    mock_log_change.reset_mock()
+    log_count = LogEntry.objects.count()
     command = add_fragment_urls.Command()
     command.overwrite = None
     command.dryrun = True
@@ -207,16 +227,254 @@ def test_add_fragment_urls(mock_log_change):
             "url": "https://cudl.lib.cam.ac.uk/view/MS-TS-NS-J-00600",
         }
     )
-    command.add_fragment_urls(row)
+    command.add_fragment_urls([row])
     fragment = Fragment.objects.get(shelfmark=orig_frag.shelfmark)
     assert fragment.iiif_url == orig_frag.iiif_url
-    assert not mock_log_change.call_count
+    assert LogEntry.objects.count() == log_count
 
 
 @pytest.mark.django_db
-def test_log_change(fragment):
+def test_add_fragment_urls_batch(join, django_assert_max_num_queries):
     command = add_fragment_urls.Command()
-    command.log_change(fragment, "added url")
-    log_entry = LogEntry.objects.get(object_id=fragment.pk)
-    assert log_entry.action_flag == CHANGE
-    assert log_entry.change_message == "added url"
+    command.overwrite = True
+    command.dryrun = False
+    fragments = list(join.fragments.all()) + [
+        Fragment.objects.create(shelfmark=f"T-S NS {i}") for i in range(5)
+    ]
+    manifest = Manifest.objects.create(
+        uri="https://iiif.example.com/0",
+        canvases=[["https://iiif.example.com/image/0", "1r"]],
+        fetched=timezone.now(),
+    )
+    rows = [
+        {"shelfmark": frag.shelfmark, "iiif_url": f"https://iiif.example.com/{i}"}
+        for i, frag in enumerate(fragments)
+    ]
+    # query count does not depend on the number of rows
+    with django_assert_max_num_queries(15):
+        command.add_fragment_urls(rows)
+
+    assert command.stats["iiif_added"] == 5
+    assert command.stats["iiif_updated"] == 2
+    assert LogEntry.objects.filter(action_flag=CHANGE).count() == len(fragments)
+    # thumbnails set from cached manifest when available
+    fragment = Fragment.objects.get(iiif_url=manifest.uri)
+    assert fragment.iiif_thumbnail_data
+    assert command.stats["thumbnails_missing"] == len(fragments) - 1
+    # stored summaries updated for affected documents
+    summary = DocumentSummary.objects.get(document=join)
+    assert summary.iiif_urls == [
+        "https://iiif.example.com/0",
+        "https://iiif.example.com/1",
+    ]
+    assert command.updated_fragments == {frag.pk for frag in fragments}
+
+
+@pytest.mark.django_db
+def test_reindex(document, join, multifragment):
+    command = add_fragment_urls.Command()
+    command.updated_fragments = {multifragment.pk}
+    with patch.object(add_fragment_urls.Document, "index_items") as mock_index_items:
+        mock_index_items.return_value = 1
+        command.reindex()
+        indexed = mock_index_items.call_args[0][0]
+        assert list(indexed) == [join]
+
+    # queue documents for reindexing when solr is unavailable
+    with patch.object(add_fragment_urls.Document, "index_items") as mock_index_items:
+        mock_index_items.side_effect = requests.exceptions.ConnectionError
+        command.reindex()
+    assert ReindexRequest.objects.filter(document_id=join.pk).exists()
+    assert not ReindexRequest.objects.filter(document_id=document.pk).exists()
+
+
+@pytest.mark.django_db
+def test_handle_skip_rows_summary(tmp_path):
+    for i in range(5):
+        Fragment.objects.create(shelfmark=f"T-S NS {i}")
+    csvfile = tmp_path / "urls.csv"
+    csvfile.write_text(
+        "\n".join(
+            ["shelfmark,iiif_url"]
+            + [f"T-S NS {i},https://iiif.example.com/{i}" for i in range(5)]
+        )
+    )
+    summary_file = tmp_path / "summary.json"
+    stdout = StringIO()
+    call_command(
+        "add_fragment_urls",
+        str(csvfile),
+        batch_size=2,
+        skip_rows=1,
+        summary=str(summary_file),
+        stdout=stdout,
+    )
+    # first row skipped
+    assert not Fragment.objects.get(shelfmark="T-S NS 0").iiif_url
+    assert Fragment.objects.exclude(iiif_url="").count() == 4
+    output = stdout.getvalue()
+    assert "Processed 3 rows" in output
+    assert "Processed 5 rows" in output
+    assert "rows/s" in output
+
+    summary = json.loads(summary_file.read_text())
+    assert summary["rows"] == 5
+    assert summary["stats"]["rows"] == 4
+    assert summary["stats"]["iiif_added"] == 4
+    assert summary["fragments_updated"] == 4
+    assert summary["error"] is None
+
+
+@pytest.mark.django_db
+def test_handle_error_resume(tmp_path):
+    for i in range(4):
+        Fragment.objects.create(shelfmark=f"T-S NS {i}")
+    csvfile = tmp_path / "urls.csv"
+    csvfile.write_text(
+        "\n".join(
+            ["shelfmark,url"]
+            + [f"T-S NS {i},https://example.com/view/{i}" for i in range(4)]
+        )
+    )
+    summary_file = tmp_path / "summary.json"
+    command = add_fragment_urls.Command()
+    orig_add_fragment_urls = command.add_fragment_urls
+
+    def fail_second_batch(rows):
+        if rows[0]["shelfmark"] == "T-S NS 2":
+            raise ValueError("database went away")
+        orig_add_fragment_urls(rows)
+
+    with patch.object(command, "add_fragment_urls", side_effect=fail_second_batch):
+        with patch.object(command, "reindex") as mock_reindex:
+            with pytest.raises(CommandError) as err:
+                command.handle(
+                    csv=str(csvfile), batch_size=2, summary=str(summary_file)
+                )
+    assert "resume with --skip-rows 2" in str(err)
+    # first batch saved and queued for indexing
+    assert Fragment.objects.exclude(url="").count() == 2
+    mock_reindex.assert_called_with(queue=True)
+    summary = json.loads(summary_file.read_text())
+    assert summary["rows"] == 2
+    assert "database went away" in summary["error"]
+
+    # interrupting the import also records where to resume
+    def interrupt_second_batch(rows):
+        if rows[0]["shelfmark"] == "T-S NS 2":
+            raise KeyboardInterrupt
+        orig_add_fragment_urls(rows)
+
+    with patch.object(command, "add_fragment_urls", side_effect=interrupt_second_batch):
+        with patch.object(command, "reindex") as mock_reindex:
+            with pytest.raises(CommandError) as err:
+                command.handle(
+                    csv=str(csvfile), batch_size=2, summary=str(summary_file)
+                )
+    assert "resume with --skip-rows 2" in str(err)
+    mock_reindex.assert_called_with(queue=True)
+    summary = json.loads(summary_file.read_text())
+    assert summary["rows"] == 2
+    assert summary["error"] == "interrupted"
+
+
+class StubIIIFHandler(BaseHTTPRequestHandler):
+    """Local stub IIIF server; serves a manifest for any path starting
+    with /iiif/ and records the maximum number of concurrent requests."""
+
+    manifest = {
+        "sequences": [
+            {
+                "canvases": [
+                    {
+                        "images": [{"resource": {"@id": "http://example.co/iiif/1"}}],
+                        "label": "1r",
+                    }
+                ]
+            }
+        ]
+    }
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.active -= 1
+        if self.path.startswith("/iiif/"):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(self.manifest).encode())
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def iiif_server():
+    """Run the stub IIIF server and allow manifest requests to it."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubIIIFHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubIIIFHandler.max_active = 0
+    # requests.get is patched to fail by default; use the original
+    with patch("geniza.corpus.models.requests.get", requests.api.get):
+        yield "http://127.0.0.1:%d" % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.django_db
+def test_verify_manifests(iiif_server):
+    command = add_fragment_urls.Command()
+    command.dryrun = False
+    command.workers = 4
+    command.host_limiter = add_fragment_urls.HostConcurrencyLimiter(2)
+    Manifest.objects.create(uri=f"{iiif_server}/iiif/cached", fetched=timezone.now())
+    valid = [f"{iiif_server}/iiif/{i}" for i in range(6)]
+    invalid = f"{iiif_server}/missing/1"
+    command.verify_manifests(valid + [invalid, f"{iiif_server}/iiif/cached"])
+
+    assert command.invalid_manifests == {invalid}
+    assert command.stats["manifests_verified"] == 6
+    # verified manifests are cached
+    assert Manifest.objects.filter(uri__in=valid).count() == 6
+    assert Manifest.objects.get(uri=valid[0]).canvases == [
+        ["http://example.co/iiif/1", "1r"]
+    ]
+    # requests were concurrent but limited per host
+    assert StubIIIFHandler.max_active == 2
+
+
+@pytest.mark.django_db
+def test_add_fragment_urls_verify(iiif_server):
+    command = add_fragment_urls.Command()
+    command.overwrite = False
+    command.dryrun = False
+    command.verify = True
+    command.workers = 2
+    command.host_limiter = add_fragment_urls.HostConcurrencyLimiter(2)
+    good = Fragment.objects.create(shelfmark="T-S NS 1")
+    bad = Fragment.objects.create(shelfmark="T-S NS 2")
+    command.add_fragment_urls(
+        [
+            {"shelfmark": good.shelfmark, "iiif_url": f"{iiif_server}/iiif/1"},
+            {"shelfmark": bad.shelfmark, "iiif_url": f"{iiif_server}/missing/2"},
+        ]
+    )
+    good.refresh_from_db()
+    bad.refresh_from_db()
+    assert good.iiif_url == f"{iiif_server}/iiif/1"
+    # thumbnails loaded from the verified manifest
+    assert good.iiif_thumbnail_data
+    assert not bad.iiif_url
+    assert command.stats["iiif_invalid"] == 1
+    assert command.stats["skipped"] == 1
@@ -0,0 +1,75 @@
+from django.contrib import admin
+from django.db.models import Count
+from django.urls import reverse
+
+from geniza.corpus.admin import DocumentAdmin
+from geniza.corpus.models import Document
+
+
+def consume(response):
+    """Read the full content of a (possibly streaming) response."""
+    if response.streaming:
+        return b"".join(response.streaming_content)
+    return response.content
+
+
+class TestBenchmarks:
+    def test_admin_changelist(self, synthetic_corpus, admin_client, benchmark):
+        with benchmark.measure("admin_changelist"):
+            response = admin_client.get(reverse("admin:corpus_document_changelist"))
+            consume(response)
+        assert response.status_code == 200
+        assert not benchmark.check("admin_changelist")
+
+    def test_export_to_csv(self, synthetic_corpus, rf, admin_user, benchmark):
+        doc_admin = DocumentAdmin(model=Document, admin_site=admin.site)
+        request = rf.get("/admin/corpus/document/export/")
+        request.user = admin_user
+        with benchmark.measure(
+            "export_to_csv",
+            items=len(synthetic_corpus),
+            chunk_size=doc_admin.csv_chunk_size,
+        ):
+            consume(doc_admin.export_to_csv(request))
+        assert not benchmark.check("export_to_csv")
+
+    def test_index_data(self, synthetic_corpus, benchmark):
+        with benchmark.measure("index_data", items=len(synthetic_corpus)):
+            for doc in Document.items_to_index():
+                doc.index_data()
+        assert not benchmark.check("index_data")
+
+    def test_document_detail(self, synthetic_corpus, client, benchmark):
+        # use the document with the most fragments and footnotes
+        doc = (
+            Document.objects.annotate(
+                num_blocks=Count("textblock", distinct=True),
+                num_footnotes=Count("footnotes", distinct=True),
+            )
+            .order_by("-num_blocks", "-num_footnotes")
+            .first()
+        )
+        with benchmark.measure("document_detail", items=doc.num_footnotes):
+            response = client.get(doc.get_absolute_url())
+        assert response.status_code == 200
+        assert not benchmark.check("document_detail")
+
+    def test_document_scholarship(self, synthetic_corpus, client, benchmark):
+        doc = (
+            Document.objects.annotate(num_footnotes=Count("footnotes"))
+            .order_by("-num_footnotes")
+            .first()
+        )
+        with benchmark.measure("document_scholarship", items=doc.num_footnotes):
+            response = client.get(reverse("corpus:document-scholarship", args=[doc.pk]))
+        assert response.status_code == 200
+        assert not benchmark.check("document_scholarship")
+
+    def test_pgp_metadata_for_old_site(self, synthetic_corpus, client, benchmark):
+        with benchmark.measure(
+            "pgp_metadata_for_old_site", items=len(synthetic_corpus)
+        ):
+            response = client.get("/export/pgp-metadata-old/")
+            consume(response)
+        assert response.status_code == 200
+        assert not benchmark.check("pgp_metadata_for_old_site")
@@ -1,17 +1,22 @@
+import csv
 from datetime import timedelta, datetime
+from io import StringIO
 import time
 from unittest.mock import Mock, patch
 
 import pytest
 from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.contrib.admin.models import LogEntry, ADDITION, CHANGE
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models.query import EmptyQuerySet
 from django.forms import modelform_factory
 from django.forms.models import model_to_dict
+from django.http import StreamingHttpResponse
 from django.test import RequestFactory
 from django.urls import reverse
 from django.utils import timezone
@@ -21,6 +26,7 @@ from pytest_django.asserts import assertContains
 from geniza.corpus.admin import (
     DocumentAdmin,
     DocumentForm,
+    DocumentTextBlockInline,
     FragmentAdmin,
     FragmentTextBlockInline,
     LanguageScriptAdmin,
@@ -29,6 +35,7 @@ from geniza.corpus.models import (
     Document,
     Fragment,
     LanguageScript,
+    ReindexRequest,
     TextBlock,
     Collection,
     DocumentType,
@@ -200,6 +207,107 @@ class TestDocumentAdmin:
         )
         assert queryset.count() == Document.objects.all().count()
 
+    @patch("geniza.corpus.admin.SolrPaginator")
+    def test_changelist_solr_search(self, mock_paginator, document, join, admin_user):
+        doc_admin = DocumentAdmin(model=Document, admin_site=admin.site)
+        # solr returns the current page of results in relevance order
+        mock_paginator.return_value.count = 2
+        mock_paginator.return_value.page.return_value.object_list = [
+            {"pgpid": document.pk},
+            {"pgpid": join.pk},
+        ]
+        request = RequestFactory().get("/admin/corpus/document/", {"q": "sale"})
+        request.user = admin_user
+        with patch.object(doc_admin, "solr_search") as mock_solr_search:
+            changelist = doc_admin.get_changelist_instance(request)
+            mock_solr_search.assert_called_with("sale")
+            mock_solr_search.return_value.order_by.assert_called_with("-score", "id")
+
+        assert changelist.solr_search
+        mock_paginator.return_value.page.assert_called_with(1)
+        # only documents on the page are loaded, in solr order
+        assert changelist.result_list == [document, join]
+        assert changelist.result_count == 2
+        assert changelist.full_result_count == Document.objects.count()
+        assert not changelist.multi_page
+
+    def test_changelist_solr_search_filtered(self, document, admin_user):
+        doc_admin = DocumentAdmin(model=Document, admin_site=admin.site)
+        request = RequestFactory().get(
+            "/admin/corpus/document/", {"q": "sale", "status__exact": "P"}
+        )
+        request.user = admin_user
+        # filtered searches restrict the database queryset by solr results
+        with patch.object(doc_admin, "solr_search") as mock_solr_search:
+            mock_solr_search.return_value.get_results.return_value = [
+                {"pgpid": document.pk}
+            ]
+            changelist = doc_admin.get_changelist_instance(request)
+            mock_solr_search.assert_called_with("sale")
+
+        assert not changelist.solr_search
+        assert list(changelist.result_list) == [document]
+
+    def test_changelist_solr_search_action(self, document, join, admin_client):
+        # select all for an action after a keyword search should only
+        # act on documents matching the search
+        with patch.object(DocumentAdmin, "solr_search") as mock_solr_search:
+            mock_solr_search.return_value.get_results.return_value = [
+                {"pgpid": document.pk}
+            ]
+            response = admin_client.post(
+                "%s?q=sale" % reverse("admin:corpus_document_changelist"),
+                {
+                    "action": "delete_selected",
+                    "select_across": "1",
+                    "index": "0",
+                    ACTION_CHECKBOX_NAME: [document.pk],
+                    "post": "yes",
+                },
+            )
+            mock_solr_search.assert_called_with("sale")
+        assert response.status_code == 302
+        assert not Document.objects.filter(pk=document.pk).exists()
+        assert Document.objects.filter(pk=join.pk).exists()
+
+    @patch.object(Document, "solr")
+    def test_save_with_inlines(
+        self, mock_solr, join, admin_client, django_capture_on_commit_callbacks
+    ):
+        # discard indexing queued when creating fixtures
+        transaction.get_connection().run_on_commit.clear()
+        ReindexRequest.objects.all().delete()
+        # submit the change form as displayed, with changes to the
+        # document and both text blocks
+        url = reverse("admin:corpus_document_change", args=[join.pk])
+        response = admin_client.get(url)
+        forms = [response.context["adminform"].form]
+        for inline in response.context["inline_admin_formsets"]:
+            forms += [inline.formset.management_form] + inline.formset.forms
+        data = {}
+        for form in forms:
+            for name in form.fields:
+                value = form[name].value()
+                if isinstance(value, bool):
+                    value = "on" if value else ""
+                if value is not None:
+                    data[form.add_prefix(name)] = value
+        data["description"] = "updated description"
+        data["textblock_set-0-region"] = "a"
+        data["textblock_set-1-region"] = "b"
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = admin_client.post(url, data)
+        assert response.status_code == 302
+        assert join.textblock_set.filter(region__in=["a", "b"]).count() == 2
+        # one solr update for the document and text block changes,
+        # and nothing left for the reindex queue
+        mock_solr.update.index.assert_called_once()
+        assert not ReindexRequest.objects.exists()
+        assert [d["id"] for d in mock_solr.update.index.call_args[0][0]] == [
+            join.index_id()
+        ]
+
     @pytest.mark.django_db
     def test_tabulate_queryset(self, document):
         # Create all documents
@@ -290,6 +398,19 @@ class TestDocumentAdmin:
             assert "description" in headers
             assert "needs_review" in headers
 
+    @pytest.mark.django_db
+    def test_export_to_csv_chunked(self, document, join):
+        doc_admin = DocumentAdmin(model=Document, admin_site=admin.site)
+        doc_admin.csv_chunk_size = 1
+        response = doc_admin.export_to_csv(Mock())
+        assert isinstance(response, StreamingHttpResponse)
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.reader(StringIO(content)))
+        # header plus one row per document, in id order
+        assert len(rows) == 3
+        assert rows[1][0] == str(join.id)
+        assert rows[2][0] == str(document.id)
+
 
 @pytest.mark.django_db
 class TestDocumentForm:
@@ -342,6 +463,18 @@ class TestFragmentTextBlockInline:
         assert test_description == inline.document_description(textblock)
 
 
+@pytest.mark.django_db
+class TestDocumentTextBlockInline:
+    def test_get_queryset(self, join, django_assert_max_num_queries):
+        inline = DocumentTextBlockInline(Document, admin_site=admin.site)
+        request = RequestFactory().get("/admin/corpus/document/")
+        request.user = User.objects.create_superuser(username="admin")
+        textblocks = inline.get_queryset(request).filter(document=join)
+        # fragment thumbnails are rendered without additional queries
+        with django_assert_max_num_queries(1):
+            assert len([tb.thumbnail() for tb in textblocks]) == 2
+
+
 class TestFragmentAdmin:
     @pytest.mark.django_db
     def test_changelist_sort_collection(self, db, admin_client):
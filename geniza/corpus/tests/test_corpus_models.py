@@ -1,10 +1,19 @@
-from unittest.mock import patch
+from datetime import timedelta
+from unittest.mock import Mock, call, patch
 
 from attrdict import AttrDict
-from django.db import IntegrityError
+from django.conf import settings
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.test import override_settings
+from django.utils import timezone
 from django.utils.safestring import SafeString
 from django.urls import reverse
+from piffle.presentation import IIIFException
 import pytest
+import requests
 
 from geniza.corpus.models import (
     Collection,
@@ -12,8 +21,11 @@ from geniza.corpus.models import (
     DocumentType,
     Fragment,
     LanguageScript,
+    Manifest,
+    ReindexRequest,
     TextBlock,
 )
+from geniza.corpus.solr_queryset import index_generation
 from geniza.footnotes.models import Footnote
 
 
@@ -107,6 +119,137 @@ class TestLanguageScripts:
         )
 
 
+class TestManifest:
+    manifest_data = {
+        "sequences": [
+            {
+                "canvases": [
+                    {
+                        "images": [
+                            {"resource": {"@id": "http://example.co/iiif/ts-1/00001"}}
+                        ],
+                        "label": "1r",
+                    },
+                    {
+                        "images": [
+                            {"resource": {"@id": "http://example.co/iiif/ts-1/00002"}}
+                        ],
+                        "label": "1v",
+                    },
+                ]
+            }
+        ]
+    }
+
+    def test_str(self):
+        manifest = Manifest(uri="http://example.co/iiif/ts-1")
+        assert str(manifest) == manifest.uri
+
+    @override_settings(IIIF_MANIFEST_CACHE_TTL=60)
+    def test_is_stale(self):
+        manifest = Manifest(uri="http://example.co/iiif/ts-1")
+        assert manifest.is_stale()
+        manifest.fetched = timezone.now()
+        assert not manifest.is_stale()
+        manifest.fetched = timezone.now() - timedelta(seconds=120)
+        assert manifest.is_stale()
+
+    @patch("geniza.corpus.models.requests.get")
+    def test_fetch(self, mock_get):
+        manifest = Manifest(uri="http://example.co/iiif/ts-1")
+        mock_get.return_value = Mock(
+            status_code=200,
+            headers={"etag": '"abc"', "last-modified": "Wed, 21 Oct 2015 07:28:00 GMT"},
+        )
+        mock_get.return_value.json.return_value = self.manifest_data
+        assert manifest.fetch()
+        # no conditional headers on first request
+        mock_get.assert_called_with(
+            manifest.uri, headers={}, timeout=settings.IIIF_MANIFEST_TIMEOUT
+        )
+        assert manifest.canvases == [
+            ["http://example.co/iiif/ts-1/00001", "1r"],
+            ["http://example.co/iiif/ts-1/00002", "1v"],
+        ]
+        assert manifest.etag == '"abc"'
+        assert manifest.http_last_modified == "Wed, 21 Oct 2015 07:28:00 GMT"
+        assert manifest.fetched
+
+        # cached copy: revalidate with etag and last modified
+        manifest.pk = 1
+        mock_get.return_value = Mock(status_code=304)
+        assert not manifest.fetch()
+        mock_get.assert_called_with(
+            manifest.uri,
+            headers={
+                "If-None-Match": '"abc"',
+                "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+            },
+            timeout=settings.IIIF_MANIFEST_TIMEOUT,
+        )
+        # canvases unchanged
+        assert len(manifest.canvases) == 2
+
+        # error response
+        mock_get.return_value = Mock(status_code=404, reason="Not Found")
+        with pytest.raises(IIIFException):
+            manifest.fetch()
+
+        # not json
+        mock_get.return_value = Mock(status_code=200)
+        mock_get.return_value.json.side_effect = ValueError
+        with pytest.raises(IIIFException):
+            manifest.fetch()
+
+        # server does not respond in time
+        mock_get.side_effect = requests.exceptions.ReadTimeout
+        with pytest.raises(IIIFException):
+            manifest.fetch()
+
+    @pytest.mark.django_db
+    @patch.object(Manifest, "fetch", autospec=True)
+    def test_get_manifest(self, mock_fetch):
+        uri = "http://example.co/iiif/ts-1"
+        # simulate a successful request to the remote server
+        mock_fetch.side_effect = lambda m: setattr(m, "fetched", timezone.now())
+
+        # not yet cached: fetched and saved
+        manifest = Manifest.objects.get_manifest(uri)
+        assert mock_fetch.call_count == 1
+        assert manifest.pk
+
+        # cached and fresh: no request
+        assert Manifest.objects.get_manifest(uri) == manifest
+        assert mock_fetch.call_count == 1
+
+        with patch.object(Manifest, "is_stale", return_value=True):
+            # stale: revalidated
+            Manifest.objects.get_manifest(uri)
+            assert mock_fetch.call_count == 2
+
+            # stale and revalidation fails: cached copy is used
+            mock_fetch.side_effect = IIIFException
+            assert Manifest.objects.get_manifest(uri) == manifest
+
+        # not cached and request fails: error is raised
+        with pytest.raises(IIIFException):
+            Manifest.objects.get_manifest("http://example.co/iiif/ts-2")
+
+    @pytest.mark.django_db
+    @override_settings(IIIF_MANIFEST_CACHE_MAX_ENTRIES=2)
+    def test_evict(self):
+        now = timezone.now()
+        for i in range(3):
+            Manifest.objects.create(
+                uri="http://example.co/iiif/ts-%d" % i,
+                fetched=now - timedelta(days=i),
+            )
+        Manifest.objects.evict()
+        # least recently fetched is removed
+        assert Manifest.objects.count() == 2
+        assert not Manifest.objects.filter(uri="http://example.co/iiif/ts-2").exists()
+
+
 class TestFragment:
     def test_str(self):
         frag = Fragment(shelfmark="TS 1")
@@ -121,43 +264,57 @@ class TestFragment:
         frag = Fragment.objects.create(shelfmark="TS 1")
         assert Fragment.objects.get_by_natural_key(frag.shelfmark) == frag
 
-    @patch("geniza.corpus.models.IIIFPresentation")
-    def test_iiif_thumbnails(self, mockiifpres):
+    def test_thumbnail_data(self):
+        canvases = [
+            ["http://example.co/iiif/ts-1/00001", "1r"],
+            ["http://example.co/iiif/ts-1/00002", "1v"],
+        ]
+        assert Fragment.thumbnail_data(canvases) == [
+            {
+                "url": "http://example.co/iiif/ts-1/00001/full/,200/0/default.jpg",
+                "label": "1r",
+            },
+            {
+                "url": "http://example.co/iiif/ts-1/00002/full/,200/0/default.jpg",
+                "label": "1v",
+            },
+        ]
+
+    @patch.object(Manifest.objects, "get_manifest")
+    def test_update_iiif_thumbnails(self, mock_get_manifest):
+        # no iiif
+        frag = Fragment(shelfmark="TS 1")
+        frag.update_iiif_thumbnails()
+        assert frag.iiif_thumbnail_data == []
+        mock_get_manifest.assert_not_called()
+
+        frag.iiif_url = "http://example.co/iiif/ts-1"
+        # image ids and labels as stored in the manifest cache
+        mock_get_manifest.return_value = Manifest(
+            uri=frag.iiif_url,
+            canvases=[["http://example.co/iiif/ts-1/00001", "1r"]],
+        )
+        frag.update_iiif_thumbnails()
+        mock_get_manifest.assert_called_with(frag.iiif_url)
+        assert frag.iiif_thumbnail_data[0]["label"] == "1r"
+
+        # error loading manifest: thumbnails cleared, no exception
+        mock_get_manifest.side_effect = IIIFException
+        frag.update_iiif_thumbnails()
+        assert frag.iiif_thumbnail_data == []
+
+    @patch.object(Manifest.objects, "get_manifest")
+    def test_iiif_thumbnails(self, mock_get_manifest):
         # no iiif
         frag = Fragment(shelfmark="TS 1")
         assert frag.iiif_thumbnails() == ""
 
         frag.iiif_url = "http://example.co/iiif/ts-1"
-        # return simplified part of the manifest we need for this
-        mockiifpres.from_url.return_value = AttrDict(
-            {
-                "sequences": [
-                    {
-                        "canvases": [
-                            {
-                                "images": [
-                                    {
-                                        "resource": {
-                                            "id": "http://example.co/iiif/ts-1/00001",
-                                        }
-                                    }
-                                ],
-                                "label": "1r",
-                            },
-                            {
-                                "images": [
-                                    {
-                                        "resource": {
-                                            "id": "http://example.co/iiif/ts-1/00002",
-                                        }
-                                    }
-                                ],
-                                "label": "1v",
-                            },
-                        ]
-                    }
-                ]
-            }
+        frag.iiif_thumbnail_data = Fragment.thumbnail_data(
+            [
+                ["http://example.co/iiif/ts-1/00001", "1r"],
+                ["http://example.co/iiif/ts-1/00002", "1v"],
+            ]
         )
 
         thumbnails = frag.iiif_thumbnails()
@@ -168,6 +325,28 @@ class TestFragment:
         assert 'title="1r"' in thumbnails
         assert 'title="1v"' in thumbnails
         assert isinstance(thumbnails, SafeString)
+        # display uses stored data only; manifest is never loaded
+        mock_get_manifest.assert_not_called()
+
+    @pytest.mark.django_db
+    @patch.object(Fragment, "update_iiif_thumbnails")
+    def test_save_iiif_thumbnails(self, mock_update_thumbnails):
+        # new fragment without iiif url
+        frag = Fragment.objects.create(shelfmark="TS 1")
+        mock_update_thumbnails.assert_not_called()
+        # new fragment with iiif url
+        frag2 = Fragment.objects.create(
+            shelfmark="TS 2", iiif_url="http://example.co/iiif/ts-2"
+        )
+        assert mock_update_thumbnails.call_count == 1
+        # iiif url unchanged
+        frag2.notes = "some notes"
+        frag2.save()
+        assert mock_update_thumbnails.call_count == 1
+        # iiif url added
+        frag.iiif_url = "http://example.co/iiif/ts-1"
+        frag.save()
+        assert mock_update_thumbnails.call_count == 2
 
     @pytest.mark.django_db
     def test_save(self):
@@ -361,6 +540,47 @@ class TestDocument:
         TextBlock.objects.create(document=doc, fragment=frag, order=1)
         assert doc.title == "Legal: s1"
 
+    def test_shelfmark_sort(self):
+        frag = Fragment.objects.create(shelfmark="T-S 8J22.21")
+        frag2 = Fragment.objects.create(shelfmark="T-S NS J193")
+        doc = Document.objects.create()
+        assert doc.shelfmark_sort == ""
+        # saving text blocks updates sort key, in text block order
+        TextBlock.objects.create(document=doc, fragment=frag2, order=1)
+        block = TextBlock.objects.create(document=doc, fragment=frag, order=2)
+        doc.refresh_from_db()
+        assert doc.shelfmark_sort == "T-S NS J193 + T-S 8J22.21"
+
+        # changing a fragment shelfmark updates documents
+        frag2.shelfmark = "T-S NS J194"
+        frag2.save()
+        doc.refresh_from_db()
+        assert doc.shelfmark_sort == "T-S NS J194 + T-S 8J22.21"
+
+        # deleting a text block or fragment updates sort key
+        block.delete()
+        doc.refresh_from_db()
+        assert doc.shelfmark_sort == "T-S NS J194"
+        frag2.delete()
+        doc.refresh_from_db()
+        assert doc.shelfmark_sort == ""
+
+    def test_shelfmark_index_sort_key(self):
+        doc = Document.objects.create()
+        frag = Fragment.objects.create(shelfmark="T-S 8J22.21")
+        frag2 = Fragment.objects.create(shelfmark="T-S NS J193")
+        TextBlock.objects.create(document=doc, fragment=frag, order=1)
+        TextBlock.objects.create(document=doc, fragment=frag2, order=2)
+        assert (
+            doc.shelfmark_index_sort_key()
+            == "t-s 000008j000022.000021 + t-s ns j000193"
+        )
+        # numbers sort numerically
+        frag.shelfmark = "T-S 10J1.1"
+        frag.save()
+        doc = Document.objects.get(pk=doc.pk)
+        assert doc.shelfmark_index_sort_key() > "t-s 000008j000022.000021"
+
     def test_shelfmark_display(self):
         # T-S 8J22.21 + T-S NS J193
         frag = Fragment.objects.create(shelfmark="T-S 8J22.21")
@@ -408,6 +628,76 @@ class TestDocument:
         fn.save()
         assert document.has_transcription
 
+    def test_input_date(self, document, django_assert_num_queries):
+        # fixture has log entries from 2004 and 2021; input is the earliest
+        assert document.input_date.year == 2004
+        assert Document.objects.create().input_date is None
+
+        # annotated date is used without querying log entries
+        input_date = document.input_date
+        doc = Document.objects.with_log_entry_dates().get(pk=document.pk)
+        with django_assert_num_queries(0):
+            assert doc.input_date == input_date
+        assert doc.index_data()["input_year_i"] == 2004
+
+    def test_update_summary(self, document, fragment, source):
+        # summary is updated when fragments are added to a document
+        document.refresh_from_db()
+        summary = document.summary
+        assert summary.shelfmark == document.shelfmark == fragment.shelfmark
+        assert summary.shelfmark_display == fragment.shelfmark
+        assert summary.collection == document.collection
+        assert summary.iiif_urls == [fragment.iiif_url]
+        assert summary.has_image
+        assert not summary.has_transcription
+
+        # saving a footnote with content updates transcription status
+        Footnote.objects.create(
+            content_object=document, source=source, content="The transcription"
+        )
+        summary.refresh_from_db()
+        assert summary.has_transcription
+
+        # changing fragment iiif url updates image status
+        fragment.iiif_url = ""
+        fragment.save()
+        summary.refresh_from_db()
+        assert not summary.has_image
+        assert summary.iiif_urls == []
+
+    def test_update_summary_new_document(self):
+        # new documents get a summary before any fragments are added
+        doc = Document.objects.create()
+        assert doc.summary.shelfmark == ""
+        assert not doc.summary.has_image
+
+    def test_update_summary_collection(self, document, fragment):
+        # renaming a collection updates summaries that include it
+        fragment.collection = Collection.objects.create(library="Cambridge")
+        fragment.save()
+        collection = fragment.collection
+        collection.abbrev = "CUL"
+        collection.save()
+        document.summary.refresh_from_db()
+        assert document.summary.collection == "CUL"
+
+    def test_stored_summary(self, document, fragment, django_assert_num_queries):
+        # summary is only used when loaded with the document
+        assert document.stored_summary is None
+        doc = Document.objects.select_related("summary").get(pk=document.pk)
+        assert doc.stored_summary == document.summary
+        doc.stored_summary.shelfmark = "stored shelfmark"
+        doc.stored_summary.shelfmark_display = "stored"
+        doc.stored_summary.has_image = False
+        assert doc.shelfmark == "stored shelfmark"
+        assert str(doc) == f"stored (PGPID {doc.pk})"
+        assert not doc.has_image()
+        # no related queries needed
+        with django_assert_num_queries(0):
+            assert doc.collection == document.collection
+            assert doc.iiif_urls() == [fragment.iiif_url]
+            assert not doc.has_transcription()
+
     def test_has_image(self, document, fragment):
         # doc with fragment with IIIF url has image
         assert document.has_image()
@@ -431,6 +721,7 @@ class TestDocument:
         for tag in document.tags.all():
             assert tag.name in index_data["tags_ss"]
         assert index_data["status_s"] == "Public"
+        assert index_data["shelfmark_sort_s"] == document.shelfmark_index_sort_key()
         assert not index_data["old_pgpids_is"]
 
         # test with notes and review notes
@@ -513,6 +804,122 @@ class TestDocument:
         # check that edition with content is sorted first
         assert edition2 == doc_editions[0]
 
+    def test_changed_since(self, document, join, source):
+        # backdate all records so nothing counts as changed
+        past = timezone.now() - timedelta(days=1)
+        Document.objects.update(last_modified=past)
+        Fragment.objects.update(last_modified=past)
+        TextBlock.objects.update(last_modified=past)
+        since = timezone.now() - timedelta(hours=1)
+        assert not Document.changed_since(since).exists()
+
+        # document modified
+        Document.objects.filter(pk=join.pk).update(last_modified=timezone.now())
+        assert list(Document.changed_since(since)) == [join]
+        Document.objects.filter(pk=join.pk).update(last_modified=past)
+
+        # fragment modified
+        fragment = document.fragments.first()
+        Fragment.objects.filter(pk=fragment.pk).update(last_modified=timezone.now())
+        assert document in Document.changed_since(since)
+        Fragment.objects.update(last_modified=past)
+
+        # footnote added
+        Footnote.objects.create(content_object=join, source=source)
+        assert list(Document.changed_since(since)) == [join]
+        Footnote.objects.update(last_modified=past)
+
+        # log entry added
+        LogEntry.objects.log_action(
+            user_id=User.objects.create(username="editor").pk,
+            content_type_id=ContentType.objects.get_for_model(Document).pk,
+            object_id=document.pk,
+            object_repr=str(document),
+            action_flag=CHANGE,
+        )
+        assert list(Document.changed_since(since)) == [document]
+
+
+@pytest.mark.django_db
+@patch.object(Document, "solr")
+class TestDocumentIndexBatch:
+    @pytest.fixture(autouse=True)
+    def discard_pending(self, document, join):
+        # discard on-commit indexing queued when creating fixtures
+        transaction.get_connection().run_on_commit.clear()
+
+    def test_add(self, mock_solr, document, join, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            document.index()
+            join.index()
+            document.index()
+            # nothing sent to solr until commit
+            mock_solr.update.index.assert_not_called()
+        # one callback and one update for all documents
+        assert len(callbacks) == 1
+        mock_solr.update.index.assert_called_once()
+        indexed_ids = [data["id"] for data in mock_solr.update.index.call_args[0][0]]
+        assert sorted(indexed_ids) == sorted([document.index_id(), join.index_id()])
+        mock_solr.update.delete_by_id.assert_not_called()
+
+    def test_add_deleted(self, mock_solr, document, django_capture_on_commit_callbacks):
+        index_id = document.index_id()
+        with django_capture_on_commit_callbacks(execute=True):
+            document.delete()
+            # pk is unset on delete; restore as signal handler would see it
+            document.pk = 3951
+            document.remove_from_index()
+        mock_solr.update.index.assert_not_called()
+        mock_solr.update.delete_by_id.assert_called_once_with([index_id])
+
+    def test_add_solr_unavailable(
+        self, mock_solr, document, django_capture_on_commit_callbacks
+    ):
+        ReindexRequest.objects.all().delete()
+        mock_solr.update.index.side_effect = requests.exceptions.ConnectionError
+        with django_capture_on_commit_callbacks(execute=True):
+            document.index()
+        # queued to be reindexed later
+        assert list(ReindexRequest.objects.values_list("document_id", flat=True)) == [
+            document.pk
+        ]
+
+    def test_index_generation(self, mock_solr, document):
+        generation = index_generation()
+        Document.index_items([document])
+        # cached search results are invalidated
+        assert index_generation() != generation
+
+    def test_index_generation_after_commit(self, mock_solr, document):
+        calls = Mock()
+        mock_solr.update.make_request.side_effect = lambda *args, **kwargs: calls(
+            "commit", kwargs["params"]
+        )
+        with patch(
+            "geniza.corpus.solr_queryset.bump_index_generation",
+            side_effect=lambda: calls("bump"),
+        ):
+            Document.index_items([document])
+        # changes are made searchable before cached results are invalidated
+        assert calls.call_args_list == [
+            call("commit", {"softCommit": True}),
+            call("bump"),
+        ]
+
+    def test_add_rollback(
+        self, mock_solr, document, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            with pytest.raises(IntegrityError):
+                with transaction.atomic():
+                    document.index()
+                    raise IntegrityError
+            # rolled back changes are discarded; a new batch is started
+            assert not callbacks
+            document.index()
+        assert len(callbacks) == 1
+        mock_solr.update.index.assert_called_once()
+
 
 @pytest.mark.django_db
 class TestTextBlock:
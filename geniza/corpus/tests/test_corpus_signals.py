@@ -1,66 +1,75 @@
 from unittest.mock import patch
 
 import pytest
-from parasolr.django.indexing import ModelIndexable
 
 from geniza.corpus.models import (
     Fragment,
     Document,
+    DocumentIndexBatch,
     DocumentSignalHandlers,
     DocumentType,
+    ReindexRequest,
 )
 
 
+def queued_ids():
+    return list(ReindexRequest.objects.values_list("document_id", flat=True))
+
+
 @pytest.mark.django_db
-@patch.object(ModelIndexable, "index_items")
-def test_related_save(mock_indexitems, document, join):
+def test_related_save(document, join):
+    # clear requests queued by fixture setup
+    ReindexRequest.objects.all().delete()
     # unsaved fragment should be ignored
     frag = Fragment(shelfmark="T-S 123")
 
     # unsaved - ignore
     DocumentSignalHandlers.related_save(Fragment, frag)
-    mock_indexitems.assert_not_called()
+    assert not ReindexRequest.objects.exists()
     # raw - ignore
     DocumentSignalHandlers.related_save(Fragment, frag, raw=True)
-    mock_indexitems.assert_not_called()
+    assert not ReindexRequest.objects.exists()
     # saved but no associated documents
     frag.save()
     DocumentSignalHandlers.related_save(Fragment, frag)
-    mock_indexitems.assert_not_called()
+    assert not ReindexRequest.objects.exists()
 
-    # fragment associated with a document
-    DocumentSignalHandlers.related_save(Fragment, document.fragments.first())
-    assert mock_indexitems.call_count == 1
-    assert document in mock_indexitems.call_args[0][0]
-    assert join in mock_indexitems.call_args[0][0]
+    # fragment associated with a document; indexed with the transaction
+    with patch.object(DocumentIndexBatch, "add_ids") as mock_add_ids:
+        DocumentSignalHandlers.related_save(Fragment, document.fragments.first())
+        assert sorted(mock_add_ids.call_args[0][0]) == sorted([document.pk, join.pk])
+    assert not ReindexRequest.objects.exists()
 
     # doctype
-    mock_indexitems.reset_mock()
     DocumentSignalHandlers.related_save(DocumentType, document.doctype)
-    assert mock_indexitems.call_count == 1
-    assert document in mock_indexitems.call_args[0][0]
-    assert join not in mock_indexitems.call_args[0][0]
+    assert queued_ids() == [document.pk]
 
     # unhandled model should be ignored, no error
-    mock_indexitems.reset_mock()
+    ReindexRequest.objects.all().delete()
     DocumentSignalHandlers.related_save(Document, document)
-    mock_indexitems.assert_not_called()
+    assert not ReindexRequest.objects.exists()
 
 
 @pytest.mark.django_db
-@patch.object(ModelIndexable, "index_items")
-def test_related_delete(mock_indexitems, document, join):
+def test_related_delete(document, join):
     # delegates to same method as save, just check a few cases
+    ReindexRequest.objects.all().delete()
 
     # fragment associated with a document
-    DocumentSignalHandlers.related_delete(Fragment, document.fragments.first())
-    assert mock_indexitems.call_count == 1
-    assert document in mock_indexitems.call_args[0][0]
-    assert join in mock_indexitems.call_args[0][0]
+    with patch.object(DocumentIndexBatch, "add_ids") as mock_add_ids:
+        DocumentSignalHandlers.related_delete(Fragment, document.fragments.first())
+        assert sorted(mock_add_ids.call_args[0][0]) == sorted([document.pk, join.pk])
 
     # doctype
-    mock_indexitems.reset_mock()
     DocumentSignalHandlers.related_delete(DocumentType, document.doctype)
-    assert mock_indexitems.call_count == 1
-    assert document in mock_indexitems.call_args[0][0]
-    assert join not in mock_indexitems.call_args[0][0]
+    assert queued_ids() == [document.pk]
+
+
+@pytest.mark.django_db
+def test_related_save_repeated(document):
+    # repeated changes each queue a request; duplicates are coalesced
+    # when the queue is processed
+    ReindexRequest.objects.all().delete()
+    DocumentSignalHandlers.related_save(DocumentType, document.doctype)
+    DocumentSignalHandlers.related_save(DocumentType, document.doctype)
+    assert queued_ids() == [document.pk, document.pk]
@@ -1,6 +1,27 @@
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
-from geniza.corpus.solr_queryset import DocumentSolrQuerySet
+import pytest
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger
+
+from geniza.common.cache import LRUFileBasedCache
+from geniza.corpus.solr_queryset import (
+    INDEX_GENERATION_KEY,
+    DocumentSolrQuerySet,
+    SolrPaginator,
+    bump_index_generation,
+    index_generation,
+)
+
+
+def test_index_generation_shared():
+    # generation is visible to other processes using the search cache
+    other_process_cache = LRUFileBasedCache(settings.CACHES["search"]["LOCATION"], {})
+    generation = index_generation()
+    assert other_process_cache.get(INDEX_GENERATION_KEY) == generation
+    bump_index_generation()
+    assert other_process_cache.get(INDEX_GENERATION_KEY) == index_generation()
+    assert index_generation() != generation
 
 
 class TestDocumentSolrQuerySet:
@@ -18,3 +39,133 @@ class TestDocumentSolrQuerySet:
             mocksearch.return_value.raw_query_parameters.assert_called_with(
                 doc_query="CUL Or.1080 3.41 T-S 13J16.20 T-S 13J8.14"
             )
+
+    def test_facet_filter(self):
+        dqs = DocumentSolrQuerySet().facet_filter("type", ["Legal", 'Say "hi"'])
+        assert '{!tag=type}type_s:("Legal" OR "Say \\"hi\\"")' in dqs.query_opts()["fq"]
+
+    def test_cache_key(self):
+        dqs = DocumentSolrQuerySet()
+        key = dqs.cache_key({"q": "*:*", "fq": ["a:1", "b:2"], "rows": 10})
+        # parameter and filter order don't matter
+        assert key == dqs.cache_key({"rows": 10, "fq": ["b:2", "a:1"], "q": "*:*"})
+        assert key != dqs.cache_key({"q": "*:*", "fq": ["a:1"], "rows": 10})
+        # new index generation changes the key
+        bump_index_generation()
+        assert key != dqs.cache_key({"q": "*:*", "fq": ["a:1", "b:2"], "rows": 10})
+
+    def test_cached_query(self):
+        dqs = DocumentSolrQuerySet()
+        response = {
+            "responseHeader": {"params": {}},
+            "response": {"numFound": 1, "start": 0, "docs": [{"pgpid": 1}]},
+        }
+        with patch.object(dqs, "solr") as mocksolr:
+            mocksolr.query.return_value = response
+            assert dqs.get_results() == [{"pgpid": 1}]
+            assert dqs.count() == 1
+            # same query is served from the cache
+            assert dqs.all().get_results() == [{"pgpid": 1}]
+            assert mocksolr.query.call_count == 1
+            # different query is not
+            dqs.filter(pgpid=2).get_results()
+            assert mocksolr.query.call_count == 2
+
+            # not cached after indexing
+            bump_index_generation()
+            dqs.all().get_results()
+            assert mocksolr.query.call_count == 3
+
+            # query errors are not cached
+            mocksolr.query.return_value = None
+            assert dqs.filter(pgpid=3).get_results() == []
+            mocksolr.query.return_value = response
+            assert dqs.filter(pgpid=3).get_results() == [{"pgpid": 1}]
+
+    def test_results_only(self):
+        opts = DocumentSolrQuerySet().results_only().query_opts()
+        fields = opts["fl"].split(",")
+        assert "pgpid:pgpid_i" in fields
+        assert "shelfmark:shelfmark_ss" in fields
+        # full text fields are not returned
+        assert not any(
+            field.endswith(("description_t", "notes_t", "scholarship_t"))
+            for field in fields
+        )
+        assert opts["hl"] is True
+        assert opts["hl.fl"] == "description_t"
+        assert opts["hl.fragsize"] == 135
+        assert opts["hl.bs.type"] == "WORD"
+
+    def test_get_results_highlighting(self):
+        dqs = DocumentSolrQuerySet().results_only()
+        with patch.object(dqs, "solr") as mocksolr:
+            mocksolr.query.return_value = {
+                "responseHeader": {"params": {}},
+                "response": {
+                    "numFound": 2,
+                    "start": 0,
+                    "docs": [
+                        {"id": "document.1", "pgpid": 1},
+                        {"id": "document.2", "pgpid": 2},
+                    ],
+                },
+                "highlighting": {
+                    "document.1": {"description_t": ["Deed of <em>sale</em>"]},
+                    "document.2": {},
+                },
+            }
+            results = dqs.get_results()
+        assert results[0]["highlight"] == {"description": ["Deed of <em>sale</em>"]}
+        assert results[1]["highlight"] == {}
+
+    def test_get_results(self):
+        dqs = DocumentSolrQuerySet()
+        with patch.object(dqs, "solr") as mocksolr:
+            mocksolr.query.return_value = {
+                "responseHeader": {"params": {}},
+                "response": {
+                    "numFound": 12,
+                    "start": 0,
+                    "docs": [{"pgpid": 1}, {"pgpid": 2}],
+                },
+                "nextCursorMark": "AoE",
+            }
+            results = dqs.get_results(cursorMark="*")
+            assert results == [{"pgpid": 1}, {"pgpid": 2}]
+            assert dqs.next_cursor == "AoE"
+            assert mocksolr.query.call_args[1]["cursorMark"] == "*"
+            assert mocksolr.query.call_args[1]["wrap"] is False
+            # count from the same response
+            assert dqs.count() == 12
+            assert mocksolr.query.call_count == 1
+
+            # query error
+            mocksolr.query.return_value = None
+            assert dqs.get_results() == []
+
+
+class TestSolrPaginator:
+    def test_page(self):
+        mock_qs = MagicMock()
+        page_qs = mock_qs.__getitem__.return_value
+        page_qs.get_results.return_value = [{"pgpid": 1}, {"pgpid": 2}]
+        page_qs.count.return_value = 22
+
+        paginator = SolrPaginator(mock_qs, 10)
+        page = paginator.page(2)
+        mock_qs.__getitem__.assert_called_with(slice(10, 20))
+        assert page.object_list == [{"pgpid": 1}, {"pgpid": 2}]
+        assert paginator.count == 22
+        assert paginator.num_pages == 3
+        assert page.has_next()
+        # count is not queried separately
+        mock_qs.count.assert_not_called()
+
+        with pytest.raises(PageNotAnInteger):
+            paginator.page("two")
+        with pytest.raises(EmptyPage):
+            paginator.page(0)
+        # beyond the last page
+        with pytest.raises(EmptyPage):
+            paginator.page(5)
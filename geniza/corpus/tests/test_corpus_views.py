@@ -1,12 +1,17 @@
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 from django.urls import reverse
 from pytest_django.asserts import assertContains
 
 from geniza.corpus.models import Document, DocumentType, Fragment, TextBlock
-from geniza.corpus.solr_queryset import DocumentSolrQuerySet
+from geniza.corpus.solr_queryset import (
+    DocumentSolrQuerySet,
+    SolrPaginator,
+    bump_index_generation,
+)
 from geniza.corpus.views import (
+    DocumentSearchApiView,
     DocumentSearchView,
     old_pgp_edition,
     old_pgp_tabulate_data,
@@ -148,19 +153,27 @@ class TestDocumentSearchView:
         # no params
         docsearch_view.request.GET = {}
         assert docsearch_view.get_form_kwargs() == {
-            "initial": {},
+            "initial": {"sort": "shelfmark"},
             "prefix": None,
-            "data": {},
+            "data": {"sort": "shelfmark"},
         }
 
         # keyword search param
         docsearch_view.request.GET = {"query": "contract"}
         assert docsearch_view.get_form_kwargs() == {
-            "initial": {},
+            "initial": {"sort": "shelfmark"},
             "prefix": None,
             "data": {"query": "contract", "sort": "relevance"},
         }
 
+        # keyword search with another sort
+        docsearch_view.request.GET = {"query": "contract", "sort": "pgpid"}
+        assert docsearch_view.get_form_kwargs()["data"]["sort"] == "pgpid"
+
+        # relevance not allowed without keyword search
+        docsearch_view.request.GET = {"sort": "relevance"}
+        assert docsearch_view.get_form_kwargs()["data"]["sort"] == "shelfmark"
+
     @pytest.mark.usefixtures("mock_solr_queryset")
     def test_get_queryset(self, mock_solr_queryset):
         with patch(
@@ -175,19 +188,289 @@ class TestDocumentSearchView:
 
             mock_queryset_cls.assert_called_with()
             mock_sqs = mock_queryset_cls.return_value
+            # only fields displayed in results
+            mock_sqs.results_only.assert_called_with()
+            # NOTE: results_only and keyword search not in parasolr list
+            # for mock solr queryset
+            mock_sqs = mock_sqs.results_only.return_value
             mock_sqs.keyword_search.assert_called_with("six apartments")
-            # NOTE: keyword search not in parasolr list for mock solr queryset
             mock_sqs.keyword_search.return_value.also.assert_called_with("score")
 
-    def test_get_context_data(self, rf):
+    def test_filter_queryset(self, rf):
+        docsearch_view = DocumentSearchView()
+        docsearch_view.request = rf.get(
+            "/documents/",
+            {
+                "query": "deed",
+                "doctype": ["Legal", "Letter"],
+                "has_transcription": "on",
+                "input_year_start": "2004",
+            },
+        )
+        form = docsearch_view.get_form()
+        assert form.is_valid()
+        qs = docsearch_view.filter_queryset(DocumentSolrQuerySet(), form)
+        opts = qs.query_opts()
+        assert '{!tag=type}type_s:("Legal" OR "Letter")' in opts["fq"]
+        assert "{!tag=has_transcription}num_editions_i:[1 TO *]" in opts["fq"]
+        assert "input_year_i:[2004 TO *]" in opts["fq"]
+        # facets exclude their own filters for multi-select
+        assert "{!ex=type}type_s" in opts["facet.field"]
+        assert "{!ex=tags}tags_ss" in opts["facet.field"]
+        assert opts["facet.query"] == docsearch_view.has_transcription_query
+        assert not docsearch_view.cache_facets
+
+    def test_filter_queryset_cached_facets(self, rf):
         docsearch_view = DocumentSearchView()
         docsearch_view.request = rf.get("/documents/")
-        docsearch_view.queryset = Mock()
-        docsearch_view.queryset.count.return_value = 22
-        docsearch_view.object_list = docsearch_view.queryset
+        form = docsearch_view.get_form()
+        assert form.is_valid()
+        facets = {"facet_fields": {"type": {"Legal": 3}}, "facet_queries": {}}
+        with patch("geniza.corpus.views.cache") as mock_cache:
+            mock_cache.get.return_value = None
+            qs = docsearch_view.filter_queryset(DocumentSolrQuerySet(), form)
+            assert docsearch_view.cache_facets
+            assert qs.facet_field_list
+
+            # facets from the results are cached for unfiltered browse
+            page_qs = Mock(facet_field_list=qs.facet_field_list)
+            page_qs.get_facets.return_value = facets
+            docsearch_view.set_facets(page_qs)
+            assert docsearch_view.facets == facets
+            mock_cache.set.assert_called_with(
+                docsearch_view.facet_cache_key, facets, 300
+            )
+
+            # cached facets are not requested from solr again
+            docsearch_view = DocumentSearchView()
+            docsearch_view.request = rf.get("/documents/")
+            mock_cache.get.return_value = facets
+            qs = docsearch_view.filter_queryset(DocumentSolrQuerySet(), form)
+            assert not qs.facet_field_list
+            assert docsearch_view.facets == facets
+
+    @pytest.mark.parametrize(
+        "params,sort",
+        [
+            ({}, ["shelfmark_sort_s asc", "id asc"]),
+            ({"query": "deed"}, ["score desc", "id asc"]),
+            ({"sort": "input_date_desc"}, ["input_date_dt desc", "id asc"]),
+            ({"sort": "scholarship_desc"}, ["scholarship_count_i desc", "id asc"]),
+            ({"query": "deed", "sort": "pgpid"}, ["pgpid_i asc", "id asc"]),
+        ],
+    )
+    def test_get_queryset_sort(self, rf, params, sort):
+        docsearch_view = DocumentSearchView()
+        docsearch_view.request = rf.get("/documents/", params)
+        with patch("geniza.corpus.views.cache") as mock_cache:
+            mock_cache.get.return_value = {}
+            qs = docsearch_view.get_queryset()
+        assert qs.sort_options == sort
 
-        context_data = docsearch_view.get_context_data()
+    def test_get_paginate_by(self, rf):
+        docsearch_view = DocumentSearchView()
+        docsearch_view.request = rf.get("/documents/")
+        assert docsearch_view.get_paginate_by(Mock()) == 50
+        docsearch_view.request = rf.get("/documents/", {"per_page": "25"})
+        assert docsearch_view.get_paginate_by(Mock()) == 25
+        # invalid option ignored
+        docsearch_view.request = rf.get("/documents/", {"per_page": "1000"})
+        assert docsearch_view.get_paginate_by(Mock()) == 50
+
+    def test_paginate_queryset(self, rf):
+        docsearch_view = DocumentSearchView()
+        docsearch_view.kwargs = {}
+        mock_qs = MagicMock()
+        page_qs = mock_qs.raw_query_parameters.return_value.__getitem__.return_value
+        page_qs.get_results.return_value = [{"pgpid": 1}, {"pgpid": 2}]
+        page_qs.count.return_value = 12
+        page_qs.next_cursor = "AoE"
+
+        # browse: first page uses initial cursor
+        docsearch_view.use_cursor = True
+        docsearch_view.request = rf.get("/documents/")
+        paginator, page, results, is_paginated = docsearch_view.paginate_queryset(
+            mock_qs, 2
+        )
+        mock_qs.raw_query_parameters.assert_called_with(cursorMark="*")
+        mock_qs.raw_query_parameters.return_value.__getitem__.assert_called_with(
+            slice(None, 2)
+        )
+        assert results == page_qs.get_results.return_value
+        assert is_paginated
+        assert docsearch_view.total == 12
+        assert docsearch_view.next_cursor == "AoE"
+
+        # last page: solr returns the same cursor
+        docsearch_view.next_cursor = None
+        docsearch_view.request = rf.get("/documents/", {"cursor": "AoE"})
+        paginator, page, results, is_paginated = docsearch_view.paginate_queryset(
+            mock_qs, 2
+        )
+        mock_qs.raw_query_parameters.assert_called_with(cursorMark="AoE")
+        assert not is_paginated
+        assert docsearch_view.next_cursor is None
+
+        # search: paginated by page number
+        docsearch_view.use_cursor = False
+        docsearch_view.request = rf.get("/documents/", {"page": "2"})
+        with patch.object(SolrPaginator, "page") as mock_page:
+            mock_page.return_value.object_list = ["a"]
+            paginator, page, results, is_paginated = docsearch_view.paginate_queryset(
+                mock_qs, 2
+            )
+            mock_page.assert_called_with(2)
+            assert isinstance(paginator, SolrPaginator)
+
+    def test_get_context_data(self, rf):
+        docsearch_view = DocumentSearchView()
+        docsearch_view.request = rf.get(
+            "/documents/", {"query": "contract", "page": "2", "per_page": "10"}
+        )
+        docsearch_view.total = 22
+        docsearch_view.next_cursor = "AoE"
+        docsearch_view.object_list = []
+        docsearch_view.kwargs = {}
+
+        with patch.object(docsearch_view, "paginate_queryset") as mock_paginate:
+            mock_paginate.return_value = (None, None, [], False)
+            context_data = docsearch_view.get_context_data()
         assert context_data["total"] == 22
+        assert context_data["next_cursor"] == "AoE"
+        # page and cursor are excluded from params for pagination links
+        assert context_data["page_params"] == "query=contract&per_page=10"
+
+    @pytest.mark.django_db
+    def test_pagination_links(self, client):
+        with patch("geniza.corpus.views.DocumentSolrQuerySet") as mock_qs_cls:
+            mock_qs = mock_qs_cls.return_value
+            for method in ["results_only", "facet", "facet_field", "order_by"]:
+                getattr(mock_qs, method).return_value = mock_qs
+            page_qs = mock_qs.raw_query_parameters.return_value.__getitem__.return_value
+            page_qs.get_results.return_value = []
+            page_qs.count.return_value = 0
+            page_qs.next_cursor = "*"
+            response = client.get(reverse("corpus:document-search"))
+            assert response.status_code == 200
+            assert 'rel="next"' not in response.content.decode()
+
+            page_qs.get_results.return_value = [
+                {
+                    "pgpid": 1,
+                    "type": "Legal",
+                    "shelfmark": ["T-S 1"],
+                    "highlight": {"description": ["Deed of <em>sale</em>"]},
+                }
+            ]
+            page_qs.count.return_value = 51
+            page_qs.next_cursor = "AoE+x"
+            response = client.get(reverse("corpus:document-search"))
+            assertContains(response, 'href="?&amp;cursor=AoE%2Bx"')
+            # description snippet from highlighting
+            assertContains(response, "<p>Deed of <em>sale</em></p>", html=True)
+
+            # long snippets are truncated, keeping highlighting markup intact
+            page_qs.get_results.return_value[0]["highlight"]["description"] = [
+                "Deed of <em>sale</em>" + " of a house" * 20
+            ]
+            response = client.get(reverse("corpus:document-search"))
+            snippet = "Deed of <em>sale</em>" + (" of a house" * 20)[:122] + "…"
+            assertContains(response, "<p>%s</p>" % snippet, html=True)
+
+
+class TestDocumentSearchApiView:
+    @pytest.fixture
+    def mock_qs(self):
+        with patch("geniza.corpus.views.DocumentSolrQuerySet") as mock_qs_cls:
+            mock_qs_cls.result_fields = DocumentSolrQuerySet.result_fields
+            mock_qs = mock_qs_cls.return_value
+            for method in [
+                "results_only",
+                "keyword_search",
+                "also",
+                "facet",
+                "facet_field",
+                "order_by",
+                "only",
+                "filter",
+            ]:
+                getattr(mock_qs, method).return_value = mock_qs
+            page_qs = mock_qs.__getitem__.return_value
+            page_qs.get_results.return_value = [
+                {
+                    "id": "document.1",
+                    "pgpid": 1,
+                    "type": "Legal",
+                    "shelfmark": ["T-S 1"],
+                    "score": 1.5,
+                    "highlight": {"description": ["Deed of <em>sale</em>"]},
+                }
+            ]
+            page_qs.count.return_value = 1
+            page_qs.facet_field_list = ["type_s"]
+            page_qs.get_facets.return_value = {
+                "facet_fields": {"type": {"Legal": 1}},
+                "facet_queries": {"has_transcription": 0},
+            }
+            mock_qs_cls.page_qs = page_qs
+            yield mock_qs_cls
+
+    def test_get(self, client, mock_qs):
+        url = reverse("corpus:document-search-api")
+        response = client.get(url, {"query": "sale", "fields": "type"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 1
+        assert data["page"] == 1
+        assert data["num_pages"] == 1
+        assert data["results"] == [
+            {
+                "pgpid": 1,
+                "type": "Legal",
+                "score": 1.5,
+                "highlight": {"description": ["Deed of <em>sale</em>"]},
+                "url": "http://testserver%s" % reverse("corpus:document", args=[1]),
+            }
+        ]
+        assert data["facets"]["facet_fields"] == {"type": {"Legal": 1}}
+        # fields limited to those requested
+        mock_qs.return_value.only.assert_called_with("id", "pgpid", "type", "score")
+        # suppressed documents are not included
+        mock_qs.return_value.filter.assert_any_call(status="Public")
+        assert response["ETag"].startswith('"')
+        assert "public" in response["Cache-Control"]
+        assert "max-age=300" in response["Cache-Control"]
+
+    def test_etag(self, client, mock_qs):
+        url = reverse("corpus:document-search-api")
+        response = client.get(url, {"query": "sale"})
+        etag = response["ETag"]
+        # different parameters, different etag
+        assert client.get(url, {"query": "deed"})["ETag"] != etag
+        # not modified
+        response = client.get(url, {"query": "sale"}, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert mock_qs.page_qs.get_results.call_count == 2
+        # reindexing changes the etag
+        bump_index_generation()
+        response = client.get(url, {"query": "sale"}, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+    def test_api_fields(self, document):
+        # all fields available in the api are indexed
+        index_data = document.index_data()
+        for field in DocumentSearchApiView.api_fields:
+            assert DocumentSolrQuerySet.field_aliases[field] in index_data
+
+    def test_invalid(self, client, mock_qs):
+        url = reverse("corpus:document-search-api")
+        response = client.get(url, {"fields": "type,notes"})
+        assert response.status_code == 400
+        assert response.json() == {"errors": {"fields": ["Unknown field(s): notes"]}}
+        response = client.get(url, {"per_page": "1000"})
+        assert response.status_code == 400
+        assert "per_page" in response.json()["errors"]
 
 
 class TestDocumentScholarshipView:
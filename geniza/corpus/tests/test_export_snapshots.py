@@ -0,0 +1,66 @@
+import csv
+from io import StringIO
+
+import pytest
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import RequestFactory
+
+from geniza.corpus.management.commands import export_snapshots
+from geniza.corpus.models import Document
+
+
+def test_get_snapshots():
+    snapshots = export_snapshots.Command().get_snapshots()
+    assert set(snapshots.keys()) == {
+        "documents",
+        "sources",
+        "footnotes",
+        "pgp-metadata",
+    }
+
+
+@pytest.mark.django_db
+def test_handle(document, join, settings):
+    stdout = StringIO()
+    call_command("export_snapshots", stdout=stdout)
+    output = stdout.getvalue()
+    for name in ["documents", "sources", "footnotes", "pgp-metadata"]:
+        assert "Generated %s snapshot" % name in output
+    assert len(list(settings.CSV_SNAPSHOT_ROOT.iterdir())) == 4
+
+    # unchanged data is not regenerated
+    stdout = StringIO()
+    call_command("export_snapshots", "documents", stdout=stdout)
+    assert stdout.getvalue().strip() == "documents snapshot is up to date"
+    stdout = StringIO()
+    call_command("export_snapshots", "documents", "--force", stdout=stdout)
+    assert "Generated documents snapshot" in stdout.getvalue()
+
+    with pytest.raises(CommandError, match="Unknown snapshot"):
+        call_command("export_snapshots", "bogus", stdout=stdout)
+
+
+@pytest.mark.django_db
+def test_document_export_snapshot(document, join):
+    doc_admin = admin.site._registry[Document]
+    rqst = RequestFactory().get("/admin/corpus/document/csv/")
+    live_export = b"".join(doc_admin.export_to_csv(rqst).streaming_content)
+
+    call_command("export_snapshots", "documents", stdout=StringIO())
+    response = doc_admin.export_to_csv(rqst)
+    assert "ETag" in response
+    snapshot_export = b"".join(response.streaming_content)
+    # snapshot matches the live export, apart from modification times
+    live_rows = list(csv.reader(StringIO(live_export.decode())))
+    snapshot_rows = list(csv.reader(StringIO(snapshot_export.decode())))
+    assert snapshot_rows == live_rows
+
+    # changed data: not served from outdated snapshot once the
+    # cached version expires
+    join.description = "updated"
+    join.save()
+    cache.clear()
+    assert "ETag" not in doc_admin.export_to_csv(rqst)
@@ -1,6 +1,10 @@
 from django import forms
 
-from geniza.corpus.forms import DocumentSearchForm, SelectWithDisabled
+from geniza.corpus.forms import (
+    DocumentSearchForm,
+    FacetChoiceField,
+    SelectWithDisabled,
+)
 
 
 class TestSelectedWithDisabled:
@@ -47,3 +51,40 @@ class TestDocumentSearch:
             "relevance",
             {"label": "Relevance", "disabled": True},
         )
+
+    def test_is_filtered(self):
+        form = DocumentSearchForm({"query": "illness"})
+        assert form.is_valid()
+        assert not form.is_filtered()
+        form = DocumentSearchForm({"doctype": ["Legal"]})
+        assert form.is_valid()
+        assert form.is_filtered()
+        form = DocumentSearchForm({"input_year_start": "2004"})
+        assert form.is_valid()
+        assert form.is_filtered()
+
+    def test_set_choices_from_facets(self):
+        form = DocumentSearchForm({"doctype": ["Letter"]})
+        assert form.is_valid()
+        form.set_choices_from_facets(
+            {
+                "facet_fields": {"type": {"Legal": 10}, "tags": {"marriage": 2}},
+                "facet_queries": {"has_transcription": 5},
+            }
+        )
+        # selected value included even if not in facets
+        assert form.fields["doctype"].choices == [
+            ("Legal", "Legal (10)"),
+            ("Letter", "Letter (0)"),
+        ]
+        assert form.fields["tags"].choices == [("marriage", "marriage (2)")]
+        assert form.fields["collection"].choices == []
+        assert form.fields["has_transcription"].label == "Has Transcription (5)"
+
+
+class TestFacetChoiceField:
+    def test_valid_value(self):
+        field = FacetChoiceField()
+        # choices are not known in advance; any value is valid
+        assert field.clean(["anything"]) == ["anything"]
+        assert field.clean([]) == []
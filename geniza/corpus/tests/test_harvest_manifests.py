@@ -0,0 +1,106 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from piffle.presentation import IIIFException
+
+from geniza.corpus.management.commands import harvest_manifests
+from geniza.corpus.models import Fragment, Manifest
+
+
+def test_host_rate_limiter():
+    limiter = harvest_manifests.HostRateLimiter(10)
+    with patch("geniza.corpus.management.commands.harvest_manifests.time") as mocktime:
+        mocktime.monotonic.return_value = 100
+        # first request to a host is not delayed
+        limiter.wait("https://cudl.lib.cam.ac.uk/iiif/MS-ADD-02586")
+        mocktime.sleep.assert_not_called()
+        # different host is not delayed
+        limiter.wait("https://iiif.example.com/TS16.377")
+        mocktime.sleep.assert_not_called()
+        # second request to the same host waits for the interval
+        limiter.wait("https://cudl.lib.cam.ac.uk/iiif/MS-ADD-02587")
+        mocktime.sleep.assert_called_with(10)
+
+
+@pytest.mark.django_db
+def test_get_manifests(fragment, multifragment):
+    # fragment with no iiif url is ignored
+    Fragment.objects.create(shelfmark="T-S 1")
+    command = harvest_manifests.Command()
+    command.stats = harvest_manifests.Counter()
+    manifests = command.get_manifests()
+    assert command.stats["total"] == 2
+    assert set(m.uri for m in manifests) == {fragment.iiif_url, multifragment.iiif_url}
+    assert not any(m.pk for m in manifests)
+
+    # fresh cached manifest is skipped unless revalidating all
+    Manifest.objects.create(uri=fragment.iiif_url, fetched=timezone.now())
+    manifests = command.get_manifests()
+    assert [m.uri for m in manifests] == [multifragment.iiif_url]
+    assert len(command.get_manifests(revalidate_all=True)) == 2
+
+    # stale cached manifest is included
+    Manifest.objects.filter(uri=fragment.iiif_url).update(
+        fetched=timezone.now() - timedelta(days=365)
+    )
+    manifests = command.get_manifests()
+    assert len(manifests) == 2
+
+
+@pytest.mark.django_db
+@patch.object(Manifest, "fetch", autospec=True)
+def test_handle(mock_fetch, fragment, multifragment):
+    def fetch(manifest):
+        if manifest.uri == multifragment.iiif_url:
+            raise IIIFException("Error retrieving manifest")
+        manifest.fetched = timezone.now()
+        manifest.canvases = [["https://images.lib.cam.ac.uk/iiif/MS-ADD-02586-1", "1r"]]
+        return True
+
+    mock_fetch.side_effect = fetch
+    stdout = StringIO()
+    stderr = StringIO()
+    call_command("harvest_manifests", "--delay", "0", stdout=stdout, stderr=stderr)
+
+    manifest = Manifest.objects.get(uri=fragment.iiif_url)
+    assert manifest.canvases[0][1] == "1r"
+    # fragment thumbnails updated from the harvested manifest
+    fragment.refresh_from_db()
+    assert fragment.iiif_thumbnail_data[0]["label"] == "1r"
+    # failed manifest is not saved
+    assert not Manifest.objects.filter(uri=multifragment.iiif_url).exists()
+
+    output = stdout.getvalue()
+    assert "Fragment IIIF URLs: 2" in output
+    assert "Manifests updated: 1" in output
+    assert "Errors: 1" in output
+    assert "Fragment thumbnails updated: 1" in output
+    assert "Requested 2 manifests" in output
+    assert "Error harvesting %s" % multifragment.iiif_url in stderr.getvalue()
+
+    # second run only requests the manifest that is not cached
+    mock_fetch.reset_mock()
+    stdout = StringIO()
+    call_command("harvest_manifests", "--delay", "0", stdout=stdout, stderr=StringIO())
+    assert mock_fetch.call_count == 1
+    assert "Manifests skipped (cached): 1" in stdout.getvalue()
+
+
+@pytest.mark.django_db
+def test_handle_missing_thumbnails(fragment):
+    # manifest is cached and fresh but fragment has no thumbnails yet
+    Manifest.objects.create(
+        uri=fragment.iiif_url,
+        fetched=timezone.now(),
+        canvases=[["https://images.lib.cam.ac.uk/iiif/MS-ADD-02586-1", "1r"]],
+    )
+    Fragment.objects.filter(pk=fragment.pk).update(iiif_thumbnail_data=[])
+    with patch.object(Manifest, "fetch") as mock_fetch:
+        call_command("harvest_manifests", stdout=StringIO())
+        mock_fetch.assert_not_called()
+    fragment.refresh_from_db()
+    assert fragment.iiif_thumbnail_data[0]["label"] == "1r"
@@ -0,0 +1,169 @@
+import os
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import Mock, patch
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from django.core.management.base import CommandError
+import requests
+
+from geniza.corpus.management.commands import index_documents
+from geniza.corpus.models import Document, IndexWatermark
+from geniza.footnotes.models import Footnote
+
+
+@pytest.mark.django_db
+def test_pk_ranges(document, join):
+    command = index_documents.Command()
+    ranges = command.pk_ranges(1000)
+    min_pk = min(document.pk, join.pk)
+    assert ranges[0] == (min_pk, min_pk + 1000)
+    assert ranges[-1][1] > max(document.pk, join.pk)
+    # all documents are included in a range
+    for doc in Document.objects.all():
+        assert any(start <= doc.pk < end for start, end in ranges)
+
+    # no documents: no ranges
+    Document.objects.all().delete()
+    assert command.pk_ranges(1000) == []
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.index_documents.SolrClient")
+def test_index_pk_range(mock_solrclient, document, join):
+    mock_update = mock_solrclient.return_value.update
+    # join is created after document fixture, which has an explicit pk
+    assert join.pk < document.pk
+    pid, count, elapsed = index_documents.index_pk_range(
+        join.pk, document.pk + 1, batch_size=1, commit_within=5000
+    )
+    assert pid == os.getpid()
+    assert count == 2
+    # batch size of one: one update per document, in pk order
+    assert mock_update.index.call_count == 2
+    indexed_ids = [args[0][0][0]["id"] for args in mock_update.index.call_args_list]
+    assert indexed_ids == [join.index_id(), document.index_id()]
+    mock_update.index.assert_called_with([document.index_data()], commitWithin=5000)
+
+    # range that excludes join
+    mock_update.reset_mock()
+    pid, count, elapsed = index_documents.index_pk_range(
+        document.pk, document.pk + 1, batch_size=10
+    )
+    assert count == 1
+    mock_update.index.assert_called_once()
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.index_documents.SolrClient")
+def test_handle(mock_solrclient, document, join):
+    stdout = StringIO()
+    # single process runs in the current process
+    call_command("index_documents", "-p", "1", stdout=stdout)
+    output = stdout.getvalue()
+    assert "Worker %d: indexed 2 documents" % os.getpid() in output
+    assert "Indexed 2 documents" in output
+    # final hard commit
+    mock_solrclient.return_value.update.index.assert_called_with([], commit=True)
+
+    # solr connection error
+    mock_solrclient.return_value.update.index.side_effect = (
+        requests.exceptions.ConnectionError
+    )
+    with pytest.raises(CommandError):
+        call_command("index_documents", "-p", "1", stdout=stdout)
+
+
+# committed data is needed for worker processes to see the documents
+@pytest.mark.django_db(transaction=True)
+@patch("geniza.corpus.management.commands.index_documents.SolrClient")
+def test_handle_processes(mock_solrclient, document, join):
+    stdout = StringIO()
+    call_command("index_documents", "-p", "2", stdout=stdout)
+    output = stdout.getvalue()
+    # documents are indexed in worker processes, not the current process
+    assert "Indexed 2 documents" in output
+    assert "Worker %d:" % os.getpid() not in output
+    # final hard commit
+    mock_solrclient.return_value.update.index.assert_called_with([], commit=True)
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.index_documents.SolrClient")
+def test_handle_incremental(mock_solrclient, document, join):
+    mock_update = mock_solrclient.return_value.update
+    stdout = StringIO()
+    # no previous run: index everything and record watermark
+    call_command("index_documents", "-p", "1", "--incremental", stdout=stdout)
+    output = stdout.getvalue()
+    assert "No previous run found" in output
+    assert "Indexed 2 documents" in output
+    watermark = IndexWatermark.objects.get(name="documents")
+
+    # nothing changed since last run
+    Document.objects.update(last_modified=watermark.timestamp)
+    mock_update.reset_mock()
+    stdout = StringIO()
+    call_command("index_documents", "--incremental", stdout=stdout)
+    output = stdout.getvalue()
+    assert "Indexing documents changed since" in output
+    assert "Indexed 0 documents" in output
+    mock_update.index.assert_called_once_with([], commit=True)
+    # watermark is advanced
+    assert IndexWatermark.objects.get(name="documents").timestamp > watermark.timestamp
+
+    # only the changed document is indexed
+    Document.objects.filter(pk=join.pk).update(last_modified=timezone.now())
+    mock_update.reset_mock()
+    stdout = StringIO()
+    call_command("index_documents", "--incremental", stdout=stdout)
+    assert "Indexed 1 documents" in stdout.getvalue()
+    mock_update.index.assert_any_call([join.index_data()], commitWithin=None)
+
+    # watermark is not updated when indexing fails
+    watermark = IndexWatermark.objects.get(name="documents")
+    mock_update.index.side_effect = requests.exceptions.ConnectionError
+    with pytest.raises(CommandError):
+        call_command("index_documents", "--incremental", stdout=stdout)
+    assert IndexWatermark.objects.get(name="documents") == watermark
+
+
+def test_indexed_pgpids():
+    solr = Mock()
+    solr.query.side_effect = [
+        {
+            "response": {"docs": [{"pgpid_i": 1}, {"pgpid_i": 2}]},
+            "nextCursorMark": "AoE1",
+        },
+        {"response": {"docs": [{"pgpid_i": 3}]}, "nextCursorMark": "AoE2"},
+    ]
+    assert list(index_documents.indexed_pgpids(solr, rows=2)) == [1, 2, 3]
+    # pages with the cursor from the previous response
+    assert solr.query.call_args_list[0][1]["cursorMark"] == "*"
+    assert solr.query.call_args_list[1][1]["cursorMark"] == "AoE1"
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.index_documents.SolrClient")
+def test_handle_incremental_deletions(mock_solrclient, document, join, source):
+    mock_solr = mock_solrclient.return_value
+    footnote = Footnote.objects.create(source=source, content_object=document)
+    IndexWatermark.objects.create(name="documents", timestamp=timezone.now())
+    Document.objects.update(last_modified=timezone.now() - timedelta(days=1))
+    # solr has a document that has been deleted from the database
+    mock_solr.query.return_value = {
+        "response": {"docs": [{"pgpid_i": join.pk}, {"pgpid_i": 9999}]},
+        "nextCursorMark": "AoE1",
+    }
+    # deleting a footnote queues its document
+    footnote.delete()
+
+    stdout = StringIO()
+    call_command("index_documents", "--incremental", stdout=stdout)
+    output = stdout.getvalue()
+    assert "Indexed 1 documents" in output
+    mock_solr.update.index.assert_any_call([document.index_data()], commitWithin=None)
+    assert "Removed 1 deleted documents" in output
+    mock_solr.update.delete_by_id.assert_called_once_with(["document.9999"])
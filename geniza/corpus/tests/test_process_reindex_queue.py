@@ -0,0 +1,66 @@
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+import requests
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from geniza.corpus.management.commands import process_reindex_queue
+from geniza.corpus.models import Document, ReindexRequest
+
+
+@pytest.mark.django_db
+@patch.object(Document, "index_items")
+def test_process_queue(mock_index_items, document, join):
+    command = process_reindex_queue.Command()
+    # clear requests queued by fixture setup
+    ReindexRequest.objects.all().delete()
+    # empty queue: nothing indexed
+    assert command.process_queue() == 0
+    mock_index_items.assert_not_called()
+
+    # duplicate requests are coalesced; deleted documents are skipped
+    ReindexRequest.objects.enqueue([document.pk, join.pk, document.pk, 12345])
+    indexed = []
+    # evaluate queryset when called, as indexing does
+    mock_index_items.side_effect = lambda docs: indexed.extend(docs) or len(docs)
+    assert command.process_queue() == 2
+    assert len(indexed) == 2
+    assert set(indexed) == {document, join}
+    # processed requests are removed
+    assert not ReindexRequest.objects.exists()
+
+    # requests are kept if indexing fails
+    ReindexRequest.objects.enqueue([document.pk])
+    mock_index_items.side_effect = requests.exceptions.ConnectionError
+    with pytest.raises(requests.exceptions.ConnectionError):
+        command.process_queue()
+    assert ReindexRequest.objects.count() == 1
+
+
+@pytest.mark.django_db
+@patch.object(Document, "index_items")
+def test_handle(mock_index_items, document):
+    ReindexRequest.objects.enqueue([document.pk])
+    mock_index_items.return_value = 1
+    stdout = StringIO()
+    call_command("process_reindex_queue", stdout=stdout)
+    assert "Indexed 1 queued document(s)" in stdout.getvalue()
+
+    # solr connection error
+    ReindexRequest.objects.enqueue([document.pk])
+    mock_index_items.side_effect = requests.exceptions.ConnectionError
+    with pytest.raises(CommandError):
+        call_command("process_reindex_queue", stdout=stdout)
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.process_reindex_queue.time.sleep")
+@patch.object(process_reindex_queue.Command, "process_queue")
+def test_handle_watch(mock_process_queue, mock_sleep):
+    # stop the worker loop on the third pass
+    mock_process_queue.side_effect = [1, 0, KeyboardInterrupt]
+    call_command("process_reindex_queue", "--watch", "-i", "2", stdout=StringIO())
+    assert mock_process_queue.call_count == 3
+    mock_sleep.assert_called_with(2)
@@ -2,6 +2,7 @@ from django.urls import path
 
 from geniza.corpus.views import (
     DocumentDetailView,
+    DocumentSearchApiView,
     DocumentSearchView,
     DocumentScholarshipView,
     pgp_metadata_for_old_site,
@@ -11,6 +12,11 @@ app_name = "corpus"
 
 urlpatterns = [
     path("documents/", DocumentSearchView.as_view(), name="document-search"),
+    path(
+        "api/documents/",
+        DocumentSearchApiView.as_view(),
+        name="document-search-api",
+    ),
     path("documents/<int:pk>/", DocumentDetailView.as_view(), name="document"),
     path(
         "documents/<int:pk>/scholarship/",
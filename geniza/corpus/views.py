@@ -1,12 +1,25 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.admin.models import LogEntry
+from django.core.cache import cache
 from django.db.models.query import Prefetch
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.views.generic import DetailView, ListView
 from django.views.generic.edit import FormMixin
 from tabular_export.admin import export_to_csv_response
 
+from geniza.common.snapshots import CsvSnapshot
 from geniza.corpus.forms import DocumentSearchForm
-from geniza.corpus.models import Document, TextBlock
-from geniza.corpus.solr_queryset import DocumentSolrQuerySet
-from geniza.footnotes.models import Footnote
+from geniza.corpus.models import Document, Fragment, TextBlock
+from geniza.corpus.solr_queryset import (
+    DocumentSolrQuerySet,
+    SolrPaginator,
+    index_generation,
+)
+from geniza.footnotes.models import Authorship, Creator, Footnote, Source
 
 
 class DocumentSearchView(ListView, FormMixin):
@@ -15,10 +28,36 @@ class DocumentSearchView(ListView, FormMixin):
     context_object_name = "documents"
     template_name = "corpus/document_list.html"
 
-    # map form sort to solr sort field
+    paginate_by = 50
+    paginator_class = SolrPaginator
+    #: whether results are paginated with a solr cursor
+    use_cursor = False
+    #: cursor for the next page of results, when using a cursor
+    next_cursor = None
+    #: total number of results
+    total = 0
+    #: facet counts for the current search
+    facets = None
+    #: whether facet counts for this search should be cached
+    cache_facets = False
+    #: cache key for facet counts when no search or filters are active
+    facet_cache_key = "corpus:document-search:facets"
+    #: facet query for documents with transcriptions
+    has_transcription_query = (
+        "{!ex=has_transcription key=has_transcription}num_editions_i:[1 TO *]"
+    )
+
+    initial = {"sort": "shelfmark"}
+
+    # map form sort to solr sort fields; all sorts end with the unique
+    # id, so that order is stable for cursor paging
     solr_sort = {
-        "relevance": "-score",
-        #        'name': 'sort_name_isort'
+        "relevance": ["-score", "id"],
+        "input_date_desc": ["-input_date_dt", "id"],
+        "input_date_asc": ["input_date_dt", "id"],
+        "shelfmark": ["shelfmark_sort_s", "id"],
+        "scholarship_desc": ["-scholarship_count_i", "id"],
+        "pgpid": ["pgpid_i", "id"],
     }
 
     def get_form_kwargs(self):
@@ -26,17 +65,18 @@ class DocumentSearchView(ListView, FormMixin):
         # use GET instead of default POST/PUT for form data
         form_data = self.request.GET.copy()
 
-        # always use relevance sort for keyword search;
-        # otherwise use default (sort by name)
+        # use relevance sort for keyword search unless another
+        # sort is requested; relevance is not available for browse
         if form_data.get("query", None):
-            form_data["sort"] = "relevance"
-        # sorting TODO
-        # else:
-        # form_data['sort'] = self.initial['sort']
+            if not form_data.get("sort"):
+                form_data["sort"] = "relevance"
+        elif form_data.get("sort") == "relevance":
+            del form_data["sort"]
 
         # use initial values as defaults
-        # for key, val in self.initial.items():
-        # form_data.setdefault(key, val)
+        for key, val in self.initial.items():
+            if not form_data.get(key):
+                form_data[key] = val
 
         kwargs["data"] = form_data
         return kwargs
@@ -52,31 +92,221 @@ class DocumentSearchView(ListView, FormMixin):
         else:
             search_opts = form.cleaned_data
 
+            documents = documents.results_only()
             if search_opts["query"]:
                 documents = documents.keyword_search(search_opts["query"]).also(
                     "score"
                 )  # include relevance score in results
+            else:
+                # page through browse results with a cursor
+                self.use_cursor = True
+
+            documents = self.filter_queryset(documents, form)
 
-            # sorting TODO; for now, order by relevance
-            documents = documents.order_by("-score")
+            documents = documents.order_by(
+                *self.solr_sort[search_opts["sort"] or self.initial["sort"]]
+            )
 
-        self.queryset = documents
+        return documents
+
+    def filter_queryset(self, documents, form):
+        """Filter on selected facets and request facet counts in the
+        same Solr query as the results. Facet counts for the unfiltered
+        browse page are cached briefly and not requested again."""
+        search_opts = form.cleaned_data
+        for field, solr_field in form.FACET_FIELDS.items():
+            if search_opts.get(field):
+                documents = documents.facet_filter(solr_field, search_opts[field])
+        if search_opts.get("has_transcription"):
+            documents = documents.filter(
+                num_editions__range=(1, None), tag="has_transcription"
+            )
+        if search_opts.get("input_year_start") or search_opts.get("input_year_end"):
+            documents = documents.filter(
+                input_year__range=(
+                    search_opts.get("input_year_start"),
+                    search_opts.get("input_year_end"),
+                )
+            )
+
+        self.cache_facets = not search_opts.get("query") and not form.is_filtered()
+        if self.cache_facets:
+            self.facets = cache.get(self.facet_cache_key)
+        if self.facets is None:
+            # exclude each facet's own filter from its counts,
+            # so that multiple values can be selected
+            documents = documents.facet(mincount=1, query=self.has_transcription_query)
+            for solr_field in form.FACET_FIELDS.values():
+                documents = documents.facet_field(solr_field, exclude=solr_field)
+        return documents
+
+    def set_facets(self, queryset):
+        """Set facet counts from the Solr response for the current
+        page of results, if they were requested."""
+        if self.facets is not None or not (queryset and queryset.facet_field_list):
+            return
+        facets = queryset.get_facets()
+        self.facets = {
+            "facet_fields": {
+                field: dict(counts)
+                for field, counts in facets.get("facet_fields", {}).items()
+            },
+            "facet_queries": dict(facets.get("facet_queries", {})),
+        }
+        if self.cache_facets:
+            cache.set(
+                self.facet_cache_key, self.facets, settings.SEARCH_FACET_CACHE_TTL
+            )
 
-        # return 50 documents for now; pagination TODO
-        return documents[:50]
+    def get_paginate_by(self, queryset):
+        form = self.get_form()
+        if form.is_valid() and form.cleaned_data.get("per_page"):
+            return int(form.cleaned_data["per_page"])
+        return self.paginate_by
+
+    def paginate_queryset(self, queryset, page_size):
+        """Paginate browse results using a Solr cursor, so that paging
+        deep into results is as fast as the first page; search results are
+        paginated by page number."""
+        if not self.use_cursor:
+            paginator, page, results, is_paginated = super().paginate_queryset(
+                queryset, page_size
+            )
+            self.total = paginator.count
+            self.set_facets(paginator.page_queryset)
+            return (paginator, page, results, is_paginated)
+
+        cursor = self.request.GET.get("cursor") or "*"
+        page_queryset = queryset.raw_query_parameters(cursorMark=cursor)[:page_size]
+        results = page_queryset.get_results()
+        # total is included in the same response
+        self.total = page_queryset.count()
+        self.set_facets(page_queryset)
+        # solr returns the current cursor when there are no more results
+        if results and page_queryset.next_cursor != cursor:
+            self.next_cursor = page_queryset.next_cursor
+        return (None, None, results, self.next_cursor is not None)
 
     def get_context_data(self):
         context_data = super().get_context_data()
-        # should eventually be handled by paginator, but
-        # patch in total number of results for display for now
+        # current parameters, for use in pagination links
+        page_params = self.request.GET.copy()
+        page_params.pop(self.page_kwarg, None)
+        page_params.pop("cursor", None)
+        form = context_data["form"]
+        if form.is_valid() and self.facets:
+            form.set_choices_from_facets(self.facets)
         context_data.update(
             {
-                "total": self.queryset.count(),
+                "total": self.total,
+                "next_cursor": self.next_cursor,
+                "page_params": page_params.urlencode(),
             }
         )
         return context_data
 
 
+class DocumentSearchApiView(DocumentSearchView):
+    """Read-only JSON version of document search, with the same search,
+    filter, sort and pagination parameters. Returned fields can be
+    selected with a comma-separated `fields` parameter. Responses have
+    an ETag based on the index generation and request parameters and
+    can be cached by clients and proxies."""
+
+    #: fields that can be requested with the `fields` parameter
+    api_fields = DocumentSolrQuerySet.result_fields[1:] + [
+        "description",
+        "collection",
+        "input_date",
+        "old_pgpids",
+    ]
+
+    #: facet counts only include public documents, so are cached separately
+    facet_cache_key = "corpus:document-search-api:facets"
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            form = self.get_form()
+            if not form.is_valid():
+                return JsonResponse({"errors": form.errors}, status=400)
+            try:
+                self.selected_fields = self.get_fields()
+            except ValueError as err:
+                return JsonResponse({"errors": {"fields": [str(err)]}}, status=400)
+            response = super().get(request, *args, **kwargs)
+
+        response["ETag"] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.SEARCH_API_CACHE_SECONDS
+        )
+        return response
+
+    def get_etag(self):
+        """Strong ETag for the current index generation and request
+        parameters, so that cached responses are revalidated once
+        documents are reindexed. The generation is stored in the
+        shared search cache, so all web processes return the same
+        ETag for the same response."""
+        params = sorted(self.request.GET.lists())
+        digest = hashlib.sha1(f"{index_generation()}:{params}".encode())
+        return '"%s"' % digest.hexdigest()
+
+    def filter_queryset(self, documents, form):
+        """Limit results to public documents, since suppressed documents
+        have no public detail page."""
+        public = dict(Document.STATUS_CHOICES)[Document.PUBLIC]
+        return super().filter_queryset(documents.filter(status=public), form)
+
+    def get_fields(self):
+        """List of requested fields; raises ValueError for unknown fields"""
+        fields = [
+            field.strip()
+            for field in self.request.GET.get("fields", "").split(",")
+            if field.strip()
+        ]
+        unknown = set(fields) - set(self.api_fields)
+        if unknown:
+            raise ValueError("Unknown field(s): %s" % ", ".join(sorted(unknown)))
+        return fields or DocumentSolrQuerySet.result_fields[1:]
+
+    def get_queryset(self):
+        documents = super().get_queryset()
+        # id is needed to match highlighting to results
+        fields = ["id", "pgpid"] + [
+            field for field in self.selected_fields if field != "pgpid"
+        ]
+        if self.request.GET.get("query"):
+            fields.append("score")
+        return documents.only(*fields)
+
+    def render_to_response(self, context):
+        page = context["page_obj"]
+        return JsonResponse(
+            {
+                "total": self.total,
+                "page": page.number if page else None,
+                "num_pages": page.paginator.num_pages if page else None,
+                "next_cursor": self.next_cursor,
+                "results": [self.result_data(doc) for doc in context["documents"]],
+                "facets": self.facets or {},
+            }
+        )
+
+    def result_data(self, doc):
+        """Data for a single search result"""
+        data = {
+            field: value
+            for field, value in doc.items()
+            if field in self.selected_fields or field in ["pgpid", "score", "highlight"]
+        }
+        data["url"] = self.request.build_absolute_uri(
+            reverse("corpus:document", args=[doc["pgpid"]])
+        )
+        return data
+
+
 class DocumentDetailView(DetailView):
     """public display of a single :class:`~geniza.corpus.models.Document`"""
 
@@ -86,7 +316,7 @@ class DocumentDetailView(DetailView):
 
     def get_queryset(self, *args, **kwargs):
         """Don't show document if it isn't public"""
-        queryset = super().get_queryset(*args, **kwargs)
+        queryset = super().get_queryset(*args, **kwargs).with_log_entry_dates()
         return queryset.filter(status=Document.PUBLIC)
 
 
@@ -101,7 +331,9 @@ class DocumentScholarshipView(DocumentDetailView):
         queryset = (
             super()
             .get_queryset(*args, **kwargs)
-            .prefetch_related("footnotes")
+            .prefetch_related(
+                Prefetch("footnotes", queryset=Footnote.objects.with_sources())
+            )
             .distinct()     # prevent MultipleObjectsReturned if many footnotes
         )
 
@@ -132,6 +364,14 @@ def old_pgp_edition(editions):
     return ""
 
 
+def prefetched_editions(doc):
+    """Editions for a document, using editions prefetched by
+    :func:`old_pgp_queryset` when available."""
+    if hasattr(doc, "edition_list"):
+        return doc.edition_list
+    return doc.editions()
+
+
 def old_pgp_tabulate_data(queryset):
     """Takes a :class:`~geniza.corpus.models.Document` queryset and
     yields rows of data for serialization as csv in :method:`pgp_metadata_for_old_site`"""
@@ -158,24 +398,30 @@ def old_pgp_tabulate_data(queryset):
             " ".join("#" + t.name for t in doc.tags.all()),  # tags
             join_shelfmark if " + " in join_shelfmark else "",  # join
             doc.description,  # description
-            old_pgp_edition(doc.editions()),  # editor
+            old_pgp_edition(prefetched_editions(doc)),  # editor
             ";".join([str(i) for i in doc.old_pgpids]) if doc.old_pgpids else "",
         ]
 
 
-def pgp_metadata_for_old_site(request):
-    """Stream metadata in CSV format for index and display in the old PGP site."""
-
+def old_pgp_queryset():
+    """Documents to include in metadata for the old PGP site"""
     # limit to documents with associated fragments, since the output
     # assumes a document has at least one frgment
-    queryset = (
+    return (
         Document.objects.filter(status=Document.PUBLIC, fragments__isnull=False)
         .order_by("id")
         .distinct()
         .select_related("doctype")
         .prefetch_related(
             "tags",
-            "footnotes",
+            # editions with sources and authors, as ordered by editions()
+            Prefetch(
+                "footnotes",
+                queryset=Footnote.objects.with_sources()
+                .filter(doc_relation__contains=Footnote.EDITION)
+                .order_by("content", "source"),
+                to_attr="edition_list",
+            ),
             # see corpus admin for notes on nested prefetch
             Prefetch(
                 "textblock_set",
@@ -185,23 +431,50 @@ def pgp_metadata_for_old_site(request):
             ),
         )
     )
-    # return response
+
+
+old_pgp_csv_fields = [
+    "pgpid",
+    "library",
+    "shelfmark",
+    "shelfmark_alt",
+    "recto_verso",
+    "type",
+    "tags",
+    "joins",
+    "description",
+    "editor",
+    "old_pgpids",
+]
+
+#: snapshot of metadata for the old PGP site, which polls for updates
+old_pgp_snapshot = CsvSnapshot(
+    "pgp-metadata",
+    old_pgp_csv_fields,
+    lambda: old_pgp_tabulate_data(old_pgp_queryset()),
+    [
+        Document,
+        Fragment,
+        TextBlock,
+        Footnote,
+        Source,
+        (Creator, "id"),
+        (Authorship, "id"),
+        (LogEntry, "id"),
+    ],
+)
+
+
+def pgp_metadata_for_old_site(request):
+    """Stream metadata in CSV format for index and display in the old PGP site."""
+    # serve from snapshot if there is one for the current data
+    response = old_pgp_snapshot.response(request, "pgp_metadata.csv")
+    if response:
+        return response
     return export_to_csv_response(
         "pgp_metadata.csv",
-        [
-            "pgpid",
-            "library",
-            "shelfmark",
-            "shelfmark_alt",
-            "recto_verso",
-            "type",
-            "tags",
-            "joins",
-            "description",
-            "editor",
-            "old_pgpids",
-        ],
-        old_pgp_tabulate_data(queryset),
+        old_pgp_csv_fields,
+        old_pgp_tabulate_data(old_pgp_queryset()),
     )
 
 
@@ -3,6 +3,7 @@ from django import forms
 from django.conf.urls import url
 from django.contrib import admin
 from django.contrib.admin import SimpleListFilter
+from django.contrib.admin.models import LogEntry
 from django.contrib.contenttypes.admin import GenericTabularInline
 from django.contrib.sites.models import Site
 from django.db import models
@@ -17,6 +18,7 @@ from django.utils.html import format_html
 from modeltranslation.admin import TabbedTranslationAdmin
 from tabular_export.admin import export_to_csv_response
 
+from geniza.corpus.models import Document, Fragment, TextBlock
 from geniza.footnotes.models import (
     Authorship,
     Creator,
@@ -25,7 +27,7 @@ from geniza.footnotes.models import (
     SourceLanguage,
     SourceType,
 )
-from geniza.common.admin import custom_empty_field_list_filter
+from geniza.common.admin import CsvSnapshotMixin, custom_empty_field_list_filter
 
 
 class AuthorshipInline(SortableInlineAdminMixin, admin.TabularInline):
@@ -96,7 +98,7 @@ class DocumentFootnoteInline(GenericTabularInline):
 
 
 @admin.register(Source)
-class SourceAdmin(TabbedTranslationAdmin, admin.ModelAdmin):
+class SourceAdmin(CsvSnapshotMixin, TabbedTranslationAdmin, admin.ModelAdmin):
     footnote_admin_url = "admin:footnotes_footnote_changelist"
 
     list_display = ("all_authors", "title", "journal", "volume", "year", "footnotes")
@@ -216,9 +218,25 @@ class SourceAdmin(TabbedTranslationAdmin, admin.ModelAdmin):
                 f"{url_scheme}{site_domain}/admin/footnotes/source/{source.id}/change/",
             ]
 
+    snapshot_name = "sources"
+    # authors are only logged when edited, since they have no
+    # modification time
+    snapshot_models = [
+        Source,
+        Footnote,
+        (Creator, "id"),
+        (Authorship, "id"),
+        (LogEntry, "id"),
+    ]
+
     def export_to_csv(self, request, queryset=None):
         """Stream source records as CSV"""
-        queryset = queryset or self.get_queryset(request)
+        if queryset is None:
+            # serve export of all sources from snapshot when available
+            response = self.snapshot_response(request)
+            if response:
+                return response
+            queryset = self.get_queryset(request)
         return export_to_csv_response(
             self.csv_filename(),
             self.csv_fields,
@@ -277,7 +295,7 @@ class FootnoteForm(forms.ModelForm):
 
 
 @admin.register(Footnote)
-class FootnoteAdmin(admin.ModelAdmin):
+class FootnoteAdmin(CsvSnapshotMixin, admin.ModelAdmin):
     form = FootnoteForm
     list_display = (
         "__str__",
@@ -346,7 +364,7 @@ class FootnoteAdmin(admin.ModelAdmin):
             super()
             .get_queryset(request)
             .select_related("source")
-            .prefetch_related("content_object", "source__authors")
+            .prefetch_related("content_object")
         )
 
     def doc_relation_list(self, obj):
@@ -393,9 +411,29 @@ class FootnoteAdmin(admin.ModelAdmin):
                 f"{url_scheme}{site_domain}/admin/footnotes/footnote/{footnote.id}/change/",
             ]
 
+    snapshot_name = "footnotes"
+    # include models used for source citations and footnote documents;
+    # authors are only logged when edited, since they have no
+    # modification time
+    snapshot_models = [
+        Footnote,
+        Source,
+        (Creator, "id"),
+        (Authorship, "id"),
+        Document,
+        Fragment,
+        TextBlock,
+        (LogEntry, "id"),
+    ]
+
     def export_to_csv(self, request, queryset=None):
         """Stream footnote records as CSV"""
-        queryset = queryset or self.get_queryset(request)
+        if queryset is None:
+            # serve export of all footnotes from snapshot when available
+            response = self.snapshot_response(request)
+            if response:
+                return response
+            queryset = self.get_queryset(request)
         return export_to_csv_response(
             self.csv_filename(),
             self.csv_fields,
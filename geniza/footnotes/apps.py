@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class FootnotesConfig(AppConfig):
     name = "geniza.footnotes"
     verbose_name = "Scholarship Records"
+
+    def ready(self):
+        from django.db.models.signals import m2m_changed
+
+        from geniza.footnotes.models import Authorship
+
+        # update stored source citations when authors are added or
+        # removed without saving authorships
+        m2m_changed.connect(Authorship.authors_changed, sender=Authorship)
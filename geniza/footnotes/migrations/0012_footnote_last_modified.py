@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-17 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("footnotes", "0011_split_goitein_typedtexts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="footnote",
+            name="last_modified",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-17 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("footnotes", "0012_footnote_last_modified"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="source",
+            name="last_modified",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.1 on 2026-10-17 06:27
+
+from django.db import migrations, models
+
+
+def format_citation(source, author_names):
+    # frozen copy of geniza.footnotes.models.format_citation as of this
+    # migration, so that later changes to the model code don't affect it
+    author = ""
+    if author_names:
+        # combine the last pair with and; combine all others with comma
+        if len(author_names) > 1:
+            author = " and ".join([", ".join(author_names[:-1]), author_names[-1]])
+        else:
+            author = author_names[0]
+
+    parts = []
+    if source.title:
+        # if this is an article, wrap title in quotes
+        if source.source_type.type == "Article":
+            parts.append('"%s"' % source.title)
+        else:
+            parts.append(source.title)
+    if source.journal:
+        parts.append(source.journal)
+    if source.volume:
+        parts.append(source.volume)
+    if source.year:
+        parts.append("(%d)" % source.year)
+    if source.other_info:
+        parts.append(source.other_info)
+
+    # title, journal, etc should be joined by spaces only
+    ref = " ".join(parts)
+    # delimit with comma whichever values are set
+    return ", ".join([val for val in (author, ref) if val])
+
+
+def populate_citations(apps, schema_editor):
+    # store formatted citations for existing sources
+    Source = apps.get_model("footnotes", "Source")
+    for source in Source.objects.select_related("source_type").prefetch_related(
+        "authorship_set__creator"
+    ):
+        author_names = [
+            " ".join(n for n in [a.creator.first_name, a.creator.last_name] if n)
+            for a in sorted(source.authorship_set.all(), key=lambda a: a.sort_order)
+        ]
+        source.citation = format_citation(source, author_names)
+        source.save(update_fields=["citation"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("footnotes", "0013_source_last_modified"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="source",
+            name="citation",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(
+            populate_citations, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1 on 2026-10-17 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("footnotes", "0014_source_citation"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="footnote",
+            name="last_modified",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="source",
+            name="last_modified",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -2,10 +2,13 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.humanize.templatetags.humanize import ordinal
 from django.db import models
+from django.utils import translation
 from django.utils.translation import gettext_lazy as _
 
 from gfklookupwidget.fields import GfkLookupField
 from modeltranslation.manager import MultilingualManager
+from modeltranslation.settings import DEFAULT_LANGUAGE
+from modeltranslation.utils import get_language
 from multiselectfield import MultiSelectField
 
 
@@ -17,6 +20,12 @@ class SourceType(models.Model):
     def __str__(self):
         return self.type
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # type affects citation formatting
+        for source in self.source_set.all():
+            source.update_citation()
+
 
 class SourceLanguage(models.Model):
     """language of a source document"""
@@ -59,6 +68,12 @@ class Creator(models.Model):
         """Creator full name, with first name first"""
         return " ".join([n for n in [self.first_name, self.last_name] if n])
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # update citations for sources with this author
+        for source in self.source_set.all():
+            source.update_citation()
+
 
 class Authorship(models.Model):
     """Ordered relationship between :class:`Creator` and :class:`Source`."""
@@ -77,6 +92,77 @@ class Authorship(models.Model):
             self.source.title,
         )
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.source.update_citation()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.source.update_citation()
+        return result
+
+    @staticmethod
+    def authors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+        """Signal handler to update source citations when authors are
+        added or removed via the many-to-many relationship, which does not
+        save or delete individual authorships."""
+        if action not in ["post_add", "post_remove", "post_clear"]:
+            return
+        if not reverse:
+            instance.update_citation()
+        elif pk_set:
+            for source in Source.objects.filter(pk__in=pk_set):
+                source.update_citation()
+
+
+def format_citation(source, author_names):
+    """Generate a simple string representation of a source, similar to
+    how records were listed in the metadata spreadsheet, from a source
+    and a list of author names in order."""
+    # author lastname, title (year)
+
+    # author
+    # author, title
+    # author, title (year)
+    # author (year)
+    # author, "title" journal vol (year)
+
+    # TODO: include language if not English
+
+    author = ""
+    if author_names:
+        # combine the last pair with and; combine all others with comma
+        # thanks to https://stackoverflow.com/a/30084022
+        if len(author_names) > 1:
+            author = " and ".join([", ".join(author_names[:-1]), author_names[-1]])
+        else:
+            author = author_names[0]
+
+    parts = []
+
+    if source.title:
+        # if this is an article, wrap title in quotes
+        if source.source_type.type == "Article":
+            parts.append('"%s"' % source.title)
+        else:
+            parts.append(source.title)
+
+    # TODO: formatted version with italics for book/journal title
+    if source.journal:
+        parts.append(source.journal)
+    if source.volume:
+        parts.append(source.volume)
+    if source.year:
+        parts.append("(%d)" % source.year)
+    if source.other_info:
+        parts.append(source.other_info)
+
+    # title, journal, etc should be joined by spaces only
+    ref = " ".join(parts)
+
+    # delimit with comma whichever values are set
+    return ", ".join([val for val in (author, ref) if val])
+
 
 class Source(models.Model):
     """a published or unpublished work related to geniza materials"""
@@ -109,6 +195,10 @@ class Source(models.Model):
     url = models.URLField(blank=True, max_length=300)
     # preliminary place to store transcription text; should not be editable
     notes = models.TextField(blank=True)
+    last_modified = models.DateTimeField(auto_now=True, db_index=True)
+    #: formatted citation in the default language, used for display;
+    #: updated automatically when the source or its authors change
+    citation = models.TextField(blank=True, editable=False)
 
     class Meta:
         # set default order to title, year for now since first-author order
@@ -116,56 +206,29 @@ class Source(models.Model):
         ordering = ["title", "year"]
 
     def __str__(self):
-        # generate simple string representation similar to
-        # how records were listed in the metadata spreadsheet
-        # author lastname, title (year)
-
-        # author
-        # author, title
-        # author, title (year)
-        # author (year)
-        # author, "title" journal vol (year)
-
-        # TODO: include language if not English
-
-        author = ""
-        if self.authorship_set.exists():
-            author_lastnames = [
-                a.creator.firstname_lastname() for a in self.authorship_set.all()
-            ]
-            # combine the last pair with and; combine all others with comma
-            # thanks to https://stackoverflow.com/a/30084022
-            if len(author_lastnames) > 1:
-                author = " and ".join(
-                    [", ".join(author_lastnames[:-1]), author_lastnames[-1]]
-                )
-            else:
-                author = author_lastnames[0]
-
-        parts = []
-
-        if self.title:
-            # if this is an article, wrap title in quotes
-            if self.source_type.type == "Article":
-                parts.append('"%s"' % self.title)
-            else:
-                parts.append(self.title)
-
-        # TODO: formatted version with italics for book/journal title
-        if self.journal:
-            parts.append(self.journal)
-        if self.volume:
-            parts.append(self.volume)
-        if self.year:
-            parts.append("(%d)" % self.year)
-        if self.other_info:
-            parts.append(self.other_info)
-
-        # title, journal, etc should be joined by spaces only
-        ref = " ".join(parts)
-
-        # delimit with comma whichever values are set
-        return ", ".join([val for val in (author, ref) if val])
+        # use stored citation when available in the current language
+        if self.citation and get_language() == DEFAULT_LANGUAGE:
+            return self.citation
+        return self.format_citation()
+
+    def format_citation(self):
+        """Citation for this source, based on authors and other metadata"""
+        # use all() rather than exists() to take advantage of prefetching
+        author_names = [
+            a.creator.firstname_lastname() for a in self.authorship_set.all()
+        ]
+        return format_citation(self, author_names)
+
+    def update_citation(self):
+        """Update the stored citation in the default language, without
+        saving other fields or updating modification time."""
+        with translation.override(DEFAULT_LANGUAGE):
+            self.citation = self.format_citation()
+        Source.objects.filter(pk=self.pk).update(citation=self.citation)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.update_citation()
 
     def all_authors(self):
         """semi-colon delimited list of authors in order"""
@@ -175,6 +238,19 @@ class Source(models.Model):
     all_authors.admin_order_field = "first_author"  # set in admin queryset
 
 
+class FootnoteQuerySet(models.QuerySet):
+    def with_sources(self):
+        """Load sources, source types and ordered authors along with
+        footnotes, so that footnotes can be displayed without any
+        additional queries."""
+        return self.select_related("source", "source__source_type").prefetch_related(
+            models.Prefetch(
+                "source__authorship_set",
+                queryset=Authorship.objects.select_related("creator"),
+            )
+        )
+
+
 class Footnote(models.Model):
     source = models.ForeignKey(Source, on_delete=models.CASCADE)
     location = models.CharField(
@@ -205,6 +281,7 @@ class Footnote(models.Model):
     url = models.URLField(
         "URL", blank=True, max_length=300, help_text="Link to the source (optional)"
     )
+    last_modified = models.DateTimeField(auto_now=True, db_index=True)
 
     # Generic relationship
     content_type = models.ForeignKey(
@@ -215,9 +292,26 @@ class Footnote(models.Model):
     object_id = GfkLookupField("content_type")
     content_object = GenericForeignKey()
 
+    objects = FootnoteQuerySet.as_manager()
+
     class Meta:
         ordering = ["source", "location"]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.update_document_summary()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.update_document_summary()
+        return result
+
+    def update_document_summary(self):
+        """Update the stored summary for the footnote's document, which
+        includes transcription status."""
+        if hasattr(self.content_object, "update_summary"):
+            self.content_object.update_summary()
+
     def __str__(self):
         choices = dict(self.DOCUMENT_RELATION_TYPES)
 
@@ -13,7 +13,7 @@ from geniza.footnotes.admin import (
     SourceAdmin,
     SourceFootnoteInline,
 )
-from geniza.footnotes.models import Footnote, Source, SourceType
+from geniza.footnotes.models import Creator, Footnote, Source, SourceType
 from geniza.corpus.models import Document
 
 
@@ -249,6 +249,21 @@ class TestFootnoteAdmin:
             assert "source" in headers
             assert "content" in headers
 
+    @pytest.mark.django_db
+    def test_snapshot_version(self, source, document):
+        Footnote.objects.create(source=source, content_object=document)
+        snapshot = FootnoteAdmin(Footnote, admin.site).csv_snapshot
+        version = snapshot.version()
+        # changing a document shelfmark requires a new snapshot
+        fragment = document.fragments.first()
+        fragment.shelfmark = "T-S 1"
+        fragment.save()
+        assert snapshot.version() != version
+        # as does adding an author
+        version = snapshot.version()
+        Creator.objects.create(last_name="Goitein")
+        assert snapshot.version() != version
+
 
 class TestSourceFootnoteInline:
     @pytest.mark.django_db
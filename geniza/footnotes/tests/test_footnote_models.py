@@ -1,8 +1,15 @@
 from unittest.mock import patch
 
 import pytest
+from django.utils import translation
 
-from geniza.footnotes.models import Creator, Footnote, SourceLanguage, SourceType
+from geniza.footnotes.models import (
+    Creator,
+    Footnote,
+    Source,
+    SourceLanguage,
+    SourceType,
+)
 
 
 class TestSourceType:
@@ -25,8 +32,9 @@ class TestSource:
             source.authors.first().firstname_lastname(),
             source.title,
         )
-        # set a year
+        # set a year; citation is updated on save
         source.year = 1984
+        source.save()
         assert str(source) == "%s, %s (1984)" % (
             source.authors.first().firstname_lastname(),
             source.title,
@@ -58,6 +66,7 @@ class TestSource:
         )
         # article with no title
         article.title = ""
+        article.save()
         assert str(article) == "%s, %s %s (%s)" % (
             article.authors.first().firstname_lastname(),
             article.journal,
@@ -66,12 +75,44 @@ class TestSource:
         )
         # no volume
         article.volume = ""
+        article.save()
         assert str(article) == "%s, %s (%s)" % (
             article.authors.first().firstname_lastname(),
             article.journal,
             article.year,
         )
 
+    def test_citation(self, source, twoauthor_source, django_assert_num_queries):
+        # citation is stored on save and when authors change
+        source.refresh_from_db()
+        assert source.citation == "George Orwell, A Nice Cup of Tea"
+        with django_assert_num_queries(0):
+            assert str(source) == source.citation
+
+        # updated when an author is renamed or removed
+        creator = twoauthor_source.authors.first()
+        creator.first_name = "B."
+        creator.save()
+        twoauthor_source.refresh_from_db()
+        assert twoauthor_source.citation.startswith("B. Kernighan and Dennis Ritchie")
+        twoauthor_source.authorship_set.last().delete()
+        twoauthor_source.refresh_from_db()
+        assert twoauthor_source.citation == "B. Kernighan, The C Programming Language"
+
+        # updated when source type changes
+        twoauthor_source.source_type.type = "Article"
+        twoauthor_source.source_type.save()
+        twoauthor_source.refresh_from_db()
+        assert twoauthor_source.citation == 'B. Kernighan, "The C Programming Language"'
+
+        # stored citation is only used in the default language
+        with translation.override("he"):
+            with patch.object(
+                Source, "format_citation", return_value="citation"
+            ) as mock_format:
+                assert str(source) == "citation"
+                assert mock_format.call_count == 1
+
     def test_all_authors(self, twoauthor_source):
         author1, author2 = twoauthor_source.authorship_set.all()
         assert twoauthor_source.all_authors() == "%s; %s" % (
@@ -122,6 +163,19 @@ class TestFootnote:
         footnote.url = "http://example.com/"
         assert footnote.has_url()
 
+    def test_with_sources(
+        self, document, source, twoauthor_source, django_assert_num_queries
+    ):
+        Footnote.objects.create(content_object=document, source=source)
+        Footnote.objects.create(content_object=document, source=twoauthor_source)
+        # footnotes, sources and authors are loaded in two queries
+        with django_assert_num_queries(2):
+            footnotes = list(Footnote.objects.with_sources())
+            assert [fn.display() for fn in footnotes] == [
+                "George Orwell, A Nice Cup of Tea.",
+                "Brian Kernighan and Dennis Ritchie, The C Programming Language.",
+            ]
+
 
 class TestCreator:
     def test_str(self):
@@ -10,11 +10,16 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
+# Generated files (csv export snapshots, search cache) are kept outside
+# the project by default; configure persistent locations in local settings
+DATA_CACHE_DIR = Path(tempfile.gettempdir()) / "geniza"
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.1/howto/deployment/checklist/
 
@@ -192,3 +197,44 @@ TEAM_USERNAME = "pgl"
 
 # use default Django site
 SITE_ID = 1
+
+# IIIF manifest cache: number of seconds before a cached manifest is
+# revalidated against the remote server, and maximum number of manifests
+# to keep (least recently fetched are removed first)
+IIIF_MANIFEST_CACHE_TTL = 60 * 60 * 24 * 7
+IIIF_MANIFEST_CACHE_MAX_ENTRIES = 50000
+
+# number of seconds to wait for a response when fetching a IIIF manifest
+IIIF_MANIFEST_TIMEOUT = 30
+
+# directory for pre-generated snapshots of full CSV exports;
+# regenerate with the export_snapshots manage command
+CSV_SNAPSHOT_ROOT = DATA_CACHE_DIR / "snapshots"
+
+# number of seconds to cache the data version checked when serving
+# a snapshot; changes may take this long to stop serving an old snapshot
+CSV_SNAPSHOT_VERSION_TTL = 60
+
+# caches; search results from Solr are cached in a separate cache so
+# they can be cleared independently. The search cache also stores the
+# current index generation, so it must be shared by all web processes
+# and indexing scripts; the file-based cache removes the least recently
+# used entries when full. Deployments with multiple hosts should use a
+# networked cache backend instead.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "search": {
+        "BACKEND": "geniza.common.cache.LRUFileBasedCache",
+        "LOCATION": DATA_CACHE_DIR / "search-cache",
+        "TIMEOUT": 60 * 10,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+}
+
+# number of seconds to cache facet counts for unfiltered document search
+SEARCH_FACET_CACHE_TTL = 60 * 5
+
+# max-age in seconds for caching JSON search API responses
+SEARCH_API_CACHE_SECONDS = 60 * 5